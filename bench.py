@@ -0,0 +1,401 @@
+# bench.py
+"""오프라인 벤치마크: 가짜 LMS + HLS 서버를 로컬에 띄워 추출/다운로드 경로를 처음부터 끝까지 돌리고
+엔진(순차/병렬)별 pages/sec, MB/s, 단계별 p50/p95를 비교한다. 학교 계정이나 네트워크가 필요 없다.
+
+    python bench.py --pages 50 --segments 40 --latency 30 --bandwidth 4
+    python bench.py --alert --browser --tabs 4          # 크롬 추출 경로 (헤드리스)
+    python bench.py --ffmpeg --json bench.json          # 실제 .ts를 만들어 ffmpeg 조립까지
+
+가짜 서버는 viewer.php(h1.vod-title, <video><source>, 선택적 '이어 보기' alert, 로그인 쿠키 확인)와
+마스터/미디어 플레이리스트, 세그먼트를 요청마다 지연(latency)과 연결당 대역폭(bandwidth)을 걸어 응답한다.
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+from engine import (
+    DEFAULT_USER_AGENT,
+    BatchMetrics, DownloadJob, Extractor, FfmpegOptions, JobQueue,
+    build_ffmpeg_command, commit_partial_output, extract_id_from_url, fetch_job_segments, is_ffmpeg_available,
+    make_http_session, open_chrome, partial_output_path,
+)
+
+
+BENCH_COOKIE = ("MoodleSession", "bench-session")
+SEGMENT_SECONDS = 4.0
+TS_PACKET = b"\x47" + b"\xff" * 187     # 가짜 세그먼트 내용 (MPEG-TS 패킷 크기만 맞춤)
+
+VIEWER_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>강의 {vid}</title>{alert}</head>
+<body>
+<h1 class="vod-title">벤치마크 강의 {vid}</h1>
+<video controls><source src="{src}" type="application/x-mpegURL"></video>
+</body></html>
+"""
+ALERT_SCRIPT = '<script>alert("이전 재생 위치부터 이어서 보시겠습니까?");</script>'
+LOGIN_HTML = '<!DOCTYPE html><html><body><form id="login"><input name="username"></form></body></html>'
+
+
+@dataclass
+class FakeLmsConfig:
+    pages: int = 20
+    segments: int = 30          # 강의 하나의 세그먼트 수
+    segment_kb: int = 256       # 가짜 세그먼트 크기
+    latency_ms: float = 20.0    # 요청마다 응답 전 지연
+    bandwidth: float = 0.0      # 연결당 MB/s (0이면 무제한)
+    alert: bool = False         # viewer.php에서 '이어 보기' alert를 띄움
+    master: bool = False        # 마스터 플레이리스트(variant 2개)를 거쳐 미디어 플레이리스트로
+    media_dir: str = ""         # ffmpeg로 만든 실제 HLS 폴더 (있으면 가짜 세그먼트 대신 그대로 응답)
+
+
+class FakeLmsServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, config: FakeLmsConfig):
+        super().__init__(address, FakeLmsHandler)
+        self.config = config
+        self.segment = (TS_PACKET * (config.segment_kb * 1024 // len(TS_PACKET) + 1))[:config.segment_kb * 1024]
+        self.lock = threading.Lock()
+        self.bytes_sent = 0
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/"
+
+    def count(self, n: int):
+        with self.lock:
+            self.bytes_sent += n
+            self.requests += 1
+
+    def reset(self):
+        with self.lock:
+            self.bytes_sent = 0
+            self.requests = 0
+
+
+class FakeLmsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive (세션 재사용까지 측정)
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def config(self) -> FakeLmsConfig:
+        return self.server.config
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        time.sleep(self.config.latency_ms / 1000)
+        if url.path == "/login/index.php":
+            return self.send_body(200, "text/html; charset=utf-8", LOGIN_HTML.encode())
+        if "=".join(BENCH_COOKIE) not in self.headers.get("Cookie", ""):
+            if url.path.endswith("viewer.php"):
+                return self.send_redirect("/login/index.php")
+            return self.send_body(403, "text/plain", b"forbidden")
+        if url.path == "/mod/vod/viewer.php":
+            vid = parse_qs(url.query).get("id", ["0"])[0]
+            return self.send_body(200, "text/html; charset=utf-8", self.viewer_html(vid).encode())
+        parts = url.path.strip("/").split("/")     # hls/<id>/<파일>
+        if len(parts) == 3 and parts[0] == "hls":
+            return self.send_hls(parts[2])
+        self.send_body(404, "text/plain", b"not found")
+
+    def viewer_html(self, vid: str) -> str:
+        name = "master.m3u8" if self.config.master else "index.m3u8"
+        src = f"http://{self.headers.get('Host')}/hls/{vid}/{name}"
+        return VIEWER_HTML.format(vid=vid, src=src, alert=ALERT_SCRIPT if self.config.alert else "")
+
+    def send_hls(self, name: str):
+        if name == "master.m3u8":
+            text = (
+                "#EXTM3U\n"
+                "#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360\nindex.m3u8?q=360\n"
+                "#EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720\nindex.m3u8?q=720\n"
+            )
+            return self.send_body(200, "application/vnd.apple.mpegurl", text.encode())
+        if self.config.media_dir:
+            path = Path(self.config.media_dir) / name
+            if path.is_file():
+                ctype = "application/vnd.apple.mpegurl" if name.endswith(".m3u8") else "video/mp2t"
+                return self.send_body(200, ctype, path.read_bytes())
+            return self.send_body(404, "text/plain", b"not found")
+        if name == "index.m3u8":
+            lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{int(SEGMENT_SECONDS)}",
+                     "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD"]
+            for i in range(self.config.segments):
+                lines += [f"#EXTINF:{SEGMENT_SECONDS:.3f},", f"seg_{i:05d}.ts"]
+            lines.append("#EXT-X-ENDLIST")
+            return self.send_body(200, "application/vnd.apple.mpegurl", ("\n".join(lines) + "\n").encode())
+        if name.startswith("seg_") and name.endswith(".ts"):
+            return self.send_body(200, "video/mp2t", self.server.segment)
+        self.send_body(404, "text/plain", b"not found")
+
+    def send_redirect(self, location: str):
+        self.send_response(303)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def send_body(self, status: int, ctype: str, body: bytes):
+        """연결당 대역폭 한도에 맞춰 64KB씩 나눠 보냄"""
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.server.count(len(body))
+        rate = self.config.bandwidth * 1024 * 1024
+        chunk = 64 * 1024
+        started = time.monotonic()
+        try:
+            for i in range(0, len(body), chunk):
+                if rate > 0:
+                    ahead = i / rate - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+                self.wfile.write(body[i:i + chunk])
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+
+def make_test_media(out_dir: Path, segments: int) -> Path:
+    """ffmpeg(lavfi)로 세그먼트 segments개짜리 실제 HLS를 만듦 (조립 단계까지 재기 위해)"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    duration = segments * SEGMENT_SECONDS
+    cmd = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc=size=640x360:rate=25:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+        "-c:v", "mpeg2video", "-q:v", "5", "-g", "25", "-c:a", "mp2",
+        "-f", "hls", "-hls_time", str(int(SEGMENT_SECONDS)), "-hls_playlist_type", "vod",
+        "-hls_segment_filename", str(out_dir / "seg_%05d.ts"), str(out_dir / "index.m3u8"),
+    ]
+    subprocess.run(cmd, check=True)
+    return out_dir
+
+
+# -------------------벤치마크 ----------------------
+def quiet(_text: str):
+    pass
+
+
+class BenchRun:
+    """엔진 하나를 한 번 돌림.
+    sequential: 모든 페이지를 하나씩 추출한 뒤, 한 강의씩 세그먼트도 하나씩 받음 (예전 도구의 흐름)
+    parallel:   추출 스레드 여럿(또는 브라우저 탭 여러 개)이 큐를 채우는 동안 다운로드 워커 N개가
+                세그먼트를 동시에 받음 (GUI/CLI의 현재 흐름)"""
+
+    def __init__(self, engine: str, server: FakeLmsServer, args, out_dir: Path, driver=None):
+        self.engine = engine
+        self.parallel = engine == "parallel"
+        self.server = server
+        self.args = args
+        self.out_dir = out_dir
+        self.driver = driver
+        self.metrics = BatchMetrics()
+        self.queue = JobQueue(args.per_host if self.parallel else 0)
+        self.local = threading.local()
+        self.extracted = 0
+        self.extract_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def extractor(self) -> Extractor:
+        """스레드마다 따로 쓰는 Extractor (requests 세션도 스레드별)"""
+        ex = getattr(self.local, "extractor", None)
+        if ex is None:
+            session = make_http_session(DEFAULT_USER_AGENT)
+            session.cookies.set(*BENCH_COOKIE, domain="127.0.0.1", path="/")
+            ex = Extractor(
+                self.driver, session, self.args.extract_mode, fast=self.driver is None, log=quiet,
+                tabs=self.args.tabs if self.parallel else 1, metrics=self.metrics,
+            )
+            self.local.extractor = ex
+        return ex
+
+    def urls(self) -> list:
+        return [f"{self.server.base_url}mod/vod/viewer.php?id={1000 + i}" for i in range(self.server.config.pages)]
+
+    def extract(self, urls: list):
+        started = time.perf_counter()
+        try:
+            if self.driver is not None:
+                step = self.args.tabs if self.parallel else 1
+                for i in range(0, len(urls), step):
+                    for result in self.extractor().extract_many(urls[i:i + step]):
+                        self.put(result)
+            elif self.parallel:
+                with ThreadPoolExecutor(self.args.extract_workers) as pool:
+                    for result in pool.map(lambda u: self.extractor().extract(u), urls):
+                        self.put(result)
+            else:
+                for page_url in urls:
+                    self.put(self.extractor().extract(page_url))
+        finally:
+            self.extract_seconds = time.perf_counter() - started
+            self.queue.close()
+
+    def put(self, result):
+        if not result:
+            self.metrics.count("extract_failed")
+            return
+        page_url, m3u8, title, cookie_header, media_url, audio_url = result
+        out_file = str(self.out_dir / f"lms_{extract_id_from_url(page_url)}.mp4")
+        with self.lock:
+            self.extracted += 1
+        self.queue.put(DownloadJob(page_url, m3u8, out_file, page_url, title, -1, cookie_header, media_url, audio_url))
+
+    def download_loop(self):
+        concurrency = self.args.segment_concurrency if self.parallel else 1
+        while True:
+            job = self.queue.get(block=True)
+            if job is None:
+                return
+            try:
+                self.metrics.add(job.page_url, "queue_wait", time.monotonic() - job.queued_at)
+                result = fetch_job_segments(job, DEFAULT_USER_AGENT, concurrency, log=quiet,
+                                            timer=self.metrics.timer(job.page_url))
+                ok = result.ok
+                if ok and self.args.ffmpeg:
+                    ok = self.assemble(job, result)
+            finally:
+                self.queue.task_done(job)
+            self.metrics.count("jobs_done" if ok else "jobs_failed")
+
+    def assemble(self, job: DownloadJob, result) -> bool:
+        partial = partial_output_path(job.out_file)
+        cmd = build_ffmpeg_command(job, FfmpegOptions(), str(result.local_playlists[0]), partial,
+                                   local_playlist=True, encrypted=result.encrypted)
+        with self.metrics.timer(job.page_url).stage("assemble"):
+            code = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+        return commit_partial_output(partial, job.out_file, code == 0)
+
+    def run(self) -> dict:
+        self.server.reset()
+        urls = self.urls()
+        workers = self.args.jobs if self.parallel else 1
+        started = time.perf_counter()
+        extract_thread = threading.Thread(target=self.extract, args=(urls,), daemon=True)
+        extract_thread.start()
+        if not self.parallel:
+            extract_thread.join()   # 순차: 추출이 다 끝난 뒤에 받기 시작
+        threads = [threading.Thread(target=self.download_loop, daemon=True) for _ in range(workers)]
+        for t in threads:
+            t.start()
+        for t in [extract_thread] + threads:
+            t.join()
+        seconds = time.perf_counter() - started
+        mb = self.server.bytes_sent / (1024 * 1024)
+        summary = self.metrics.summary()
+        return {
+            "engine": self.engine,
+            "extract": "browser" if self.driver is not None else "http",
+            "pages": len(urls),
+            "extracted": self.extracted,
+            "downloaded": self.metrics.counters.get("jobs_done", 0),
+            "failed": self.metrics.counters.get("jobs_failed", 0) + self.metrics.counters.get("extract_failed", 0),
+            "seconds": round(seconds, 3),
+            "extract_seconds": round(self.extract_seconds, 3),
+            "pages_per_sec": round(self.extracted / self.extract_seconds, 2) if self.extract_seconds else 0.0,
+            "mb": round(mb, 2),
+            "mb_per_sec": round(mb / seconds, 2) if seconds else 0.0,
+            "requests": self.server.requests,
+            "stages": {stage: {"p50": s["p50"], "p95": s["p95"], "total": s["total"]} for stage, s in summary.items()},
+        }
+
+
+def print_report(reports: list, stream=sys.stdout):
+    for r in reports:
+        stream.write(
+            f"\n== {r['engine']} ({r['extract']} 추출) ==\n"
+            f"  페이지 {r['extracted']}/{r['pages']}, 완료 {r['downloaded']}, 실패 {r['failed']}\n"
+            f"  전체 {r['seconds']:.2f}s | 추출 {r['extract_seconds']:.2f}s ({r['pages_per_sec']:.1f} pages/s)"
+            f" | {r['mb']:.1f}MB ({r['mb_per_sec']:.1f} MB/s)\n"
+        )
+        for stage, s in sorted(r["stages"].items(), key=lambda kv: -kv[1]["total"]):
+            stream.write(f"    {stage:<15} p50 {s['p50'] * 1000:8.1f}ms  p95 {s['p95'] * 1000:8.1f}ms\n")
+    if len(reports) > 1 and reports[0]["seconds"]:
+        base = reports[0]
+        for r in reports[1:]:
+            stream.write(f"\n{r['engine']} / {base['engine']}: {base['seconds'] / max(r['seconds'], 1e-9):.2f}배 빠름\n")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="가짜 LMS/HLS 서버로 추출·다운로드 엔진 벤치마크 (네트워크/계정 불필요)")
+    p.add_argument("--pages", type=int, default=20, help="강의 페이지 수")
+    p.add_argument("--segments", type=int, default=30, help="강의 하나의 세그먼트 수")
+    p.add_argument("--segment-kb", type=int, default=256, help="가짜 세그먼트 크기(KB)")
+    p.add_argument("--latency", type=float, default=20, help="요청마다 응답 지연(ms)")
+    p.add_argument("--bandwidth", type=float, default=0, help="연결당 대역폭 MB/s (0이면 무제한)")
+    p.add_argument("--alert", action="store_true", help="viewer.php에 '이어 보기' alert 띄우기")
+    p.add_argument("--master", action="store_true", help="마스터 플레이리스트를 거치게 하기")
+    p.add_argument("--engines", default="sequential,parallel", help="돌릴 엔진 (sequential, parallel)")
+    p.add_argument("-j", "--jobs", type=int, default=3, help="parallel: 동시 다운로드 수")
+    p.add_argument("--segment-concurrency", type=int, default=6, help="parallel: 강의당 세그먼트 동시 요청 수")
+    p.add_argument("--extract-workers", type=int, default=4, help="parallel: HTTP 추출 스레드 수")
+    p.add_argument("--per-host", type=int, default=0, help="parallel: 호스트당 동시 다운로드 수 (0이면 제한 없음)")
+    p.add_argument("--browser", action="store_true", help="HTTP 대신 헤드리스 크롬으로 추출")
+    p.add_argument("--show-browser", action="store_true", help="--browser 크롬 창을 띄움")
+    p.add_argument("--tabs", type=int, default=3, help="parallel --browser: 동시에 띄울 탭 수")
+    p.add_argument("--extract-mode", choices=["dom", "cdp"], default="dom", help="--browser 추출 방식")
+    p.add_argument("--ffmpeg", action="store_true", help="ffmpeg로 실제 HLS를 만들고 조립까지 측정")
+    p.add_argument("--port", type=int, default=0, help="가짜 서버 포트 (0이면 빈 포트)")
+    p.add_argument("--keep", action="store_true", help="받은 파일을 지우지 않음 (경로 출력)")
+    p.add_argument("--json", metavar="PATH", help="결과를 JSON으로 저장")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    unknown = [e for e in engines if e not in ("sequential", "parallel")]
+    if unknown:
+        raise SystemExit(f"알 수 없는 엔진: {', '.join(unknown)}")
+    if args.ffmpeg and not is_ffmpeg_available():
+        raise SystemExit("--ffmpeg: ffmpeg 실행 파일을 찾을 수 없습니다.")
+
+    work = Path(tempfile.mkdtemp(prefix="lms_bench_"))
+    config = FakeLmsConfig(args.pages, args.segments, args.segment_kb, args.latency, args.bandwidth,
+                           args.alert, args.master)
+    if args.ffmpeg:
+        config.media_dir = str(make_test_media(work / "media", args.segments))
+    server = FakeLmsServer(("127.0.0.1", args.port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sys.stdout.write(f"가짜 LMS: {server.base_url} (작업 폴더 {work})\n")
+
+    driver = None
+    reports = []
+    try:
+        if args.browser:
+            driver = open_chrome(server.base_url + "login/index.php", headless=not args.show_browser)
+            driver.add_cookie({"name": BENCH_COOKIE[0], "value": BENCH_COOKIE[1], "path": "/"})
+        for engine in engines:
+            out_dir = work / engine
+            out_dir.mkdir(parents=True, exist_ok=True)
+            reports.append(BenchRun(engine, server, args, out_dir, driver).run())
+    finally:
+        if driver is not None:
+            driver.quit()
+        server.shutdown()
+        server.server_close()
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    print_report(reports)
+    if args.json:
+        Path(args.json).write_text(json.dumps(reports, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0 if all(r["failed"] == 0 for r in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,657 @@
+# cli.py
+"""헤드리스 배치 실행: Qt 없이 URL 파일을 읽어 추출 + 다운로드하고 진행 상황을 JSON-lines로 출력.
+
+    python cli.py urls.txt -o ~/강의 -j 4 --cookies cookies.txt
+
+로그인은 브라우저에서 내보낸 Netscape 형식 cookies.txt로 대신한다.
+--browser를 주면 빠른 추출에 실패한 페이지만 (헤드리스) 크롬으로 다시 연다.
+"""
+import time
+STARTED_AT = time.perf_counter()    # 시작 예산 기준 (engine import보다 먼저 잼)
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+from collections import deque
+from pathlib import Path
+from queue import Queue
+from urllib.parse import urlparse
+
+from engine import (
+    DEFAULT_USER_AGENT, DOWNLOAD_ENGINES, EXTRACT_MODES, VARIANT_POLICIES,
+    BatchMetrics, ConcurrencyTuner, CookieJarCache, CourseManifest, CookieRefresher, DownloadIndex, DownloadJob, ExtractionCache, Extractor, FfmpegOptions,
+    FfmpegProgress, JobQueue, JobStore, KeyCache, RetryPolicy, SessionPool, StartupProfile, TokenBucket, TUNE_INTERVAL,
+    app_data_dir, build_ffmpeg_command, build_transcode_command, classify_failure, commit_partial_output,
+    default_transcode_workers, fetch_job_segments, get_base_url, group_urls_by_host, is_course_url, is_ffmpeg_available, job_host,
+    lecture_key, load_cookie_file, make_http_session, open_chrome, parse_http_error, partial_output_path,
+    record_ffmpeg_timings, segment_parts_dir, session_cookies_as_dicts, source_output_path, sync_courses, transcode_threads, unique_output_path,
+)
+ENGINE_IMPORTED_AT = time.perf_counter()
+
+
+class JsonLinesWriter:
+    """이벤트 하나를 JSON 한 줄로 출력 (여러 스레드에서 호출)"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def emit(self, event: str, **fields):
+        line = json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, ensure_ascii=False)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def log(self, text: str):
+        text = text.strip()
+        if text:
+            self.emit("log", message=text)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="LMS 강의 HLS 헤드리스 다운로더 (JSON-lines 진행 출력)")
+    p.add_argument("url_file", help="LMS 강의/강좌 페이지 URL 목록 파일 (한 줄에 하나, '-'이면 stdin)")
+    p.add_argument("-o", "--out-dir", default=str(Path.home() / "Documents" / "강의"), help="저장 폴더")
+    p.add_argument("-j", "--jobs", type=int, default=3, help="동시 다운로드 수")
+    p.add_argument("--autotune", action="store_true",
+                   help="받는 속도와 실패율을 보고 동시 다운로드 수를 -j부터 --max-jobs까지 자동 조절 (AIMD)")
+    p.add_argument("--max-jobs", type=int, default=16, help="--autotune이 늘릴 수 있는 최대 동시 다운로드 수")
+    p.add_argument("--cookies", help="로그인 세션 쿠키 파일 (Netscape cookies.txt 형식)")
+    p.add_argument("--engine", choices=list(DOWNLOAD_ENGINES),
+                   help="다운로드 엔진 (기본: ffmpeg, --max-rate를 주면 segment)")
+    p.add_argument("--segments", type=int, default=6, help="세그먼트 엔진의 동시 요청 수")
+    p.add_argument("--per-host", type=int, default=2, help="호스트당 동시 다운로드 수 (0이면 제한 없음)")
+    p.add_argument("--host-limit", action="append", default=[], metavar="HOST=N",
+                   help="특정 호스트의 동시 다운로드 수 (예: https://ys.learnus.org=1, 여러 번 지정 가능)")
+    p.add_argument("--max-rate", type=float, default=0,
+                   help="전체 대역폭 한도 MB/s (0이면 무제한). 세그먼트 엔진으로 받으며 --engine ffmpeg와는 함께 못 씀")
+    p.add_argument("--quality", choices=list(VARIANT_POLICIES), default="highest", help="variant 선택 정책")
+    p.add_argument("--retries", type=int, default=3, help="실패한 작업의 최대 재시도 횟수")
+    p.add_argument("--retry-delay", type=float, default=5, help="첫 재시도 대기(초), 재시도마다 두 배")
+    p.add_argument("--mp3", action="store_true", help="MP3로 변환 저장")
+    p.add_argument("--reencode", action="store_true", help="-c copy 대신 재인코딩")
+    p.add_argument("--transcode-jobs", type=int, default=default_transcode_workers(),
+                   help="--mp3/--reencode 시 다운로드와 따로 돌릴 인코딩 수 (기본: CPU 코어 수)")
+    p.add_argument("--user-agent", default=DEFAULT_USER_AGENT)
+    p.add_argument("--cache-ttl", type=float, default=6, help="추출 캐시 유효시간(시간), 0이면 사용 안 함")
+    p.add_argument("--browser", action="store_true", help="빠른 추출 실패 시 크롬으로 재시도")
+    p.add_argument("--headless", action="store_true", help="--browser 크롬을 화면 없이 실행")
+    p.add_argument("--export-cookies", metavar="PATH", help="쿠키 캐시를 Netscape cookies.txt로 저장 (--browser면 갱신할 때마다)")
+    p.add_argument("--job-db", help="작업 상태 저장소 경로 (기본: ~/.lms_downloader/jobs.sqlite3)")
+    p.add_argument("--no-resume", action="store_true", help="저장된 작업 상태를 무시하고 모든 URL을 처음부터")
+    p.add_argument("--redownload", action="store_true", help="이미 받은 강의(다운로드 색인)도 다시 받기")
+    p.add_argument("--tabs", type=int, default=3, help="--browser 추출 시 호스트별 브라우저에서 동시에 띄울 탭 수")
+    p.add_argument("--extract-mode", choices=list(EXTRACT_MODES), default="cdp", help="크롬 추출 방식")
+    p.add_argument("--metrics-json", metavar="PATH", help="배치가 끝나면 작업별 단계 소요 시간을 JSON으로 저장")
+    p.add_argument("--metrics-prom", metavar="PATH",
+                   help="단계별 시간 요약을 Prometheus 텍스트 형식으로 저장 (node_exporter textfile collector용)")
+    args = p.parse_args(argv)
+    # 대역폭 한도는 세그먼트 엔진의 TokenBucket으로만 걸 수 있음 (ffmpeg 직접 엔진은 속도 제한 없음)
+    if args.max_rate and args.engine == "ffmpeg":
+        p.error("--max-rate는 세그먼트 엔진에서만 적용됩니다 (--engine segment를 쓰거나 --engine을 빼세요)")
+    if args.engine is None:
+        args.engine = "segment" if args.max_rate else "ffmpeg"
+    return args
+
+
+def parse_host_limits(specs: list) -> dict:
+    """'HOST=N' 목록 → {get_base_url 형식 호스트: N}"""
+    limits = {}
+    for spec in specs:
+        host, sep, n = spec.rpartition("=")
+        if not sep or not n.isdigit():
+            raise SystemExit(f"--host-limit 형식 오류: {spec} (HOST=N)")
+        if "://" not in host:
+            host = "https://" + host
+        limits[get_base_url(host) or host] = int(n)
+    return limits
+
+
+def read_urls(url_file: str) -> list:
+    text = sys.stdin.read() if url_file == "-" else Path(url_file).read_text(encoding="utf-8")
+    return [u.strip() for u in text.splitlines() if u.strip() and not u.lstrip().startswith("#")]
+
+
+def start_browsers(urls: list, session, headless: bool) -> SessionPool:
+    """LMS 호스트마다 크롬을 하나씩 띄우고 그 호스트의 세션 쿠키를 넣음 (페이지 추출 fallback용)"""
+    pool = SessionPool(lambda start_url: open_chrome(start_url, headless))
+    for base in group_urls_by_host(urls):
+        if not base.startswith("http"):
+            continue
+        driver = pool.open(base)
+        host = urlparse(base).hostname or ""
+        for c in session.cookies:
+            if c.domain.lstrip(".") and host.endswith(c.domain.lstrip(".")):
+                driver.add_cookie({"name": c.name, "value": c.value, "domain": c.domain, "path": c.path or "/"})
+    return pool
+
+
+def make_extractors(args, session, browsers: SessionPool, cookies: CookieJarCache, cache, metrics,
+                    urls: list, resumed: list, log=print) -> dict:
+    """호스트 → Extractor. 추출할 URL뿐 아니라 이어받을 작업의 호스트도 넣음: 추출할 것이 남지 않은
+    호스트의 작업도 쿠키 캐시에서 Cookie 헤더를 받고, 401/403이면 재추출할 수 있어야 함"""
+    hosts = group_urls_by_host(urls + [job.page_url for job in resumed])
+    for host in hosts:
+        cookies.update(host, session_cookies_as_dicts(session))
+    return {
+        host: Extractor(browsers.drivers.get(host), session, args.extract_mode, True, cache,
+                        args.quality, args.mp3, log=log, tabs=args.tabs, cookies=cookies, host=host,
+                        metrics=metrics)
+        for host in hosts
+    }
+
+
+class BatchRunner:
+    """추출 스레드 1개가 작업 큐를 채우고, 다운로드 스레드 N개가 큐를 비우는 파이프라인.
+    MP3/재인코딩이면 다운로드 스레드는 재인코딩 없이 받기만 하고, 인코딩은 인코딩 스레드들이 따로 맡는다"""
+
+    def __init__(self, args, out: JsonLinesWriter, cache=None, sessions=None, cookies=None, store=None,
+                 index=None, metrics=None):
+        self.args = args
+        self.out = out
+        self.cache = cache
+        self.store = store          # JobStore (없으면 상태를 저장하지 않음)
+        self.index = index          # DownloadIndex (없으면 완료 기록을 남기지 않음)
+        self.metrics = metrics or BatchMetrics()    # 작업별 단계 소요 시간
+        self.progress = {}          # page_url → 마지막 ffmpeg 실행의 FfmpegProgress (출력 검증용)
+        self.sessions = sessions or SessionPool()   # 호스트별 브라우저 (--browser), driver 잠금도 여기서
+        self.cookies = cookies or CookieJarCache()  # 호스트별 로그인 쿠키
+        self.opts = FfmpegOptions(args.user_agent, args.mp3, not args.reencode)
+        self.queue = JobQueue(args.per_host, parse_host_limits(args.host_limit))
+        self.bandwidth = TokenBucket(args.max_rate * 1024 * 1024)
+        self.keys = KeyCache()      # AES-128 키 (키 URI별, 다운로드 스레드가 나눠 씀)
+        self.tuner = None           # --autotune: 다운로드 스레드가 동시에 잡는 작업 수를 정하는 ConcurrencyTuner
+        if args.autotune:
+            self.tuner = ConcurrencyTuner(args.jobs, maximum=max(args.jobs, args.max_jobs))
+        self.ffmpeg_bytes = 0       # ffmpeg 직접 엔진이 받은 바이트 (세그먼트 엔진은 bandwidth.total)
+        self.out_dir = Path(args.out_dir).expanduser().resolve()
+        self.taken = set()
+        self.lock = threading.Lock()
+        self.retry = RetryPolicy(args.retries, args.retry_delay)
+        self.extractors = {}        # 호스트 → Extractor (호스트마다 추출 스레드 하나)
+        self.results = {"done": 0, "failed": 0, "retried": 0}
+        self.procs = set()
+        self.cancelled = threading.Event()
+        self.transcode_queue = Queue()  # (job, 시작 시각): 받기가 끝나 인코딩을 기다리는 작업 (None이면 종료)
+
+    def record(self, method: str, *args):
+        """작업 상태를 저장소에 기록 (저장 실패는 다운로드를 막지 않음)"""
+        if self.store is None:
+            return
+        try:
+            getattr(self.store, method)(*args)
+        except sqlite3.Error as e:
+            self.out.log(f"[WARN] 작업 상태 저장 실패: {e}")
+
+    def resume(self, jobs: list):
+        """지난번에 추출까지 끝난 작업을 추출 없이 바로 큐에 넣음"""
+        for job in jobs:
+            with self.lock:
+                self.taken.add(job.out_file)
+            self.out.emit("resumed", url=job.page_url, out_file=job.out_file, attempts=job.attempts)
+            self.queue.put(job)
+
+    def extract_all(self, extractors: dict, urls: list):
+        """호스트마다 추출 스레드를 하나씩 돌려 서로 다른 LMS를 동시에 추출. 다 끝나면 큐를 닫음"""
+        self.extractors = extractors
+        threads = [
+            threading.Thread(target=self.extract_host, args=(host, host_urls), daemon=True)
+            for host, host_urls in group_urls_by_host(urls).items()
+        ]
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            self.queue.close()
+
+    def extract_host(self, host: str, urls: list):
+        extractor = self.extractors[host]
+        for i in range(0, len(urls), max(1, extractor.tabs)):
+            if self.cancelled.is_set():
+                break
+            chunk = urls[i:i + max(1, extractor.tabs)]
+            # 추출 스레드, 재시도 재추출, 백그라운드 쿠키 갱신이 같은 driver를 번갈아 씀
+            with self.sessions.lock_for(host):
+                results = extractor.extract_many(chunk)
+            for page_url, result in zip(chunk, results):
+                if not result:
+                    self.out.emit("extract_failed", url=page_url)
+                    self.record("mark_finished", page_url, False, "extract")
+                    self.metrics.count("extract_failed")
+                    with self.lock:
+                        self.results["failed"] += 1
+                    continue
+                page_url, m3u8, title, cookie_header, media_url, audio_url = result
+                own = self.index.recorded_path(page_url, self.opts.ext) if self.index else ""
+                with self.lock:
+                    out_file = unique_output_path(self.out_dir, page_url, title, self.opts.ext, self.taken, own)
+                job = DownloadJob(page_url, m3u8, out_file, page_url, title, -1, cookie_header, media_url, audio_url)
+                self.out.emit("extracted", url=page_url, title=title, m3u8=job.stream_url, out_file=out_file)
+                self.record("mark_extracted", job)
+                self.queue.put(job)
+
+    def download_loop(self):
+        while not self.cancelled.is_set():
+            if self.tuner:
+                self.tuner.acquire()    # --autotune: 지금 한도만큼의 스레드만 작업을 잡음
+            try:
+                if not self.download_next():
+                    return
+            finally:
+                if self.tuner:
+                    self.tuner.release()
+
+    def download_next(self) -> bool:
+        """큐에서 작업 하나를 꺼내 받음. 큐가 닫혀 더 받을 작업이 없으면 False"""
+        job = self.queue.get(block=True)
+        if job is None:
+            return False
+        self.out.emit("start", url=job.page_url, out_file=job.out_file, engine=self.args.engine)
+        started = time.monotonic()
+        if job.queued_at:
+            self.metrics.add(job.page_url, "queue_wait", started - job.queued_at)
+        self.record("mark_started", job)
+        try:
+            ok, failure = self.download_with_retry(job)
+        finally:
+            self.queue.task_done(job)
+        if ok and self.opts.needs_transcode:
+            # 다운로드 자리는 바로 다음 작업에 넘기고 인코딩은 인코딩 스레드에 맡김
+            self.out.emit("downloaded", url=job.page_url, source=source_output_path(job.out_file))
+            self.transcode_queue.put((job, started))
+            return True
+        self.finish(job, ok, failure, started)
+        return True
+
+    def transcode_loop(self):
+        while True:
+            item = self.transcode_queue.get()
+            if item is None:
+                return
+            job, started = item
+            if self.cancelled.is_set():
+                self.record("mark_retry", job)     # 원본은 남아 있으므로 다음에는 인코딩부터
+                continue
+            ok, failure = self.transcode(job)
+            self.finish(job, ok, failure, started)
+
+    def stop_transcoding(self, workers: int):
+        for _ in range(workers):
+            self.transcode_queue.put(None)
+
+    def transcode(self, job: DownloadJob):
+        """받아 둔 원본을 인코딩해 출력 파일로 → (성공 여부, 실패 분류). 실패하면 원본은 남겨 둠"""
+        source = source_output_path(job.out_file)
+        partial = partial_output_path(job.out_file)
+        self.out.emit("transcode_start", url=job.page_url, source=source, out_file=job.out_file)
+        cmd = build_transcode_command(source, partial, self.opts, transcode_threads(self.args.transcode_jobs))
+        ok, _, failure = self.run_ffmpeg(cmd, job, stage="transcode")
+        try:
+            ok = commit_partial_output(partial, job.out_file, ok)
+        except OSError as e:
+            self.out.log(f"[ERROR] 출력 파일 이동 실패: {job.out_file} | {e}")
+            return False, classify_failure(exc=e)
+        if not ok:
+            return False, failure
+        try:
+            os.remove(source)
+        except OSError:
+            pass
+        return True, ""
+
+    def finish(self, job: DownloadJob, ok: bool, failure: str, started: float):
+        """작업 하나가 끝남: 상태 기록, 색인, 결과 집계"""
+        if not ok and self.cancelled.is_set():
+            self.record("mark_retry", job)     # 중단된 작업은 다음 실행 때 다시 받음
+        else:
+            self.record("mark_finished", job.page_url, ok, failure, job.attempts)
+        with self.lock:
+            progress = self.progress.pop(job.page_url, None)
+        if ok:
+            self.index_output(job, progress)
+        if not ok and failure in ("auth", "expired") and self.cache:
+            # 만료된 m3u8일 수 있으므로 다음 실행 때 다시 추출되도록 캐시에서 제거
+            self.cache.invalidate(job.page_url)
+        with self.lock:
+            self.results["done" if ok else "failed"] += 1
+        if ok or not self.cancelled.is_set():
+            self.metrics.count("jobs_done" if ok else "jobs_failed")
+        self.out.emit("done", url=job.page_url, out_file=job.out_file, ok=ok, failure=failure,
+                      attempts=job.attempts + 1, seconds=round(time.monotonic() - started, 2))
+
+    def index_output(self, job: DownloadJob, progress=None):
+        """완료된 출력을 검증해 다운로드 색인에 기록"""
+        if self.index is None or lecture_key(job.page_url) is None:
+            return
+        progress = progress or FfmpegProgress()
+        try:
+            if not self.index.add(job.page_url, job.out_file, job.title, progress.duration, progress.out_time):
+                self.out.emit("verify_failed", url=job.page_url, out_file=job.out_file,
+                              duration=round(progress.duration, 2), out_time=round(progress.out_time, 2))
+        except (OSError, sqlite3.Error) as e:
+            self.out.log(f"[WARN] 다운로드 색인 기록 실패: {e}")
+
+    def download_with_retry(self, job: DownloadJob):
+        """실패 분류에 맞춰 재시도하며 받음 → (성공 여부, 마지막 실패 분류).
+        재시도 동안에도 호스트 자리는 그대로 쥐고 있어서 같은 호스트에 요청이 몰리지 않음"""
+        while True:
+            ok, http_error, failure = self.download(job)
+            if ok or self.cancelled.is_set():
+                if ok and self.tuner:
+                    self.tuner.record(True)
+                return ok, ""
+            failure = failure or classify_failure(http_error=http_error)
+            if self.tuner and failure not in ("disk", "playlist"):
+                self.tuner.record(False)    # 재시도할 실패도 서버가 버거워한다는 신호로 셈
+            action = self.retry.next_action(job, failure)
+            if not action:
+                return False, failure
+            job.attempts += 1
+            job.last_failure = failure
+            self.record("mark_retry", job)
+            self.metrics.count("retries")
+            with self.lock:
+                self.results["retried"] += 1
+            delay = self.retry.delay(job.attempts) if action == "backoff" else 0.0
+            self.out.emit("retry", url=job.page_url, attempt=job.attempts, failure=failure,
+                          http_error=http_error, action=action, delay=round(delay, 1))
+            if delay and self.cancelled.wait(delay):
+                return False, failure
+            if action != "backoff" and not self.refresh(job, action == "reextract"):
+                return False, failure
+
+    def refresh(self, job: DownloadJob, reextract: bool) -> bool:
+        """쿠키 파일을 다시 읽고(사용자가 새로 내보냈을 수 있음) 페이지를 다시 추출해 작업 갱신"""
+        host = job_host(job)
+        extractor = self.extractors.get(host)
+        if extractor is None:
+            return False
+        with self.sessions.lock_for(host):
+            if self.args.cookies and extractor.session:
+                try:
+                    load_cookie_file(extractor.session, self.args.cookies)
+                    self.cookies.update(host, session_cookies_as_dicts(extractor.session))
+                except OSError as e:
+                    self.out.log(f"[WARN] 쿠키 파일 다시 읽기 실패: {e}")
+            result = extractor.refresh(job.page_url, reextract)
+        if not result:
+            self.out.emit("extract_failed", url=job.page_url, retry=True)
+            return False
+        job.update_stream(result)
+        return True
+
+    def download(self, job: DownloadJob):
+        """(성공 여부, HTTP 오류 코드, 실패 분류).
+        MP3/재인코딩이면 재인코딩 없이 원본(source_output_path)까지만 받음 (인코딩은 transcode)"""
+        # 추출 때 받은 쿠키가 배치 도중 만료됐을 수 있으므로 캐시의 최신 쿠키로 교체
+        cookie_header = self.cookies.header_for(job_host(job), job.stream_url)
+        if cookie_header:
+            job.cookie_header = cookie_header
+        source = source_output_path(job.out_file) if self.opts.needs_transcode else ""
+        if source and os.path.exists(source):
+            self.out.emit("source_reused", url=job.page_url, source=source)
+            return True, 0, ""
+        opts = self.opts.download_options() if source else self.opts
+        target = source or job.out_file
+        partial = partial_output_path(target)
+        duration = 0.0
+        cmd = None
+        stage = "download"
+        if self.args.engine == "segment":
+            def on_progress(done, total):
+                self.out.emit("segments", url=job.page_url, done=done, total=total)
+
+            result = fetch_job_segments(
+                job, self.opts.user_agent, self.args.segments,
+                self.cancelled.is_set, on_progress, self.out.log, self.bandwidth,
+                self.metrics.timer(job.page_url), concat_to=source, keys=self.keys,
+            )
+            if not result.ok and not result.unsupported:
+                return False, result.http_error, result.failure
+            if result.assembled:
+                return True, 0, ""
+            if result.unsupported and self.bandwidth.rate > 0:
+                # ffmpeg 직접 다운로드에는 대역폭 한도를 걸 수 없음 → 한도 없이 받는다는 것을 알림
+                self.out.log(f"[WARN] 대역폭 한도 없이 ffmpeg로 받습니다: {job.page_url}")
+                self.out.emit("rate_limit_bypassed", url=job.page_url, max_rate=self.args.max_rate)
+            if result.ok:
+                local = [str(p) for p in result.local_playlists]
+                cmd = build_ffmpeg_command(
+                    job, opts, local[0], partial, local_playlist=True, encrypted=result.encrypted,
+                    audio_input=local[1] if len(local) > 1 else "",
+                )
+                duration = result.duration
+                stage = "assemble"
+        if cmd is None:
+            if not source:
+                return self.run_ffmpeg(build_ffmpeg_command(job, opts), job)
+            cmd = build_ffmpeg_command(job, opts, out_file=partial)
+        ok, http_error, failure = self.run_ffmpeg(cmd, job, duration, stage)
+        try:
+            return commit_partial_output(partial, target, ok, segment_parts_dir(job.out_file)), http_error, failure
+        except OSError as e:
+            self.out.log(f"[ERROR] 출력 파일 이동 실패: {job.out_file} | {e}")
+            return False, 0, classify_failure(exc=e)
+
+    def run_ffmpeg(self, cmd: list, job: DownloadJob, duration: float = 0.0, stage: str = "download"):
+        """ffmpeg 실행 후 (성공 여부, 로그에서 본 HTTP 오류 코드, 실패 분류).
+        stdout의 -progress 블록마다 progress 이벤트를 내보내고, stderr 로그는 별도 스레드에서 읽음.
+        stage(download/assemble/transcode)로 실행 시간을 단계별 계측에 기록"""
+        progress = FfmpegProgress(duration)
+        with self.metrics.timer(job.page_url).stage("ffmpeg_start"):
+            proc = subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+        with self.lock:
+            self.procs.add(proc)
+        with self.lock:
+            self.progress[job.page_url] = progress
+        http_error = 0
+        failure = ""
+        tail = deque(maxlen=5)
+
+        def read_log():
+            nonlocal http_error, failure
+            for raw in proc.stderr:
+                line = raw.decode(errors="ignore")
+                http_error = parse_http_error(line) or http_error
+                failure = classify_failure(line, http_error) or failure
+                progress.feed_log(line)
+                tail.append(line.strip())
+
+        log_thread = threading.Thread(target=read_log, daemon=True)
+        log_thread.start()
+        for raw in proc.stdout:
+            received = progress.total_size
+            if progress.feed_progress(raw.decode(errors="ignore")):
+                if stage == "download":
+                    with self.lock:
+                        self.ffmpeg_bytes += max(0, progress.total_size - received)
+                self.out.emit("progress", url=job.page_url, **progress.as_dict())
+        code = proc.wait()
+        log_thread.join()
+        record_ffmpeg_timings(self.metrics, job.page_url, progress, stage)
+        with self.lock:
+            self.procs.discard(proc)
+        if code != 0:
+            self.out.emit("ffmpeg_error", url=job.page_url, code=code, http_error=http_error,
+                          failure=failure, tail=list(tail))
+        return code == 0, http_error, failure
+
+    def tune_loop(self, done: threading.Event):
+        """--autotune: TUNE_INTERVAL마다 지난 구간의 처리량/실패율로 동시 다운로드 수를 다시 정하고
+        concurrency 이벤트로 알림 (바뀌었으면 로그도 남김)"""
+        self.tuner.sample(self.received_bytes())
+        while not done.wait(TUNE_INTERVAL):
+            busy = len(self.queue) > 0 and self.tuner.active >= self.tuner.limit
+            sample = self.tuner.sample(self.received_bytes(), busy)
+            if sample is None:
+                continue
+            self.out.emit("concurrency", **sample.as_dict())
+            if sample.limit != sample.before:
+                self.out.log(f"[TUNE] {sample.describe()}")
+
+    def received_bytes(self) -> int:
+        with self.lock:
+            return self.bandwidth.total + self.ffmpeg_bytes
+
+    def cancel(self):
+        self.cancelled.set()
+        self.queue.close()
+        with self.lock:
+            for proc in self.procs:
+                proc.kill()
+
+
+def main(argv=None) -> int:
+    startup = StartupProfile(STARTED_AT)
+    startup.mark("import engine", ENGINE_IMPORTED_AT)
+    args = parse_args(argv)
+    out = JsonLinesWriter(sys.stdout)
+    urls = read_urls(args.url_file)
+    if not urls:
+        out.emit("error", message="URL이 없습니다.")
+        return 2
+    if not is_ffmpeg_available():
+        out.emit("error", message="ffmpeg 실행 파일을 찾을 수 없습니다.")
+        return 2
+
+    session = make_http_session(args.user_agent, pool_size=max(8, args.jobs))
+    if args.cookies:
+        out.emit("cookies", loaded=load_cookie_file(session, args.cookies))
+    # 강좌 페이지 URL은 강의 목록으로 펼침 (제목이 바뀐 강의는 받은 적이 있어도 다시 받음)
+    changed = []
+    if any(is_course_url(u) for u in urls):
+        try:
+            manifest = CourseManifest(app_data_dir() / "courses.sqlite3")
+        except (OSError, sqlite3.Error) as e:
+            out.emit("error", message=f"강좌 동기화 목록을 열 수 없습니다: {e}")
+            return 2
+        urls, syncs = sync_courses(session, urls, manifest, out.log)
+        manifest.close()
+        for sync in syncs:
+            out.emit("course_synced", url=sync.course_url, lectures=len(sync.lectures), new=sync.new,
+                     changed=sync.changed, not_modified=sync.not_modified, error=sync.error)
+            changed += sync.changed
+
+    cache = None
+    if args.cache_ttl > 0:
+        cache = ExtractionCache(app_data_dir() / "cache.sqlite3", args.cache_ttl * 3600)
+        for page_url in changed:
+            cache.invalidate(page_url)
+    # 이미 받은 강의는 추출·다운로드 전에 건너뜀 (저장 폴더가 달라도 같은 강의면 건너뜀)
+    index = None
+    try:
+        index = DownloadIndex(app_data_dir() / "downloads.sqlite3")
+    except (OSError, sqlite3.Error) as e:
+        out.emit("error", message=f"다운로드 색인을 열 수 없습니다: {e}")
+    ext = FfmpegOptions(args.user_agent, args.mp3).ext
+    if index:
+        for page_url in changed:
+            index.forget(page_url, ext)
+    if index and not args.redownload:
+        remaining = []
+        for page_url in urls:
+            out_file = index.lookup(page_url, ext)
+            if out_file:
+                out.emit("already_downloaded", url=page_url, out_file=out_file)
+            else:
+                remaining.append(page_url)
+        urls = remaining
+    # 저장된 상태로 이어가기: 끝난 URL은 건너뛰고, 추출까지 끝난 URL은 바로 다운로드
+    store = None
+    plan = {"extract": urls, "resume": [], "done": []}
+    try:
+        store = JobStore(Path(args.job_db).expanduser() if args.job_db else app_data_dir() / "jobs.sqlite3")
+        store.forget(changed)
+        plan = store.enqueue(urls, Path(args.out_dir).expanduser().resolve(),
+                             resume=not (args.no_resume or args.redownload))
+    except (OSError, sqlite3.Error) as e:
+        out.emit("error", message=f"작업 저장소를 열 수 없어 상태 저장 없이 진행합니다: {e}")
+    if plan["done"]:
+        out.emit("skipped", count=len(plan["done"]), urls=plan["done"])
+    urls = plan["extract"]
+
+    # 시작 예산은 크롬(--browser)을 띄우기 전까지만 잰다 (크롬 시작은 따로 오래 걸림)
+    startup.mark("준비")
+    out.emit("startup", **startup.as_dict())
+    if startup.over_budget():
+        out.log(f"[WARN] {startup.report()}")
+    browsers = start_browsers(urls, session, args.headless) if args.browser else SessionPool()
+    cookies = CookieJarCache()
+    metrics = BatchMetrics()
+    extractors = make_extractors(args, session, browsers, cookies, cache, metrics, urls, plan["resume"], out.log)
+    refresher = None
+    if len(browsers):
+        refresher = CookieRefresher(browsers, cookies, export_path=args.export_cookies, log=out.log)
+        refresher.start()
+    runner = BatchRunner(args, out, cache, browsers, cookies, store, index, metrics)
+    runner.out_dir.mkdir(parents=True, exist_ok=True)
+    runner.resume(plan["resume"])
+    transcode_jobs = max(1, args.transcode_jobs) if runner.opts.needs_transcode else 0
+
+    out.emit("batch_start", urls=len(urls) + len(plan["resume"]), jobs=args.jobs, autotune=args.autotune, engine=args.engine, out_dir=str(runner.out_dir),
+             per_host=args.per_host, max_rate=args.max_rate, transcode_jobs=transcode_jobs)
+    started = time.monotonic()
+    extract_thread = threading.Thread(target=runner.extract_all, args=(extractors, urls), daemon=True)
+    threads = runner.tuner.maximum if runner.tuner else max(1, args.jobs)
+    workers = [threading.Thread(target=runner.download_loop, daemon=True) for _ in range(threads)]
+    transcoders = [threading.Thread(target=runner.transcode_loop, daemon=True) for _ in range(transcode_jobs)]
+    tune_done = threading.Event()
+    if runner.tuner:
+        threading.Thread(target=runner.tune_loop, args=(tune_done,), daemon=True).start()
+    extract_thread.start()
+    for t in workers + transcoders:
+        t.start()
+    try:
+        for t in [extract_thread] + workers:
+            while t.is_alive():
+                t.join(0.5)
+        # 다운로드가 모두 끝난 뒤 남은 인코딩을 마저 기다림
+        runner.stop_transcoding(len(transcoders))
+        for t in transcoders:
+            while t.is_alive():
+                t.join(0.5)
+    except KeyboardInterrupt:
+        out.emit("cancelled")
+        runner.cancel()
+        runner.stop_transcoding(len(transcoders))
+        for t in workers + transcoders:
+            t.join(5)
+    finally:
+        tune_done.set()
+        if refresher:
+            refresher.stop()
+        if args.export_cookies:
+            try:
+                out.emit("cookies_exported", path=args.export_cookies, count=cookies.export(args.export_cookies))
+            except OSError as e:
+                out.emit("error", message=f"쿠키 파일 저장 실패: {e}")
+        session.close()
+        if cache:
+            cache.close()
+        if store:
+            store.close()
+        if index:
+            index.close()
+        browsers.close()
+
+    out.emit("metrics", counters=metrics.counters, stages=metrics.summary())
+    for path, export in [(args.metrics_json, metrics.export_json), (args.metrics_prom, metrics.export_prometheus)]:
+        if path:
+            try:
+                export(path)
+            except OSError as e:
+                out.emit("error", message=f"계측 결과 저장 실패: {path} | {e}")
+    out.emit("batch_done", seconds=round(time.monotonic() - started, 2), **runner.results)
+    return 0 if runner.results["failed"] == 0 and not runner.cancelled.is_set() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
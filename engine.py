@@ -0,0 +1,2690 @@
+# engine.py
+"""LMS 강의 추출/다운로드 엔진 (Qt 없이 동작).
+
+GUI(main.py)와 헤드리스 CLI(cli.py)가 함께 쓰는 부분:
+URL/파일명 유틸, 쿠키, 페이지 추출(브라우저/HTTP), 추출 캐시,
+HLS 플레이리스트와 세그먼트 다운로드, 작업 큐, ffmpeg 명령 생성.
+"""
+import re
+import json
+import math
+import mmap
+import time
+import errno
+import random
+import unicodedata
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from html import unescape
+from http.cookiejar import MozillaCookieJar
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs, urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Selenium은 불러오는 데만 수백 ms가 걸리고 브라우저를 쓸 때만 필요해서,
+# 브라우저를 다루는 함수 안에서 처음 쓸 때 불러온다 (빠른 추출/CLI만 쓰면 아예 불러오지 않음).
+
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome Safari"
+)
+
+
+# -------------------유틸 ----------------------
+def extract_id_from_url(u: str) -> str:
+    """?id= 숫자 뽑기 (없으면 도메인+타임스탬프)"""
+    try:
+        q = parse_qs(urlparse(u).query)
+        if "id" in q and q["id"]:
+            return q["id"][0]
+    except Exception:
+        pass
+    ts = str(int(time.time()*1000))
+    host = urlparse(u).netloc.replace(".", "_")
+    return f"{host}_{ts}"
+
+
+def get_base_url(full_url: str) -> str:
+    """전체 URL에서 스킴+도메인까지만 추출 → https://domain/"""
+    p = urlparse(full_url)
+    if not p.scheme or not p.netloc:
+        return ""
+    return f"{p.scheme}://{p.netloc}/"
+
+
+def sanitize_filename(name: str, max_len: int = 150) -> str:
+    """
+    파일 시스템에 안전한 파일명 생성 + 글자 사이 공백 보정
+    """
+    name = unicodedata.normalize("NFKC", name or "").strip()
+
+    forbidden = '<>:"/\\|?*\0'
+    name = "".join("" if ch in forbidden else ch for ch in name)
+
+    name = re.sub(r'(?<=[A-Za-z])\s+(?=[A-Za-z])', '', name)
+    name = re.sub(r'\s+', ' ', name)
+    name = re.sub(r'\s+,', ',', name)
+    name = re.sub(r'\s+([\)\]\}])', r'\1', name)
+    name = re.sub(r'\s*-\s*', ' - ', name)
+    name = re.sub(r'([\(\[\{])\s+', r'\1', name)
+    name = "".join(ch if (ch.isprintable()) else " " for ch in name).strip()
+
+    if not name:
+        name = "untitled"
+    if len(name) > max_len:
+        name = name[:max_len].rstrip()
+
+    return name
+
+
+def build_cookie_header_from_driver(driver, target_url: str) -> str:
+    """
+    Selenium driver에 저장된 쿠키를 가져와 ffmpeg에 넣을 Cookie 헤더 문자열로 변환.
+    target_url 도메인과 매칭되는 쿠키만 포함.
+    """
+    try:
+        cookies = driver.get_cookies()
+    except Exception:
+        return ""
+    return build_cookie_header(cookies, target_url)
+
+
+def build_cookie_header(cookies, target_url: str) -> str:
+    """Selenium 형식 쿠키 목록(dict)에서 target_url 도메인과 매칭되는 쿠키만 Cookie 헤더로 변환"""
+    t_host = urlparse(target_url).hostname or ""
+    pairs = []
+    for c in cookies:
+        name = c.get("name")
+        value = c.get("value")
+        domain = (c.get("domain") or "").lstrip(".")
+        if name and value and (t_host.endswith(domain) or domain.endswith(t_host)):
+            pairs.append(f"{name}={value}")
+    return "; ".join(pairs)
+
+
+# -------------------추출 ----------------------
+# 추출 방식: 네트워크 로그(CDP)에서 m3u8 요청을 잡거나, DOM에 <video>가 뜰 때까지 대기
+EXTRACT_MODES = {
+    "cdp": "네트워크 로그(CDP)",
+    "dom": "DOM 대기",
+}
+
+
+def accept_alert_if_present(driver, log=print) -> bool:
+    """열려 있는 alert(이전 재생기록 팝업 등)가 있으면 '확인'을 누름"""
+    from selenium.common.exceptions import NoAlertPresentException
+    try:
+        alert = driver.switch_to.alert
+        text = alert.text
+        log(f"[INFO] 알림 발견: {text}\n → 자동 '확인' 클릭\n")
+        alert.accept()   # 확인(=이어보기)
+        return True
+    except NoAlertPresentException:
+        return False
+    except Exception:
+        return False
+
+
+def find_m3u8_in_performance_log(entries) -> str:
+    """Chrome performance 로그 항목에서 .m3u8 요청 URL을 찾음 (없으면 빈 문자열)"""
+    for entry in entries:
+        try:
+            msg = json.loads(entry["message"])["message"]
+        except Exception:
+            continue
+        method = msg.get("method")
+        params = msg.get("params") or {}
+        if method == "Network.requestWillBeSent":
+            url = (params.get("request") or {}).get("url", "")
+        elif method == "Network.responseReceived":
+            url = (params.get("response") or {}).get("url", "")
+        else:
+            continue
+        if ".m3u8" in urlparse(url).path:
+            return url
+    return ""
+
+
+def wait_m3u8_from_network_log(driver, timeout: float = 15.0, log=print) -> str:
+    """플레이어가 .m3u8을 요청하는 순간 그 URL을 반환 (시간 초과 시 빈 문자열)"""
+    from selenium.common.exceptions import UnexpectedAlertPresentException
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            src = find_m3u8_in_performance_log(driver.get_log("performance"))
+        except UnexpectedAlertPresentException:
+            accept_alert_if_present(driver, log)
+            continue
+        if src:
+            return src
+        accept_alert_if_present(driver, log)
+        time.sleep(0.1)
+    return ""
+
+
+def extract_m3u8_and_title_from_page(driver, page_url: str, log=print, mode: str = "dom", timer=None):
+    """강의 페이지를 열어 (m3u8 URL, 제목)을 반환. log는 로그 문자열을 받는 콜백.
+    timer(StageTimer)가 있으면 페이지 로딩/알림 대기/<video> 대기/정규식 백업 등 단계별 시간을 기록"""
+    from selenium.common.exceptions import UnexpectedAlertPresentException
+    timer = timer or StageTimer()
+    if mode == "cdp":
+        try:
+            driver.get_log("performance")  # 이전 페이지에서 쌓인 로그 비우기
+        except Exception:
+            log("[WARN] performance 로그를 쓸 수 없어 DOM 방식으로 추출합니다.\n")
+            mode = "dom"
+
+    with timer.stage("page_load"):
+        try:
+            driver.get(page_url)
+        except UnexpectedAlertPresentException:
+            accept_alert_if_present(driver, log)
+
+    if mode == "cdp":
+        with timer.stage("cdp_wait"):
+            src = wait_m3u8_from_network_log(driver, log=log)
+            accept_alert_if_present(driver, log)
+        if src:
+            return src, extract_title_from_page(driver)
+        log(f"[WARN] 네트워크 로그에서 m3u8을 찾지 못해 DOM에서 찾습니다: {page_url}\n")
+    else:
+        # 팝업(이전 재생기록) 자동 처리
+        with timer.stage("alert_wait"):
+            time.sleep(1)  # 페이지 진입 직후 alert 뜰 시간
+            accept_alert_if_present(driver, log)
+
+    return extract_m3u8_and_title_from_dom(driver, timer)
+
+
+def extract_m3u8_and_title_from_dom(driver, timer=None):
+    """이미 열린 페이지의 DOM에서 (m3u8 URL, 제목)을 찾음"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    timer = timer or StageTimer()
+    # <video> 대기
+    with timer.stage("video_wait"):
+        try:
+            WebDriverWait(driver, 15).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, "video"))
+            )
+        except Exception:
+            pass
+
+    # 제목 추출
+    title = extract_title_from_page(driver)
+
+    # <video><source> 직접 추출
+    try:
+        elem = driver.find_element(By.CSS_SELECTOR, "video source")
+        src = elem.get_attribute("src") or ""
+        if ".m3u8" in src:
+            return src, title
+    except Exception:
+        pass
+
+    # 정규식 백업
+    with timer.stage("regex_fallback"):
+        return find_m3u8_in_html(driver.page_source or ""), title
+
+
+M3U8_URL_RE = re.compile(r'https?://[^\s"\']+?\.m3u8[^\s"\']*')
+VOD_TITLE_RE = re.compile(
+    r'<h1[^>]*class=["\'][^"\']*\bvod-title\b[^"\']*["\'][^>]*>(.*?)</h1>', re.S | re.I
+)
+
+
+def find_m3u8_in_html(html: str) -> str:
+    """HTML 문자열에서 첫 번째 .m3u8 URL을 찾음 (없으면 빈 문자열)"""
+    m = M3U8_URL_RE.search(html)
+    return unescape(m.group(0)) if m else ""
+
+
+def find_title_in_html(html: str) -> str:
+    """HTML 문자열에서 <h1 class='vod-title'> 텍스트를 찾음 (없으면 빈 문자열)"""
+    m = VOD_TITLE_RE.search(html)
+    if not m:
+        return ""
+    text = re.sub(r"<[^>]+>", " ", m.group(1))
+    return re.sub(r"\s+", " ", unescape(text)).strip()
+
+
+# video 태그에 주소가 없으면 플레이어가 이미 요청한 리소스 중 첫 m3u8(보통 마스터 재생목록)을 씀
+TAB_PROBE_SCRIPT = """
+var s = document.querySelector('video source') || document.querySelector('video');
+var h = document.querySelector('h1.vod-title');
+var src = s ? (s.src || s.getAttribute('src') || '') : '';
+if (src.indexOf('.m3u8') < 0) {
+  var entries = performance.getEntriesByType('resource');
+  for (var i = 0; i < entries.length; i++) {
+    if (entries[i].name.indexOf('.m3u8') >= 0) { src = entries[i].name; break; }
+  }
+}
+return [src, h ? h.textContent : ''];
+"""
+
+
+def extract_in_tabs(driver, page_urls: list, timeout: float = 25.0, log=print, on_stage=None) -> dict:
+    """같은 브라우저에 페이지마다 새 탭을 열어 두고 돌아가며 m3u8을 찾음 → {page_url: (m3u8, 제목)}.
+    WebDriver 명령은 한 번에 하나씩 처리되지만 탭마다 페이지 로딩/플레이어 준비는 동시에 진행되고,
+    모든 탭이 브라우저의 로그인 쿠키를 함께 쓴다. 찾지 못한 페이지는 결과에 없다.
+    폴링 중에는 가벼운 TAB_PROBE_SCRIPT(video 태그 + 리소스 타이밍의 m3u8 요청)만 돌려서
+    플레이어가 재생목록을 요청하는 즉시 탭을 닫고, timeout까지 못 찾은 탭만 마지막에 한 번
+    page_source(DOM 전체 직렬화)를 정규식으로 훑는다.
+    on_stage(page_url, "tab_wait", 초)가 있으면 탭을 연 뒤 찾기까지 걸린 시간을 넘김"""
+    from selenium.common.exceptions import UnexpectedAlertPresentException
+    home = driver.current_window_handle
+    tabs = {}
+    opened = {}
+    try:
+        for page_url in page_urls:
+            driver.switch_to.new_window("tab")
+            # driver.get과 달리 로딩 완료를 기다리지 않음 → 다음 탭을 바로 염
+            opened[page_url] = time.monotonic()
+            driver.execute_script("window.location.href = arguments[0];", page_url)
+            tabs[driver.current_window_handle] = page_url
+
+        found = {}
+        titles = {}
+        deadline = time.monotonic() + timeout
+        while tabs and time.monotonic() < deadline:
+            for handle, page_url in list(tabs.items()):
+                driver.switch_to.window(handle)
+                try:
+                    src, title = driver.execute_script(TAB_PROBE_SCRIPT)
+                except UnexpectedAlertPresentException:
+                    accept_alert_if_present(driver, log)
+                    continue
+                titles[handle] = title
+                if ".m3u8" in (src or ""):
+                    found[page_url] = (src, re.sub(r"\s+", " ", title or "").strip())
+                    if on_stage:
+                        on_stage(page_url, "tab_wait", time.monotonic() - opened[page_url])
+                    driver.close()
+                    del tabs[handle]
+            time.sleep(0.3)
+        # 프로브로 못 찾은 탭만 HTML 전체를 한 번씩 훑음 (인라인 스크립트 등에 적힌 m3u8)
+        for handle, page_url in list(tabs.items()):
+            driver.switch_to.window(handle)
+            try:
+                src = find_m3u8_in_html(driver.page_source or "")
+            except UnexpectedAlertPresentException:
+                accept_alert_if_present(driver, log)
+                continue
+            if src:
+                found[page_url] = (src, re.sub(r"\s+", " ", titles.get(handle) or "").strip())
+                if on_stage:
+                    on_stage(page_url, "tab_wait", time.monotonic() - opened[page_url])
+        return found
+    finally:
+        for handle in tabs:
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except Exception:
+                pass
+        driver.switch_to.window(home)
+
+
+# -------------------브라우저 세션 풀 ----------------------
+def open_chrome(start_url: str = "", headless: bool = False):
+    """네트워크 로그(CDP)를 켠 크롬을 띄우고 start_url로 이동"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    # 네트워크 로그(CDP) 추출 방식에서 m3u8 요청을 잡기 위해 performance 로그 활성화
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    if headless:
+        options.add_argument("--headless=new")
+    driver = webdriver.Chrome(options=options)
+    if start_url:
+        driver.get(start_url)
+    return driver
+
+
+def group_urls_by_host(urls) -> dict:
+    """URL 목록을 LMS 호스트(get_base_url)별로 나눔 (입력 순서 유지)"""
+    groups = {}
+    for u in urls:
+        groups.setdefault(get_base_url(u) or u, []).append(u)
+    return groups
+
+
+class SessionPool:
+    """LMS 호스트(get_base_url)마다 로그인된 브라우저(driver)를 하나씩 관리.
+    같은 호스트의 페이지는 그 브라우저(의 탭)에서 추출해 로그인 쿠키를 함께 쓴다."""
+
+    def __init__(self, open_driver=open_chrome):
+        self.open_driver = open_driver      # start_url → driver
+        self.drivers = {}                   # base_url → driver
+        self.locks = {}                     # base_url → driver를 쓰는 동안 잡는 잠금
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.drivers)
+
+    def __contains__(self, base_url: str) -> bool:
+        return base_url in self.drivers
+
+    def hosts(self) -> list:
+        return list(self.drivers)
+
+    def missing_hosts(self, urls) -> list:
+        """아직 브라우저가 없는 호스트 목록"""
+        return [h for h in group_urls_by_host(urls) if h not in self.drivers]
+
+    def open(self, base_url: str):
+        with self.lock:
+            driver = self.drivers.get(base_url)
+            if driver is None:
+                driver = self.drivers[base_url] = self.open_driver(base_url)
+            return driver
+
+    def add(self, base_url: str, driver):
+        with self.lock:
+            self.drivers[base_url] = driver
+
+    def lock_for(self, base_url: str):
+        """그 호스트의 driver를 쓰는 동안 잡는 잠금 (WebDriver 명령이 스레드끼리 섞이지 않게)"""
+        with self.lock:
+            return self.locks.setdefault(base_url, threading.RLock())
+
+    def driver_for(self, page_url: str):
+        return self.drivers.get(get_base_url(page_url))
+
+    def close(self):
+        with self.lock:
+            drivers, self.drivers = list(self.drivers.values()), {}
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+
+# -------------------브라우저 없는 빠른 추출 ----------------------
+def make_http_session(user_agent: str = "", pool_size: int = 8) -> requests.Session:
+    """keep-alive 연결을 재사용하는 requests 세션"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if user_agent:
+        session.headers["User-Agent"] = user_agent
+    return session
+
+
+def copy_driver_cookies_to_session(driver, session: requests.Session):
+    """로그인된 Selenium 쿠키를 requests 세션으로 복사"""
+    for c in driver.get_cookies():
+        if c.get("name") and c.get("value") is not None:
+            session.cookies.set(
+                c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/")
+            )
+
+
+def session_cookies_as_dicts(session: requests.Session) -> list:
+    """requests 쿠키를 build_cookie_header가 받는 Selenium 형식으로 변환"""
+    return [
+        {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path or "/",
+         "secure": bool(c.secure), **({"expiry": int(c.expires)} if c.expires else {})}
+        for c in session.cookies
+    ]
+
+
+def load_cookie_file(session: requests.Session, path) -> int:
+    """Netscape(cookies.txt) 형식 쿠키 파일을 세션에 넣음. 넣은 쿠키 수 반환"""
+    jar = MozillaCookieJar(str(path))
+    jar.load(ignore_discard=True, ignore_expires=True)
+    for c in jar:
+        session.cookies.set_cookie(c)
+    return len(jar)
+
+
+class CookieJarCache:
+    """LMS 호스트별 로그인 쿠키 캐시 (Selenium 형식 dict).
+    작업마다 driver.get_cookies()를 부르지 않고 max_age마다(또는 곧 만료될 쿠키가 있을 때만) 다시 읽는다.
+    만료 시간(expiry)이 지난 쿠키는 헤더에 넣지 않고, Netscape cookies.txt로 내보낼 수 있다."""
+
+    def __init__(self, max_age: float = 300.0, margin: float = 60.0):
+        self.max_age = max_age      # 이 시간이 지나면 브라우저에서 다시 읽음
+        self.margin = margin        # 만료까지 이만큼 남은 쿠키가 있어도 다시 읽음
+        self.jars = {}              # host → {(domain, path, name): cookie}
+        self.fetched = {}           # host → 마지막으로 읽은 시각 (monotonic)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _expired(cookie: dict, now: float, margin: float = 0.0) -> bool:
+        expiry = cookie.get("expiry")
+        return bool(expiry) and expiry <= now + margin
+
+    def update(self, host: str, cookies) -> int:
+        """새로 읽은 쿠키를 합침 (같은 domain/path/name은 교체). 합친 뒤 유효한 쿠키 수"""
+        now = time.time()
+        with self.lock:
+            jar = self.jars.setdefault(host, {})
+            for c in cookies:
+                if c.get("name") and c.get("value") is not None:
+                    jar[(c.get("domain", ""), c.get("path") or "/", c["name"])] = dict(c)
+            for key in [k for k, c in jar.items() if self._expired(c, now)]:
+                del jar[key]
+            self.fetched[host] = time.monotonic()
+            return len(jar)
+
+    def update_from_driver(self, host: str, driver) -> int:
+        return self.update(host, driver.get_cookies())
+
+    def cookies(self, host: str) -> list:
+        """만료되지 않은 쿠키 목록"""
+        now = time.time()
+        with self.lock:
+            return [c for c in self.jars.get(host, {}).values() if not self._expired(c, now)]
+
+    def stale(self, host: str) -> bool:
+        with self.lock:
+            fetched = self.fetched.get(host)
+            if fetched is None or time.monotonic() - fetched > self.max_age:
+                return True
+            now = time.time()
+            return any(self._expired(c, now, self.margin) for c in self.jars.get(host, {}).values())
+
+    def header_for(self, host: str, target_url: str) -> str:
+        return build_cookie_header(self.cookies(host), target_url)
+
+    def apply_to(self, host: str, session: requests.Session):
+        """requests 세션에 만료 시간까지 그대로 넣음 (빠른 추출/세그먼트 요청용)"""
+        for c in self.cookies(host):
+            session.cookies.set(
+                c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path") or "/",
+                expires=c.get("expiry"), secure=bool(c.get("secure")),
+            )
+
+    def export(self, path, hosts=None) -> int:
+        """유효한 쿠키를 Netscape(cookies.txt) 형식으로 저장 (cli.py --cookies 등에서 재사용). 저장한 쿠키 수"""
+        jar = MozillaCookieJar()
+        for host in hosts or list(self.jars):
+            for c in self.cookies(host):
+                jar.set_cookie(requests.cookies.create_cookie(
+                    c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path") or "/",
+                    expires=c.get("expiry"), secure=bool(c.get("secure")),
+                ))
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        jar.save(str(tmp), ignore_discard=True, ignore_expires=False)
+        os.chmod(tmp, 0o600)    # 로그인 세션이므로 본인만 읽을 수 있게
+        os.replace(tmp, path)
+        return len(jar)
+
+
+class CookieRefresher(threading.Thread):
+    """백그라운드에서 SessionPool 브라우저들의 쿠키를 주기적으로 CookieJarCache에 다시 읽어 두는 스레드.
+    추출 스레드가 그 호스트의 driver를 쓰는 중이면(pool.lock_for) 건너뛴다 (추출 쪽이 직접 갱신).
+    export_path가 있으면 갱신할 때마다 cookies.txt로도 내보낸다."""
+
+    def __init__(self, pool, cookies: CookieJarCache, interval: float = 60.0, export_path=None, log=print):
+        super().__init__(daemon=True)
+        self.pool = pool
+        self.cookies = cookies
+        self.interval = interval
+        self.export_path = export_path
+        self.log = log
+        self.stopped = threading.Event()
+
+    def run(self):
+        self.refresh_once()
+        while not self.stopped.wait(self.interval):
+            self.refresh_once()
+
+    def refresh_once(self):
+        changed = False
+        for host in self.pool.hosts():
+            driver = self.pool.drivers.get(host)
+            if driver is None or not self.cookies.stale(host):
+                continue
+            lock = self.pool.lock_for(host)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                self.cookies.update_from_driver(host, driver)
+                changed = True
+            except Exception as e:
+                self.log(f"[WARN] 쿠키 갱신 실패: {host} | {e}\n")
+            finally:
+                lock.release()
+        if changed and self.export_path:
+            try:
+                self.cookies.export(self.export_path)
+            except OSError as e:
+                self.log(f"[WARN] 쿠키 파일 저장 실패: {e}\n")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def extract_m3u8_and_title_via_http(session: requests.Session, page_url: str, timeout: float = 10.0):
+    """viewer.php를 직접 받아 HTML에서 (m3u8 URL, 제목)을 파싱. 실패하면 ("", "")"""
+    try:
+        resp = session.get(page_url, timeout=timeout)
+    except requests.RequestException:
+        return "", ""
+    if resp.status_code != 200:
+        return "", ""
+    html = resp.text
+    src = find_m3u8_in_html(html)
+    if not src:
+        return "", ""
+    return src, find_title_in_html(html)
+
+
+def extract_title_from_page(driver) -> str:
+    """현재 페이지에서 <h1 class='vod-title'> 텍스트 추출 (없으면 빈 문자열)"""
+    from selenium.common.exceptions import NoSuchElementException, UnexpectedAlertPresentException
+    from selenium.webdriver.common.by import By
+    try:
+        el = driver.find_element(By.CSS_SELECTOR, "h1.vod-title")
+        return (el.text or "").strip()
+    except (NoSuchElementException, UnexpectedAlertPresentException):
+        return ""
+
+
+# -------------------추출 캐시 ----------------------
+def app_data_dir() -> Path:
+    """캐시 등 앱 데이터를 두는 폴더 (~/.lms_downloader)"""
+    d = Path.home() / ".lms_downloader"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def lecture_key(page_url: str):
+    """(host, id) 반환. ?id=가 없는 URL은 안정적인 키가 없어 None"""
+    p = urlparse(page_url)
+    if "id" not in parse_qs(p.query):
+        return None
+    return p.netloc.lower(), extract_id_from_url(page_url)
+
+
+class ExtractionCache:
+    """host + LMS 영상 id → (m3u8 URL, 제목, 추출 시각)을 저장하는 SQLite 캐시.
+    ttl_sec가 지난 항목은 없는 것으로 취급하고, 다운로드가 403/404로 실패하면 invalidate로 지운다.
+    추출 스레드와 GUI 스레드가 함께 쓰므로 연결 하나를 lock으로 보호한다."""
+
+    def __init__(self, path: Path, ttl_sec: float):
+        self.path = Path(path)
+        self.ttl_sec = ttl_sec
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS extract_cache ("
+                " host TEXT NOT NULL, vid TEXT NOT NULL,"
+                " m3u8 TEXT NOT NULL, title TEXT NOT NULL, extracted_at REAL NOT NULL,"
+                " PRIMARY KEY (host, vid))"
+            )
+
+    key = staticmethod(lecture_key)
+
+    def get(self, page_url: str):
+        """유효한 캐시가 있으면 (m3u8, title), 없으면 None"""
+        key = self.key(page_url)
+        if key is None or self.ttl_sec <= 0:
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT m3u8, title, extracted_at FROM extract_cache WHERE host=? AND vid=?", key
+            ).fetchone()
+        if not row or time.time() - row[2] > self.ttl_sec:
+            return None
+        return row[0], row[1]
+
+    def put(self, page_url: str, m3u8: str, title: str):
+        key = self.key(page_url)
+        if key is None:
+            return
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO extract_cache (host, vid, m3u8, title, extracted_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (*key, m3u8, title or "", time.time()),
+            )
+
+    def invalidate(self, page_url: str):
+        key = self.key(page_url)
+        if key is None:
+            return
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM extract_cache WHERE host=? AND vid=?", key)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# -------------------추출기 ----------------------
+class Extractor:
+    """URL 하나를 (캐시 → 브라우저 없는 빠른 추출 → Selenium) 순서로 추출.
+    driver가 없으면(헤드리스 CLI 등) 브라우저 단계는 건너뛴다.
+    마스터 플레이리스트면 variant_policy에 맞는 variant/오디오 렌디션까지 골라 준다."""
+
+    def __init__(self, driver=None, session=None, mode: str = "dom", fast: bool = True, cache=None,
+                 variant_policy: str = "highest", audio_only: bool = False, log=print, tabs: int = 1,
+                 cookies: CookieJarCache = None, host: str = "", metrics=None):
+        self.driver = driver
+        self.metrics = metrics  # BatchMetrics (있으면 URL별 추출 단계 시간을 기록)
+        self.cookies = cookies  # 호스트별 쿠키 캐시 (없으면 세션/driver에서 바로 읽음)
+        self.host = host        # cookies에서 쓸 LMS 호스트 (get_base_url)
+        self.tabs = tabs        # extract_many에서 브라우저 탭을 동시에 몇 개까지 띄울지
+        self.session = session
+        self.mode = mode
+        self.fast = fast
+        self.cache = cache
+        self.variant_policy = variant_policy
+        self.audio_only = audio_only
+        self.log = log
+
+    def open_session(self):
+        """driver의 User-Agent/쿠키로 HTTP 세션을 만듦 (빠른 추출을 끄더라도 플레이리스트 분석에 씀)"""
+        if self.driver is None:
+            return  # 브라우저를 닫은 뒤의 재시도 추출 등: 캐시만 사용
+        try:
+            ua = self.driver.execute_script("return navigator.userAgent") or ""
+            self.session = make_http_session(ua)
+            if self.cookies is not None:
+                self.sync_cookies(force=self.cookies.stale(self.host))
+            else:
+                copy_driver_cookies_to_session(self.driver, self.session)
+        except Exception as e:
+            self.log(f"[WARN] 빠른 추출 세션 준비 실패, 브라우저로만 추출합니다: {e}\n")
+            self.session = None
+
+    def close(self):
+        if self.session:
+            self.session.close()
+
+    def timer(self, page_url: str):
+        return self.metrics.timer(page_url) if self.metrics else StageTimer()
+
+    def sync_cookies(self, force: bool = False):
+        """쿠키 캐시가 오래됐으면(force면 항상) 브라우저에서 다시 읽고 HTTP 세션에도 반영"""
+        if force or self.cookies.stale(self.host):
+            self.cookies.update_from_driver(self.host, self.driver)
+        if self.session:
+            self.cookies.apply_to(self.host, self.session)
+
+    def cookie_header_for(self, m3u8: str) -> str:
+        if self.cookies is not None:
+            if self.driver and self.cookies.stale(self.host):
+                try:
+                    self.sync_cookies(force=True)
+                except Exception as e:
+                    self.log(f"[WARN] 쿠키 갱신 실패: {e}\n")
+            return self.cookies.header_for(self.host, m3u8)
+        if self.session:
+            return build_cookie_header(session_cookies_as_dicts(self.session), m3u8)
+        if self.driver:
+            return build_cookie_header_from_driver(self.driver, m3u8)
+        return ""
+
+    def extract(self, page_url: str):
+        """(page_url, m3u8, title, cookie_header, media_url, audio_url) 또는 실패 시 None"""
+        try:
+            return self.extract_quick(page_url) or self.extract_in_browser(page_url)
+        except Exception as e:
+            self.log(f"[ERROR] 추출 중 오류: {page_url} | {e}\n")
+            return None
+
+    def extract_many(self, page_urls: list) -> list:
+        """여러 페이지를 한 번에 추출 → 입력 순서대로 결과(실패는 None) 목록.
+        캐시/빠른 추출로 안 되는 페이지가 여럿이면 브라우저 탭 tabs개에 동시에 띄워서 찾는다."""
+        results = {}
+        in_browser = []
+        for page_url in page_urls:
+            try:
+                results[page_url] = self.extract_quick(page_url)
+            except Exception as e:
+                self.log(f"[ERROR] 추출 중 오류: {page_url} | {e}\n")
+                continue
+            if not results[page_url] and self.driver:
+                in_browser.append(page_url)
+
+        if len(in_browser) > 1 and self.tabs > 1:
+            try:
+                found = extract_in_tabs(self.driver, in_browser, log=self.log,
+                                        on_stage=self.metrics.add if self.metrics else None)
+            except Exception as e:
+                self.log(f"[WARN] 탭 병렬 추출 실패, 한 페이지씩 다시 시도: {e}\n")
+                found = {}
+            for page_url, (m3u8, title) in found.items():
+                self.remember(page_url, m3u8, title)
+                results[page_url] = self.resolve(page_url, m3u8, title, self.browser_cookie_header(m3u8))
+
+        for page_url in in_browser:
+            if not results.get(page_url):
+                # 탭에서 못 찾은 페이지는 기존 방식(CDP/DOM 대기)으로 한 번 더
+                try:
+                    results[page_url] = self.extract_in_browser(page_url)
+                except Exception as e:
+                    self.log(f"[ERROR] 추출 중 오류: {page_url} | {e}\n")
+        return [results.get(u) for u in page_urls]
+
+    def extract_quick(self, page_url: str):
+        """캐시 → 브라우저 없는 빠른 추출. 둘 다 안 되면 None"""
+        timer = self.timer(page_url)
+        with timer.stage("cache_lookup"):
+            cached = self.cache.get(page_url) if self.cache else None
+        if cached:
+            m3u8, title = cached
+            self.log(f"[INFO] 캐시 사용: {page_url}\n")
+            return self.resolve(page_url, m3u8, title, self.cookie_header_for(m3u8))
+
+        if self.session and self.fast:
+            with timer.stage("http_extract"):
+                m3u8, title = extract_m3u8_and_title_via_http(self.session, page_url)
+            if m3u8:
+                self.remember(page_url, m3u8, title)
+                return self.resolve(page_url, m3u8, title, self.cookie_header_for(m3u8))
+            if self.driver:
+                self.log(f"[INFO] 빠른 추출 실패, 브라우저로 재시도: {page_url}\n")
+
+        if not self.driver:
+            self.log(f"[WARN] m3u8 추출 실패: {page_url}\n")
+        return None
+
+    def extract_in_browser(self, page_url: str):
+        if not self.driver:
+            return None
+        m3u8, title = extract_m3u8_and_title_from_page(self.driver, page_url, self.log, self.mode,
+                                                       self.timer(page_url))
+        if not m3u8:
+            self.log(f"[WARN] m3u8 추출 실패: {page_url}\n")
+            return None
+        self.remember(page_url, m3u8, title)
+        return self.resolve(page_url, m3u8, title or "", self.browser_cookie_header(m3u8))
+
+    def browser_cookie_header(self, m3u8: str) -> str:
+        """브라우저로 연 페이지의 쿠키 헤더 (쿠키 캐시가 있으면 캐시에서, 만료가 가까울 때만 브라우저에서 다시 읽음)"""
+        if self.cookies is not None:
+            return self.cookie_header_for(m3u8)
+        return build_cookie_header_from_driver(self.driver, m3u8)
+
+    def resolve(self, page_url: str, m3u8: str, title: str, cookie_header: str):
+        """마스터 플레이리스트면 variant/오디오 렌디션을 고름"""
+        media_url, audio_url = "", ""
+        if self.session:
+            headers = {"Referer": page_url}
+            if cookie_header:
+                headers["Cookie"] = cookie_header
+            try:
+                with self.timer(page_url).stage("resolve"):
+                    media_url, audio_url = resolve_stream(
+                        self.session, m3u8, self.variant_policy, self.audio_only, headers
+                    )
+            except requests.RequestException as e:
+                self.log(f"[WARN] 플레이리스트 분석 실패, 원본 m3u8 사용: {e}\n")
+        if media_url and media_url != m3u8:
+            self.log(
+                f"[INFO] variant 선택: {media_url}" + (f"\n       오디오: {audio_url}" if audio_url else "") + "\n"
+            )
+        return page_url, m3u8, title, cookie_header, media_url, audio_url
+
+    def refresh(self, page_url: str, reextract: bool = False):
+        """재시도용 추출: 브라우저 쿠키를 세션에 다시 복사하고, reextract면 캐시를 지운 뒤 다시 추출"""
+        if self.driver and self.session:
+            try:
+                if self.cookies is not None:
+                    self.sync_cookies(force=True)
+                else:
+                    copy_driver_cookies_to_session(self.driver, self.session)
+            except Exception as e:
+                self.log(f"[WARN] 쿠키 갱신 실패: {e}\n")
+        if reextract and self.cache:
+            self.cache.invalidate(page_url)
+        return self.extract(page_url)
+
+    def remember(self, page_url: str, m3u8: str, title: str):
+        if self.cache:
+            try:
+                self.cache.put(page_url, m3u8, title)
+            except sqlite3.Error as e:
+                self.log(f"[WARN] 추출 캐시 저장 실패: {e}\n")
+
+
+# -------------------HLS 세그먼트 (이어받기) ----------------------
+class HlsUnsupported(Exception):
+    """세그먼트 엔진이 처리하지 못하는 플레이리스트 (이 경우 ffmpeg 직접 모드로 받음)"""
+
+
+class HlsPlaylistError(ValueError):
+    """플레이리스트 내용이 잘못됨 (예: #EXT-X-KEY의 IV가 16진수가 아님). 다시 받아도 같으므로 재시도하지 않음"""
+
+
+def parse_key_iv(value: str) -> bytes:
+    """#EXT-X-KEY의 IV 속성(0x로 시작하는 16진수) → 16바이트. 형식이 틀리면 HlsPlaylistError"""
+    digits = value[2:] if value[:2].lower() == "0x" else value
+    try:
+        iv = bytes.fromhex(digits)
+    except ValueError:
+        iv = b""
+    if not iv or len(iv) > 16:
+        raise HlsPlaylistError(f"#EXT-X-KEY IV 형식 오류: {value}")
+    return iv.rjust(16, b"\0")
+
+
+HLS_ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def parse_attribute_list(text: str) -> dict:
+    """#EXT-X-...: 뒤의 KEY=VALUE,KEY="VALUE" 목록을 dict로"""
+    return {k: v.strip('"') for k, v in HLS_ATTR_RE.findall(text)}
+
+
+@dataclass
+class HlsSegment:
+    uri: str
+    duration: float
+    key_line: str = ""          # 이 세그먼트에 적용되는 #EXT-X-KEY 줄 (URI는 절대 경로)
+    sequence: int = 0           # 미디어 시퀀스 번호 (IV가 없는 AES-128의 기본 IV)
+
+
+@dataclass
+class MediaPlaylist:
+    url: str
+    segments: list
+    media_sequence: int = 0
+    target_duration: int = 10
+
+    @property
+    def encrypted(self) -> bool:
+        return any(seg.key_line for seg in self.segments)
+
+    @property
+    def duration(self) -> float:
+        return sum(seg.duration for seg in self.segments)
+
+
+def parse_master_playlist(text: str, base_url: str) -> list:
+    """마스터 플레이리스트의 variant 목록 [{uri, bandwidth, attrs}]"""
+    variants = []
+    attrs = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            attrs = parse_attribute_list(line.split(":", 1)[1])
+        elif line and not line.startswith("#") and attrs is not None:
+            variants.append({
+                "uri": urljoin(base_url, line),
+                "bandwidth": int(attrs.get("BANDWIDTH") or 0),
+                "attrs": attrs,
+            })
+            attrs = None
+    return variants
+
+
+def parse_audio_renditions(text: str, base_url: str) -> list:
+    """마스터 플레이리스트의 별도 오디오 렌디션 목록 [{group, uri, default}] (URI 있는 것만)"""
+    renditions = []
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line.startswith("#EXT-X-MEDIA:"):
+            continue
+        attrs = parse_attribute_list(line.split(":", 1)[1])
+        if attrs.get("TYPE") == "AUDIO" and attrs.get("URI"):
+            renditions.append({
+                "group": attrs.get("GROUP-ID", ""),
+                "uri": urljoin(base_url, attrs["URI"]),
+                "default": attrs.get("DEFAULT") == "YES",
+            })
+    return renditions
+
+
+# 마스터 플레이리스트에서 variant를 고르는 정책
+VARIANT_POLICIES = {
+    "highest": "최고 화질",
+    "max1080": "최대 1080p",
+    "max720": "최대 720p",
+    "max480": "최대 480p",
+    "lowest": "최저 화질",
+    "audio": "오디오만",
+}
+
+
+def variant_height(variant: dict) -> int:
+    res = variant["attrs"].get("RESOLUTION", "")
+    try:
+        return int(res.lower().split("x")[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def is_audio_only_variant(variant: dict) -> bool:
+    codecs = variant["attrs"].get("CODECS", "")
+    return bool(codecs) and "mp4a" in codecs and not re.search(r"avc|hvc|hev|vp0|av01", codecs)
+
+
+def select_variant(variants: list, policy: str) -> dict:
+    """정책에 맞는 variant 하나 선택 (정책에 맞는 게 없으면 가장 작은 것)"""
+    by_bw = sorted(variants, key=lambda v: v["bandwidth"])
+    if policy == "lowest":
+        return by_bw[0]
+    if policy == "audio":
+        audio = [v for v in by_bw if is_audio_only_variant(v)]
+        return (audio or by_bw)[0]
+    if policy.startswith("max"):
+        limit = int(policy[3:])
+        fit = [v for v in by_bw if 0 < variant_height(v) <= limit or not variant_height(v)]
+        return fit[-1] if fit else by_bw[0]
+    return by_bw[-1]
+
+
+def resolve_stream(session: requests.Session, m3u8_url: str, policy: str = "highest",
+                   audio_only: bool = False, headers=None):
+    """m3u8이 마스터 플레이리스트면 정책에 따라 (영상 URL, 별도 오디오 URL)을 고름.
+    audio_only(MP3 저장 등)면 별도 오디오 렌디션이 있을 때 그것만 받음.
+    미디어 플레이리스트면 (m3u8_url, "")"""
+    resp = session.get(m3u8_url, headers=headers, timeout=15)
+    resp.raise_for_status()
+    text = resp.text
+    if "#EXT-X-STREAM-INF" not in text:
+        return m3u8_url, ""
+    variants = parse_master_playlist(text, m3u8_url)
+    if not variants:
+        return m3u8_url, ""
+    if audio_only and policy != "audio":
+        policy = "lowest"   # 오디오만 쓸 거라면 variant는 가장 작은 것으로 충분
+    variant = select_variant(variants, policy)
+
+    renditions = parse_audio_renditions(text, m3u8_url)
+    group = variant["attrs"].get("AUDIO", "")
+    in_group = [r for r in renditions if r["group"] == group] if group else []
+    audio = next((r for r in in_group if r["default"]), in_group[0] if in_group else None)
+
+    if audio and (audio_only or policy == "audio"):
+        return audio["uri"], ""
+    return variant["uri"], (audio["uri"] if audio else "")
+
+
+def parse_media_playlist(text: str, base_url: str) -> MediaPlaylist:
+    segments = []
+    seq = 0
+    target = 10
+    duration = 0.0
+    key_line = ""
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            seq = int(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-TARGETDURATION:"):
+            target = int(float(line.split(":", 1)[1]))
+        elif line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",", 1)[0] or 0)
+        elif line.startswith("#EXT-X-KEY:"):
+            attrs = parse_attribute_list(line.split(":", 1)[1])
+            if attrs.get("METHOD", "NONE") == "NONE":
+                key_line = ""
+            else:
+                if attrs.get("IV"):
+                    parse_key_iv(attrs["IV"])   # 잘못된 IV는 세그먼트를 받기 전에 플레이리스트 오류로
+                key_line = re.sub(
+                    r'URI="([^"]*)"', lambda m: f'URI="{urljoin(base_url, m.group(1))}"', line
+                )
+        elif line.startswith(("#EXT-X-MAP", "#EXT-X-BYTERANGE")):
+            raise HlsUnsupported(line.split(":", 1)[0])
+        elif not line.startswith("#"):
+            segments.append(HlsSegment(urljoin(base_url, line), duration, key_line, seq + len(segments)))
+            duration = 0.0
+    return MediaPlaylist(base_url, segments, seq, target)
+
+
+def fetch_text(session: requests.Session, url: str, timeout: float = 15.0) -> str:
+    resp = session.get(url, timeout=timeout)
+    resp.raise_for_status()
+    return resp.text
+
+
+def load_media_playlist(session: requests.Session, url: str) -> MediaPlaylist:
+    """m3u8을 받아 미디어 플레이리스트로 해석 (마스터면 대역폭이 가장 큰 variant 선택)"""
+    text = fetch_text(session, url)
+    if "#EXT-X-STREAM-INF" in text:
+        variants = parse_master_playlist(text, url)
+        if not variants:
+            raise HlsUnsupported("variant 없는 마스터 플레이리스트")
+        url = max(variants, key=lambda v: v["bandwidth"])["uri"]
+        text = fetch_text(session, url)
+    playlist = parse_media_playlist(text, url)
+    if not playlist.segments:
+        raise HlsUnsupported("세그먼트 없는 플레이리스트")
+    return playlist
+
+
+def segment_parts_dir(out_file: str) -> Path:
+    """세그먼트와 체크포인트를 두는 폴더 (출력 파일 옆 '<파일명>.parts')"""
+    return Path(out_file + ".parts")
+
+
+def partial_output_path(out_file: str) -> str:
+    """조립 중인 출력 파일 (성공하면 out_file로 이름을 바꿈)"""
+    p = Path(out_file)
+    return str(p.with_name(f"{p.stem}.partial{p.suffix}"))
+
+
+def segment_path(parts_dir: Path, index: int) -> Path:
+    return parts_dir / f"seg_{index:05d}.ts"
+
+
+def prepare_parts_dir(parts_dir: Path, playlist: MediaPlaylist, decrypt: bool = False) -> int:
+    """체크포인트가 같은 스트림이면 그대로 두고, 아니면 새로 시작. 이미 받은 세그먼트 수 반환.
+    암호화된 스트림은 복호화해서 저장했는지도 체크포인트에 넣어 두 방식의 세그먼트가 섞이지 않게 함"""
+    ident = {"playlist": urlparse(playlist.url).path, "count": len(playlist.segments)}
+    if playlist.encrypted:
+        ident["decrypted"] = decrypt
+    ck = parts_dir / "checkpoint.json"
+    try:
+        same = json.loads(ck.read_text(encoding="utf-8")) == ident
+    except (OSError, ValueError):
+        same = False
+    if not same:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        parts_dir.mkdir(parents=True, exist_ok=True)
+        ck.write_text(json.dumps(ident), encoding="utf-8")
+        return 0
+    return sum(1 for i in range(len(playlist.segments)) if segment_path(parts_dir, i).exists())
+
+
+def download_segment(session: requests.Session, seg: HlsSegment, dest: Path, timeout: float = 20.0,
+                     bucket=None, keys=None) -> int:
+    """세그먼트 하나를 임시 파일로 받은 뒤 이름을 바꿔 완료 표시 (존재 = 완료).
+    bucket(TokenBucket)이 있으면 받은 만큼 전역 대역폭 한도에 맞춰 속도를 늦춤.
+    keys(KeyCache)가 있고 AES-128 세그먼트면 받는 조각마다 복호화해서 씀 (메모리에는 조각 하나만)"""
+    decryptor = keys.decryptor(session, seg, timeout) if keys is not None and seg.key_line else None
+    tmp = dest.with_suffix(".tmp")
+    size = 0
+    with session.get(seg.uri, stream=True, timeout=timeout) as resp:
+        resp.raise_for_status()
+        with open(tmp, "wb") as f:
+            for chunk in resp.iter_content(64 * 1024):
+                if bucket:
+                    bucket.consume(len(chunk))
+                f.write(decryptor.update(chunk) if decryptor else chunk)
+                size += len(chunk)
+            if decryptor:
+                try:
+                    f.write(decryptor.finalize())
+                except ValueError:
+                    # 패딩이 맞지 않음 = 잘못된 키 (LMS가 키를 바꿨으면 다음 시도에 다시 받도록 캐시에서 뺌)
+                    keys.forget(segment_key(seg)[1])
+                    raise ValueError(f"세그먼트 복호화 실패(키 불일치): {seg.uri}")
+    os.replace(tmp, dest)
+    return size
+
+
+def download_segments(session, playlist: MediaPlaylist, parts_dir: Path,
+                      cancelled=lambda: False, on_progress=None, concurrency: int = 1,
+                      bucket=None, keys=None) -> bool:
+    """받지 않은 세그먼트만 최대 concurrency개씩 동시에 받음.
+    중간에 취소되면 진행 중인 요청만 마무리하고 False (받은 세그먼트는 남김)"""
+    total = len(playlist.segments)
+    pending = [i for i in range(total) if not segment_path(parts_dir, i).exists()]
+    done = total - len(pending)
+    todo = iter(pending)
+    if on_progress:
+        on_progress(done, total)
+
+    error = None
+    running = set()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        while True:
+            # 동시 요청 수만큼 창을 채움 (취소/오류 후에는 새 요청을 넣지 않음)
+            while error is None and len(running) < max(1, concurrency) and not cancelled():
+                i = next(todo, None)
+                if i is None:
+                    break
+                running.add(pool.submit(
+                    download_segment, session, playlist.segments[i], segment_path(parts_dir, i),
+                    bucket=bucket, keys=keys,
+                ))
+            if not running:
+                break
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                try:
+                    fut.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                done += 1
+                if on_progress:
+                    on_progress(done, total)
+    if error is not None:
+        raise error
+    return done == total
+
+
+# -------------------AES-128 복호화 ----------------------
+def aes_available() -> bool:
+    """cryptography 패키지가 있으면 세그먼트 엔진이 AES-128을 직접 복호화 (없으면 받은 그대로 두고 ffmpeg가 복호화)"""
+    try:
+        import cryptography.hazmat.primitives.ciphers  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def segment_key(seg: HlsSegment):
+    """세그먼트의 (METHOD, 키 URI, IV 16바이트). IV 속성이 없으면 미디어 시퀀스 번호(빅엔디언)"""
+    attrs = parse_attribute_list(seg.key_line.split(":", 1)[1]) if seg.key_line else {}
+    iv = attrs.get("IV", "")
+    iv = parse_key_iv(iv) if iv else seg.sequence.to_bytes(16, "big")
+    return attrs.get("METHOD", "NONE"), attrs.get("URI", ""), iv
+
+
+def can_decrypt(playlist: MediaPlaylist) -> bool:
+    """모든 키가 URI 있는 AES-128이고 복호화 라이브러리가 있으면 True (SAMPLE-AES 등은 ffmpeg에 맡김)"""
+    for line in {seg.key_line for seg in playlist.segments if seg.key_line}:
+        attrs = parse_attribute_list(line.split(":", 1)[1])
+        if attrs.get("METHOD") != "AES-128" or not attrs.get("URI"):
+            return False
+    return aes_available()
+
+
+class SegmentDecryptor:
+    """AES-128-CBC 세그먼트를 받는 조각마다 복호화. 마지막에 finalize()로 PKCS7 패딩을 떼어 냄
+    (패딩이 틀리면 ValueError = 키가 맞지 않음)"""
+
+    def __init__(self, key: bytes, iv: bytes):
+        from cryptography.hazmat.primitives import padding
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        self.cipher = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+        self.unpadder = padding.PKCS7(128).unpadder()
+
+    def update(self, chunk: bytes) -> bytes:
+        return self.unpadder.update(self.cipher.update(chunk))
+
+    def finalize(self) -> bytes:
+        return self.unpadder.update(self.cipher.finalize()) + self.unpadder.finalize()
+
+
+class KeyCache:
+    """HLS AES-128 키 캐시 (키 URI → 16바이트). 작업/워커가 모두 나눠 쓰고(스레드 안전),
+    여러 세그먼트가 같은 키를 동시에 찾으면 한 번만 받는다.
+    키는 세그먼트와 같은 세션(로그인 쿠키/Referer)으로 받으므로 ffmpeg에 헤더를 따로 넘기지 않아도 된다."""
+
+    def __init__(self, max_keys: int = 256):
+        self.max_keys = max_keys
+        self.keys = OrderedDict()   # uri → key (오래 안 쓴 순)
+        self.fetching = {}          # uri → 그 키를 받는 중인 스레드가 잡는 Lock
+        self.lock = threading.Lock()
+
+    def get(self, session: requests.Session, uri: str, timeout: float = 15.0) -> bytes:
+        with self.lock:
+            key = self.keys.get(uri)
+            if key is not None:
+                self.keys.move_to_end(uri)
+                return key
+            fetch_lock = self.fetching.setdefault(uri, threading.Lock())
+        with fetch_lock:
+            try:
+                with self.lock:
+                    key = self.keys.get(uri)
+                if key is None:
+                    resp = session.get(uri, timeout=timeout)
+                    resp.raise_for_status()     # 401/403이면 세그먼트 실패와 같이 쿠키 갱신 후 재시도
+                    key = resp.content
+                    if len(key) != 16:
+                        raise ValueError(f"AES-128 키 길이가 16바이트가 아닙니다({len(key)}): {uri}")
+                    with self.lock:
+                        self.keys[uri] = key
+                        while len(self.keys) > self.max_keys:
+                            self.keys.popitem(last=False)
+            finally:
+                # 실패해도 지움 (실패한 키 URI마다 Lock이 쌓이지 않게)
+                with self.lock:
+                    self.fetching.pop(uri, None)
+        return key
+
+    def forget(self, uri: str):
+        with self.lock:
+            self.keys.pop(uri, None)
+
+    def decryptor(self, session: requests.Session, seg: HlsSegment, timeout: float = 15.0) -> SegmentDecryptor:
+        method, uri, iv = segment_key(seg)
+        if method != "AES-128" or not uri:
+            raise HlsUnsupported(f"METHOD={method}")
+        return SegmentDecryptor(self.get(session, uri, timeout), iv)
+
+
+def write_local_playlist(playlist: MediaPlaylist, parts_dir: Path, decrypted: bool = False) -> Path:
+    """받아 둔 세그먼트 파일을 가리키는 로컬 m3u8 작성 (ffmpeg 조립용).
+    decrypted면 세그먼트가 이미 복호화돼 있으므로 #EXT-X-KEY 줄을 넣지 않음"""
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{playlist.target_duration}",
+        f"#EXT-X-MEDIA-SEQUENCE:{playlist.media_sequence}",
+    ]
+    current_key = ""
+    for i, seg in enumerate(playlist.segments):
+        if not decrypted and seg.key_line != current_key:
+            lines.append(seg.key_line or "#EXT-X-KEY:METHOD=NONE")
+            current_key = seg.key_line
+        lines.append(f"#EXTINF:{seg.duration:.6f},")
+        lines.append(segment_path(parts_dir, i).name)
+    lines.append("#EXT-X-ENDLIST")
+    path = parts_dir / "local.m3u8"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+@dataclass
+class SegmentFetchResult:
+    ok: bool = False
+    unsupported: bool = False       # 세그먼트 엔진이 처리 못 하는 플레이리스트
+    http_error: int = 0
+    failure: str = ""               # classify_failure 결과 (재시도 정책 선택용)
+    encrypted: bool = False
+    duration: float = 0.0           # 플레이리스트 EXTINF 합 (ffmpeg 진행률 계산용)
+    local_playlists: list = field(default_factory=list)   # [영상(또는 단일) m3u8, 오디오 m3u8]
+    assembled: str = ""             # concat_to로 이미 이어 붙였으면 그 파일 (ffmpeg 조립 불필요)
+
+
+def fetch_job_segments(job, user_agent: str, concurrency: int = 1,
+                       cancelled=lambda: False, on_progress=None, log=print,
+                       bucket=None, timer=None, concat_to: str = "", keys=None) -> SegmentFetchResult:
+    """세그먼트 엔진: job의 세그먼트를 '<출력>.parts'에 받아 두고 로컬 m3u8을 작성.
+    keep-alive 세션 하나로 concurrency개의 요청을 동시에 보낸다. 별도 오디오 렌디션이 있으면
+    '<출력>.parts/audio'에 함께 받는다. 중지/실패해도 받은 세그먼트는 남아 있어서
+    같은 출력 파일로 다시 받으면 이어서 받는다.
+    AES-128 스트림은 keys(KeyCache, 없으면 이 작업 전용)로 키를 받아 세그먼트를 받으면서 복호화한다
+    (cryptography가 없거나 SAMPLE-AES 등이면 받은 그대로 두고 조립할 때 ffmpeg가 복호화).
+    concat_to(.ts 파일)가 있고 암호화 없는(또는 복호화한) MPEG-TS 트랙 하나뿐이면 ffmpeg 없이 바로 이어 붙여
+    그 파일을 만들고 세그먼트 폴더를 지운다 (result.assembled). concat_to는 MP3/재인코딩 모드의 원본
+    (.source.ts)에만 넘긴다. 복사 모드의 MP4 출력은 컨테이너를 바꿔야 해서 로컬 m3u8로 ffmpeg가 조립한다.
+    timer(StageTimer)가 있으면 playlist / first_segment(첫 세그먼트까지) / transfer(나머지) 시간을 기록한다."""
+    timer = timer or StageTimer()
+    result = SegmentFetchResult()
+    session = make_http_session(user_agent, pool_size=max(2, concurrency))
+    if job.referer:
+        session.headers["Referer"] = job.referer
+    if job.cookie_header:
+        session.headers["Cookie"] = job.cookie_header
+    try:
+        parts_dir = segment_parts_dir(job.out_file)
+        with timer.stage("playlist"):
+            tracks = [(load_media_playlist(session, job.stream_url), parts_dir)]
+            if job.audio_url:
+                tracks.append((load_media_playlist(session, job.audio_url), parts_dir / "audio"))
+        result.encrypted = any(playlist.encrypted for playlist, _ in tracks)
+        result.duration = tracks[0][0].duration
+        decrypt = result.encrypted and all(can_decrypt(playlist) for playlist, _ in tracks)
+        if decrypt:
+            keys = keys if keys is not None else KeyCache()
+        elif result.encrypted:
+            log("[INFO] 암호화 세그먼트를 받은 그대로 두고 조립할 때 ffmpeg로 복호화합니다.\n")
+
+        # 영상 트랙을 먼저 준비해야 함 (체크포인트가 다르면 폴더 전체를 새로 만듦)
+        done = sum(prepare_parts_dir(d, playlist, decrypt) for playlist, d in tracks)
+        grand_total = sum(len(playlist.segments) for playlist, _ in tracks)
+        if done:
+            log(f"[INFO] 이어받기: {done}/{grand_total} 세그먼트 완료 상태\n")
+
+        offset = 0
+        fetch_started = time.perf_counter()
+        first = {"at": 0.0}
+        try:
+            for playlist, d in tracks:
+                def progress(n, _total, base=offset):
+                    if not first["at"] and base + n > done:
+                        first["at"] = time.perf_counter()
+                    if on_progress:
+                        on_progress(base + n, grand_total)
+
+                if not download_segments(session, playlist, d, cancelled, progress, concurrency, bucket,
+                                         keys if decrypt else None):
+                    return result
+                offset += len(playlist.segments)
+                result.local_playlists.append(write_local_playlist(playlist, d, decrypt))
+        finally:
+            if first["at"]:
+                timer.add("first_segment", first["at"] - fetch_started)
+                timer.add("transfer", time.perf_counter() - first["at"])
+
+        if decrypt:
+            result.encrypted = False    # 받으면서 복호화함 → ffmpeg에 키 요청 헤더가 필요 없음
+        playlist, d = tracks[0]
+        files = [segment_path(d, i) for i in range(len(playlist.segments))]
+        if concat_to and len(tracks) == 1 and not result.encrypted and is_mpegts(files[0]):
+            with timer.stage("assemble"):
+                method = concat_segments(files, concat_to)
+            shutil.rmtree(parts_dir, ignore_errors=True)
+            result.assembled = concat_to
+            log(f"[INFO] 세그먼트 {len(files)}개 이어 붙임 ({method}): {concat_to}\n")
+        result.ok = True
+    except HlsUnsupported as e:
+        result.unsupported = True
+        log(f"[INFO] 세그먼트 엔진 미지원({e}) → ffmpeg 직접 다운로드\n")
+    except requests.HTTPError as e:
+        result.http_error = e.response.status_code if e.response is not None else 0
+        result.failure = classify_failure(http_error=result.http_error)
+        log(f"[ERROR] 세그먼트 다운로드 실패: {job.page_url} | {e}\n")
+    except HlsPlaylistError as e:
+        result.failure = classify_failure(exc=e)
+        log(f"[ERROR] 플레이리스트 오류(재시도 안 함): {job.page_url} | {e}\n")
+    except (requests.RequestException, OSError, ValueError) as e:
+        result.failure = classify_failure(exc=e)
+        log(f"[ERROR] 세그먼트 다운로드 실패: {job.page_url} | {e}\n")
+    finally:
+        session.close()
+    return result
+
+
+# 세그먼트 이어 붙이기: 앞에서부터 시도하고, 이 환경에서 안 되는 방법은 건너뜀
+COPY_METHODS = ("copy_file_range", "sendfile", "mmap")
+COPY_CHUNK = 64 * 1024 * 1024
+# 커널 복사를 지원하지 않는 파일시스템/OS에서 나는 오류 → 다음 방법으로
+COPY_FALLBACK_ERRNOS = {
+    getattr(errno, name) for name in ("ENOSYS", "EXDEV", "EINVAL", "EOPNOTSUPP", "ENOTSUP", "ENOTSOCK")
+    if hasattr(errno, name)
+}
+
+
+def is_mpegts(path: Path) -> bool:
+    """MPEG-TS(188바이트 패킷, 동기 바이트 0x47)인지 (바이트를 그대로 이어 붙여도 되는 형식인지)"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(189)
+    except OSError:
+        return False
+    return head[:1] == b"\x47" and (len(head) < 189 or head[188:189] == b"\x47")
+
+
+def append_file(src: Path, dst_fd: int, methods: list):
+    """src 전체를 dst_fd의 현재 위치에 붙임. 파이썬 버퍼를 거치지 않도록 커널 안에서 복사하고,
+    methods(COPY_METHODS 중 남은 것)의 앞 방법이 안 되면 목록에서 빼서 다음 파일부터는 바로 다음 방법을 씀"""
+    with open(src, "rb") as f:
+        src_fd = f.fileno()
+        size = os.fstat(src_fd).st_size
+        done = 0
+        while done < size:
+            count = min(COPY_CHUNK, size - done)
+            if methods[0] == "mmap":
+                with mmap.mmap(src_fd, 0, access=mmap.ACCESS_READ) as m:
+                    view = memoryview(m)
+                    try:
+                        while done < size:
+                            done += os.write(dst_fd, view[done:done + COPY_CHUNK])
+                    finally:
+                        view.release()
+                return
+            try:
+                if methods[0] == "copy_file_range":
+                    n = os.copy_file_range(src_fd, dst_fd, count, done)
+                else:
+                    n = os.sendfile(dst_fd, src_fd, done, count)
+            except AttributeError:      # 이 OS/파이썬에 없는 함수
+                methods.pop(0)
+                continue
+            except OSError as e:
+                if e.errno not in COPY_FALLBACK_ERRNOS:
+                    raise
+                methods.pop(0)
+                continue
+            if n == 0:
+                raise OSError(errno.EIO, f"세그먼트 파일이 복사 중에 줄어들었습니다: {src}")
+            done += n
+
+
+def concat_segments(paths: list, out_file: str) -> str:
+    """세그먼트 파일들을 순서대로 이어 붙여 out_file을 만들고 실제로 쓴 복사 방법을 돌려줌.
+    out_file 옆 임시 파일(partial_output_path)에 전체 크기만큼 미리 자리를 잡아(공간이 모자라면 바로 실패)
+    copy_file_range → sendfile → mmap 순으로 복사한 뒤, 다 쓰면 원자적으로 이름을 바꾼다.
+    그래서 출력 폴더에 반쯤 쓴 파일이 최종 이름으로 남는 일이 없다."""
+    partial = partial_output_path(out_file)
+    total = sum(os.path.getsize(p) for p in paths)
+    methods = list(COPY_METHODS)
+    fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        try:
+            os.posix_fallocate(fd, 0, total)
+        except AttributeError:      # posix_fallocate가 없는 OS (macOS/Windows)
+            pass
+        except OSError as e:
+            if e.errno not in COPY_FALLBACK_ERRNOS:
+                raise
+        for p in paths:
+            append_file(p, fd, methods)
+        os.ftruncate(fd, total)
+    except BaseException:
+        os.close(fd)
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+    os.close(fd)
+    os.replace(partial, out_file)
+    return methods[0]
+
+
+def commit_partial_output(partial_file: str, out_file: str, ok: bool, parts_dir=None) -> bool:
+    """조립이 끝난 임시 파일을 최종 이름으로 바꾸고 세그먼트 폴더(기본: out_file의 .parts) 정리.
+    조립에 실패했으면 임시 파일만 지우고 세그먼트는 다음 이어받기를 위해 남김"""
+    if not ok:
+        try:
+            os.remove(partial_file)
+        except OSError:
+            pass
+        return False
+    os.replace(partial_file, out_file)
+    shutil.rmtree(parts_dir or segment_parts_dir(out_file), ignore_errors=True)
+    return True
+
+
+def source_output_path(out_file: str) -> str:
+    """2단계(받기 → 인코딩) 파이프라인에서 재인코딩 없이 받아 둔 원본 파일 (출력 파일 옆 '<파일명>.source.ts').
+    받기가 끝났을 때만 이 이름으로 바뀌므로, 이 파일이 있으면 다시 받지 않고 바로 인코딩하면 된다"""
+    p = Path(out_file)
+    return str(p.with_name(f"{p.stem}.source.ts"))
+
+
+# -------------------작업/워커 ----------------------
+@dataclass
+class DownloadJob:
+    page_url: str
+    m3u8: str
+    out_file: str
+    referer: str
+    title: str = ""
+    row: int = -1               # GUI 대기열 테이블의 행 번호
+    cookie_header: str = ""     # ffmpeg에 넘길 Cookie 헤더
+    media_url: str = ""         # 마스터 플레이리스트에서 고른 variant (없으면 m3u8 그대로)
+    audio_url: str = ""         # 별도 오디오 렌디션 (영상 저장 시 함께 받음)
+    attempts: int = 0           # 지금까지 재시도한 횟수
+    last_failure: str = ""      # 직전 실패 분류 (classify_failure)
+    queued_at: float = 0.0      # 마지막으로 JobQueue에 들어간 시각 (monotonic, 대기 시간 측정용)
+
+    @property
+    def stream_url(self) -> str:
+        return self.media_url or self.m3u8
+
+    def update_stream(self, extracted):
+        """재추출 결과(Extractor.extract의 튜플)로 스트림 URL/쿠키만 교체 (출력 파일/제목은 유지)"""
+        _, self.m3u8, _, self.cookie_header, self.media_url, self.audio_url = extracted
+
+
+# 다운로드 엔진: ffmpeg가 m3u8을 직접 받거나, 세그먼트를 먼저 받아 두고(이어받기 가능) 조립
+DOWNLOAD_ENGINES = {
+    "ffmpeg": "ffmpeg 직접",
+    "segment": "세그먼트 병렬/이어받기",
+}
+
+# ffmpeg 로그의 HTTP 오류 ("HTTP error 403 Forbidden", "Server returned 5XX Server Error reply" 등)
+HTTP_ERROR_RE = re.compile(r"(?:HTTP error |Server returned )([45])(\d\d|XX)")
+
+
+def parse_http_error(text: str) -> int:
+    """로그에서 본 HTTP 상태 코드 (5XX처럼 뭉뚱그린 경우 500), 없으면 0"""
+    m = HTTP_ERROR_RE.search(text)
+    if not m:
+        return 0
+    return int(m.group(1) + (m.group(2) if m.group(2).isdigit() else "00"))
+
+
+# -------------------실패 분류/재시도 ----------------------
+# 실패 분류 → 재시도 방법. 분류에 없는 실패(디스크 부족, 알 수 없는 오류)는 재시도하지 않음
+#   network: 타임아웃/연결 끊김/5xx → 지수 백오프 후 같은 작업 다시 실행
+#   auth:    401/403 → 로그인 쿠키를 다시 읽어 재시도 (두 번 연속이면 재추출)
+#   expired: 404/410 → m3u8 토큰 만료로 보고 캐시를 지우고 페이지 재추출
+FAILURE_LABELS = {
+    "network": "네트워크/서버 오류",
+    "auth": "인증 오류",
+    "expired": "링크 만료",
+    "disk": "디스크 공간 부족",
+    "playlist": "플레이리스트 오류",
+    "": "알 수 없는 오류",
+}
+RETRY_ACTIONS = {"network": "backoff", "auth": "refresh", "expired": "reextract"}
+
+DISK_FULL_RE = re.compile(r"No space left on device|Disk quota exceeded|not enough space on the disk", re.I)
+NETWORK_ERROR_RE = re.compile(
+    r"timed out|Connection reset|Connection refused|Network is unreachable|"
+    r"Temporary failure in name resolution|Failed to resolve hostname|End of file|I/O error",
+    re.I,
+)
+
+
+def classify_failure(log_text: str = "", http_error: int = 0, exc: Exception = None) -> str:
+    """ffmpeg 로그/HTTP 상태/예외로 실패 원인 분류: network, auth, expired, disk, playlist 또는 ''.
+    playlist(잘못된 플레이리스트)는 RETRY_ACTIONS에 없으므로 재시도하지 않음"""
+    if isinstance(exc, HlsPlaylistError):
+        return "playlist"
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        http_error = http_error or exc.response.status_code
+    elif isinstance(exc, (requests.Timeout, requests.ConnectionError)):
+        return "network"
+    elif isinstance(exc, OSError) and exc.errno in (errno.ENOSPC, errno.EDQUOT):
+        return "disk"
+    if http_error in (401, 403):
+        return "auth"
+    if http_error in (404, 410):
+        return "expired"
+    if http_error >= 500 or http_error in (408, 429):
+        return "network"
+    if DISK_FULL_RE.search(log_text):
+        return "disk"
+    if NETWORK_ERROR_RE.search(log_text):
+        return "network"
+    return ""
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 3        # 작업 하나당 최대 재시도 횟수 (0이면 재시도 안 함)
+    base_delay: float = 5.0     # 첫 백오프 대기(초), 재시도마다 두 배
+    max_delay: float = 300.0
+
+    def next_action(self, job: DownloadJob, failure: str) -> str:
+        """다음 재시도 방법 (backoff/refresh/reextract), 포기하면 ''"""
+        if job.attempts >= self.max_retries:
+            return ""
+        action = RETRY_ACTIONS.get(failure, "")
+        if action == "refresh" and job.last_failure == "auth":
+            # 쿠키를 새로 읽었는데도 거부되면 m3u8 토큰 자체가 만료된 것으로 봄
+            action = "reextract"
+        return action
+
+    def delay(self, attempt: int) -> float:
+        """attempt번째 재시도 전 대기 시간 (지수 백오프 + 서버 동시 재접속을 피하는 지터)"""
+        base = min(self.max_delay, self.base_delay * (2 ** max(0, attempt - 1)))
+        return base * random.uniform(0.8, 1.2)
+
+
+def job_host(job: DownloadJob) -> str:
+    """작업을 호스트별로 나누는 키 (LMS 페이지의 스킴+도메인)"""
+    return get_base_url(job.page_url) or job.page_url
+
+
+class JobQueue:
+    """대기 중인 DownloadJob 큐 (GUI/CLI 공용, 스레드 안전).
+    호스트(job_host)마다 FIFO를 따로 두고 호스트별 동시 실행 수를 제한한다.
+    한 호스트가 한도에 걸려도 다른 호스트의 작업은 계속 꺼낼 수 있도록 호스트를 돌아가며 꺼낸다.
+    get()으로 꺼낸 작업은 끝나면 반드시 task_done()으로 자리를 돌려줘야 한다.
+    close() 이후에는 더 들어올 작업이 없다는 뜻이라 get(block=True)가 None을 돌려준다."""
+
+    def __init__(self, per_host_limit: int = 0, host_limits=None):
+        self.per_host_limit = per_host_limit        # 0이면 제한 없음
+        self.host_limits = dict(host_limits or {})  # 호스트별 개별 한도 (per_host_limit보다 우선)
+        self._queues = OrderedDict()                # host -> deque[DownloadJob]
+        self._active = {}                           # host -> 실행 중인 작업 수
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def __len__(self) -> int:
+        return self._size
+
+    def limit_for(self, host: str) -> int:
+        return self.host_limits.get(host, self.per_host_limit)
+
+    def put(self, job: DownloadJob):
+        job.queued_at = time.monotonic()
+        with self._cond:
+            self._queues.setdefault(job_host(job), deque()).append(job)
+            self._size += 1
+            self._cond.notify()
+
+    def _pop_runnable(self):
+        for host, jobs in self._queues.items():
+            limit = self.limit_for(host)
+            if jobs and (limit <= 0 or self._active.get(host, 0) < limit):
+                job = jobs.popleft()
+                self._size -= 1
+                self._active[host] = self._active.get(host, 0) + 1
+                # 방금 꺼낸 호스트는 뒤로 보내서 다음에는 다른 호스트부터 봄
+                self._queues.move_to_end(host)
+                return job
+        return None
+
+    def get(self, block: bool = False):
+        """지금 실행할 수 있는 다음 작업. 없으면 None
+        (block=True면 작업이 들어오거나 자리가 나거나, close 후 큐가 빌 때까지 기다림)"""
+        with self._cond:
+            while True:
+                job = self._pop_runnable()
+                if job is not None or not block or (self._closed and not self._size):
+                    return job
+                self._cond.wait()
+
+    def task_done(self, job: DownloadJob):
+        with self._cond:
+            host = job_host(job)
+            self._active[host] = max(0, self._active.get(host, 0) - 1)
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self._queues.clear()
+            self._size = 0
+            self._closed = False
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class TokenBucket:
+    """모든 워커가 함께 쓰는 전역 대역폭 제한 (rate: bytes/sec, 0이면 무제한).
+    받은 만큼 토큰을 빼고, 모자라면 빚이 갚아질 때까지 잠깐 쉰다."""
+
+    def __init__(self, rate: float = 0, burst: float = 0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+        self.total = 0      # 지금까지 지나간 바이트 (제한이 없어도 셈, 처리량 측정용)
+
+    def set_rate(self, rate: float):
+        with self.lock:
+            self.rate = rate
+            self.tokens = 0.0
+            self.stamp = time.monotonic()
+
+    def consume(self, n: int):
+        with self.lock:
+            self.total += n
+            if self.rate <= 0:
+                return
+            now = time.monotonic()
+            burst = self.burst or self.rate
+            self.tokens = min(burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= n
+            wait_sec = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait_sec > 0:
+            time.sleep(wait_sec)
+
+
+TUNE_INTERVAL = 5.0     # 초, 동시 다운로드 수를 다시 정하는 주기
+
+
+@dataclass
+class TuneSample:
+    """한 번의 조절 기록: 그 구간의 처리량/오류율과 바꾸기 전후의 동시 수"""
+    at: float
+    before: int
+    limit: int
+    bps: float
+    error_rate: float
+    reason: str
+
+    def describe(self) -> str:
+        change = f"{self.before} → {self.limit}" if self.limit != self.before else str(self.limit)
+        return (f"동시 {change} ({format_bytes(self.bps)}/s, 오류 {self.error_rate:.0%}, {self.reason})")
+
+    def as_dict(self) -> dict:
+        return {
+            "at": round(self.at, 3), "before": self.before, "limit": self.limit,
+            "bytes_per_sec": round(self.bps), "error_rate": round(self.error_rate, 3),
+            "reason": self.reason,
+        }
+
+
+class ConcurrencyTuner:
+    """잰 처리량과 오류율로 동시 다운로드 수를 정하는 AIMD 제어기 (GUI/CLI 공용, 스레드 안전).
+    interval마다 sample(지금까지 받은 바이트)을 부르면 그 구간을 보고:
+    - 끝난 작업 중 실패 비율이 error_rate 이상이면 곱으로 줄임 (× decrease, LMS/CDN이 버거워할 때)
+    - 한도만큼 돌고 있고 오류가 없으면 하나씩 늘림. 늘린 뒤 처리량이 gain 이상 늘지 않았으면
+      회선/서버가 포화된 것으로 보고 하나 되돌린 뒤 probe_every 구간 동안 유지했다가 다시 늘려 봄
+    acquire/release는 limit를 세마포어처럼 써서 다운로드 스레드 수 자체를 막을 때 씀 (CLI)."""
+
+    def __init__(self, start: int, minimum: int = 1, maximum: int = 16, decrease: float = 0.5,
+                 error_rate: float = 0.2, gain: float = 0.05, probe_every: int = 6, keep: int = 100):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, start))
+        self.decrease = decrease
+        self.error_rate = error_rate
+        self.gain = gain
+        self.probe_every = probe_every
+        self.history: deque = deque(maxlen=keep)
+        self.ok = 0
+        self.failed = 0
+        self.active = 0
+        self.last_time = 0.0
+        self.last_bytes = -1
+        self.last_bps = 0.0
+        self.increased = False      # 직전 조절이 증가였는지 (그 효과를 이번 구간에서 확인)
+        self.hold = 0               # 포화로 유지한 구간 수
+        self.cond = threading.Condition()
+
+    def record(self, ok: bool):
+        """작업 하나의 결과 (중지는 넣지 않음)"""
+        with self.cond:
+            if ok:
+                self.ok += 1
+            else:
+                self.failed += 1
+
+    def sample(self, total_bytes: int, busy: bool = True, now: float = 0.0):
+        """구간 처리량/오류율로 limit를 다시 정하고 기록(TuneSample)을 돌려줌. 첫 호출은 기준점만 잡고 None.
+        busy: 한도만큼 작업이 돌고 있는지 (대기열이 비어 덜 돌고 있으면 늘려도 소용없으므로 늘리지 않음)"""
+        now = now or time.monotonic()
+        with self.cond:
+            if self.last_bytes < 0 or now <= self.last_time:
+                self.last_time, self.last_bytes = now, total_bytes
+                return None
+            bps = max(0, total_bytes - self.last_bytes) / (now - self.last_time)
+            finished = self.ok + self.failed
+            err = self.failed / finished if finished else 0.0
+            failed = self.failed
+            self.ok = self.failed = 0
+            self.last_time, self.last_bytes = now, total_bytes
+            before = self.limit
+            if failed and err >= self.error_rate:
+                self.limit = max(self.minimum, int(self.limit * self.decrease))
+                self.increased, self.hold = False, 0
+                reason = "오류로 감소"
+            elif bps <= 0 or not busy:
+                reason = "유지 (작업 부족)"
+            elif self.increased and bps < self.last_bps * (1 + self.gain):
+                self.limit = max(self.minimum, self.limit - 1)
+                self.increased, self.hold = False, 1
+                reason = "포화, 되돌림"
+            elif self.hold and self.hold < self.probe_every:
+                self.hold += 1
+                reason = "유지"
+            elif self.limit < self.maximum:
+                self.limit += 1
+                self.increased, self.hold = True, 0
+                reason = "증가"
+            else:
+                self.increased = False
+                reason = "최대"
+            self.last_bps = bps
+            sample = TuneSample(time.time(), before, self.limit, bps, err, reason)
+            self.history.append(sample)
+            self.cond.notify_all()
+            return sample
+
+    def acquire(self):
+        with self.cond:
+            while self.active >= self.limit:
+                self.cond.wait()
+            self.active += 1
+
+    def release(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    def recent(self, n: int = 10) -> list:
+        with self.cond:
+            return list(self.history)[-n:]
+
+
+# -------------------작업 저장소 (재시작 후 이어가기) ----------------------
+JOB_STATES = ("queued", "extracted", "downloading", "done", "failed")
+UNFINISHED_STATES = ("queued", "extracted", "downloading")
+
+
+class JobStore:
+    """배치의 URL별 상태(queued → extracted → downloading → done/failed)와 시도 횟수, 단계별 시각을
+    저장하는 SQLite 저장소. 앱을 닫거나 죽어도 남아서, 같은 배치를 다시 시작하면 끝난 작업은 건너뛰고
+    추출까지 끝난 작업은 다시 추출하지 않고 바로 다운로드한다.
+    page_url이 기본 키이고 state에 인덱스가 있어 URL이 수천 개여도 조회가 전체를 훑지 않는다.
+    쿠키는 만료되므로 저장하지 않는다 (작업 시작 때 쿠키 캐시에서 넣음)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " page_url TEXT PRIMARY KEY, host TEXT NOT NULL, out_dir TEXT NOT NULL,"
+                " state TEXT NOT NULL, title TEXT NOT NULL DEFAULT '',"
+                " m3u8 TEXT NOT NULL DEFAULT '', media_url TEXT NOT NULL DEFAULT '',"
+                " audio_url TEXT NOT NULL DEFAULT '', out_file TEXT NOT NULL DEFAULT '',"
+                " attempts INTEGER NOT NULL DEFAULT 0, last_failure TEXT NOT NULL DEFAULT '',"
+                " queued_at REAL, extracted_at REAL, started_at REAL, finished_at REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, queued_at)")
+
+    def enqueue(self, urls, out_dir, resume: bool = True) -> dict:
+        """배치 등록 → {"extract": 추출할 URL, "resume": 바로 받을 DownloadJob, "done": 이미 끝난 URL}.
+        처음 보는 URL, 저장 폴더가 바뀐 URL, 지난번에 실패한 URL, 출력 파일이 지워진 URL은 처음부터(queued) 다시 한다.
+        resume=False면 저장된 상태를 무시하고 모두 처음부터 한다."""
+        out_dir = str(out_dir)
+        plan = {"extract": [], "resume": [], "done": []}
+        now = time.time()
+        with self.lock, self.conn:
+            for page_url in dict.fromkeys(urls):
+                row = resume and self.conn.execute(
+                    "SELECT state, out_dir, m3u8, out_file FROM jobs WHERE page_url=?", (page_url,)
+                ).fetchone()
+                if row and row[1] == out_dir and row[0] == "done" and os.path.exists(row[3]):
+                    plan["done"].append(page_url)
+                    continue
+                if row and row[1] == out_dir and row[0] in ("extracted", "downloading") and row[2]:
+                    # 추출까지 끝났던 작업 (다운로드 중에 꺼졌으면 다시 받음)
+                    self.conn.execute("UPDATE jobs SET state='extracted' WHERE page_url=?", (page_url,))
+                    plan["resume"].append(page_url)
+                    continue
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO jobs (page_url, host, out_dir, state, queued_at)"
+                    " VALUES (?, ?, ?, 'queued', ?)",
+                    (page_url, get_base_url(page_url) or page_url, out_dir, now),
+                )
+                plan["extract"].append(page_url)
+        plan["resume"] = [self.load_job(u) for u in plan["resume"]]
+        return plan
+
+    def load_job(self, page_url: str) -> DownloadJob:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT m3u8, out_file, title, media_url, audio_url, attempts, last_failure"
+                " FROM jobs WHERE page_url=?", (page_url,)
+            ).fetchone()
+        m3u8, out_file, title, media_url, audio_url, attempts, last_failure = row
+        return DownloadJob(page_url, m3u8, out_file, page_url, title, -1, "", media_url, audio_url,
+                           attempts, last_failure)
+
+    def _update(self, page_url: str, **fields):
+        cols = ", ".join(f"{k}=?" for k in fields)
+        with self.lock, self.conn:
+            self.conn.execute(f"UPDATE jobs SET {cols} WHERE page_url=?", (*fields.values(), page_url))
+
+    def mark_extracted(self, job: DownloadJob):
+        self._update(
+            job.page_url, state="extracted", title=job.title or "", m3u8=job.m3u8, media_url=job.media_url,
+            audio_url=job.audio_url, out_file=job.out_file, extracted_at=time.time(),
+        )
+
+    def mark_started(self, job: DownloadJob):
+        self._update(job.page_url, state="downloading", started_at=time.time())
+
+    def mark_retry(self, job: DownloadJob):
+        """재시도 대기: 다시 시작하면 추출 결과부터 이어감"""
+        self._update(job.page_url, state="extracted", attempts=job.attempts, last_failure=job.last_failure,
+                     m3u8=job.m3u8, media_url=job.media_url, audio_url=job.audio_url)
+
+    def mark_finished(self, page_url: str, ok: bool, failure: str = "", attempts: int = 0):
+        self._update(page_url, state="done" if ok else "failed", last_failure="" if ok else failure,
+                     attempts=attempts, finished_at=time.time())
+
+    def forget(self, page_urls):
+        """저장된 상태를 지움 (강좌 동기화에서 바뀐 강의 → 다음 enqueue 때 처음부터 다시)"""
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM jobs WHERE page_url=?", [(u,) for u in page_urls])
+
+    def unfinished(self) -> list:
+        """끝나지 않은 작업의 URL (등록 순서)"""
+        marks = ",".join("?" * len(UNFINISHED_STATES))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT page_url FROM jobs WHERE state IN ({marks}) ORDER BY queued_at", UNFINISHED_STATES
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def counts(self) -> dict:
+        with self.lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: 0 for state in JOB_STATES} | dict(rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+DURATION_TOLERANCE_SEC = 2.0   # 출력 길이가 플레이리스트 길이보다 이만큼(또는 2%) 넘게 짧으면 잘린 파일
+
+
+def output_is_complete(out_file: str, expected_duration: float = 0.0, out_duration: float = 0.0) -> bool:
+    """출력 파일 검증: 비어 있지 않고, 길이를 알면 기대 길이만큼 기록됐는지"""
+    try:
+        if os.path.getsize(out_file) <= 0:
+            return False
+    except OSError:
+        return False
+    if expected_duration > 0 and out_duration > 0:
+        tolerance = max(DURATION_TOLERANCE_SEC, expected_duration * 0.02)
+        return out_duration >= expected_duration - tolerance
+    return True
+
+
+class DownloadIndex:
+    """완료된 다운로드 색인: host + LMS 영상 id + 확장자 → 출력 파일, 크기, 길이.
+    배치를 다시 돌리면 추출·네트워크 작업 전에 lookup으로 이미 받은 강의를 건너뛴다
+    (저장 폴더가 달라도, URL 쿼리 순서가 달라도 같은 강의로 본다).
+    파일이 지워졌거나 크기가 달라졌으면 항목을 지우고 다시 받는다."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                " host TEXT NOT NULL, vid TEXT NOT NULL, ext TEXT NOT NULL,"
+                " out_file TEXT NOT NULL, size INTEGER NOT NULL, duration REAL NOT NULL DEFAULT 0,"
+                " title TEXT NOT NULL DEFAULT '', finished_at REAL NOT NULL,"
+                " PRIMARY KEY (host, vid, ext))"
+            )
+
+    def lookup(self, page_url: str, ext: str) -> str:
+        """이미 받은 강의면 그 출력 파일 경로, 아니면 빈 문자열 (파일 stat만 하고 네트워크는 쓰지 않음)"""
+        key = lecture_key(page_url)
+        if key is None:
+            return ""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT out_file, size FROM downloads WHERE host=? AND vid=? AND ext=?", (*key, ext)
+            ).fetchone()
+        if not row:
+            return ""
+        out_file, size = row
+        try:
+            if os.path.getsize(out_file) == size:
+                return out_file
+        except OSError:
+            pass
+        self.forget(page_url, ext)
+        return ""
+
+    def add(self, page_url: str, out_file: str, title: str = "", expected_duration: float = 0.0,
+            out_duration: float = 0.0) -> bool:
+        """검증을 통과한 출력만 색인에 넣음. 넣었으면 True"""
+        key = lecture_key(page_url)
+        if key is None or not output_is_complete(out_file, expected_duration, out_duration):
+            return False
+        size = os.path.getsize(out_file)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO downloads (host, vid, ext, out_file, size, duration, title, finished_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, Path(out_file).suffix, str(out_file), size, out_duration or expected_duration,
+                 title or "", time.time()),
+            )
+        return True
+
+    def recorded_path(self, page_url: str, ext: str) -> str:
+        """검증 없이 기록된 출력 경로만 (다시 받을 때 같은 파일을 덮어쓰도록 unique_output_path에 넘김)"""
+        key = lecture_key(page_url)
+        if key is None:
+            return ""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT out_file FROM downloads WHERE host=? AND vid=? AND ext=?", (*key, ext)
+            ).fetchone()
+        return row[0] if row else ""
+
+    def forget(self, page_url: str, ext: str):
+        key = lecture_key(page_url)
+        if key is None:
+            return
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM downloads WHERE host=? AND vid=? AND ext=?", (*key, ext))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def unique_output_path(out_dir: Path, page_url: str, title: str, ext: str, taken: set, own: str = "") -> str:
+    """파일명: 제목 → 안전화 → 중복 방지 (이미 있는 파일이나 이번 배치에서 쓴 이름이면 ' (2)' 등).
+    own: 다운로드 색인에 기록된 이 강의의 예전 출력 — 같은 강의라 충돌이 아니므로 그 이름을 다시 씀"""
+    vid = extract_id_from_url(page_url)
+    base = sanitize_filename(title) if title else f"lms_{vid}"
+
+    candidate = base
+    suffix = 1
+    while True:
+        out_path = out_dir / f"{candidate}{ext}"
+        out_str = str(out_path)
+        if out_str not in taken and (out_str == own or not out_path.exists()):
+            break
+        suffix += 1
+        candidate = f"{base} ({suffix})"
+
+    taken.add(out_str)
+    return out_str
+
+
+# -------------------강좌 동기화 ----------------------
+# 강좌 페이지(course/view.php?id=)를 넣으면 그 안의 VOD 강의 링크로 펼친다
+ANCHOR_RE = re.compile(r'<a\s[^>]*?href=["\']([^"\']+)["\'][^>]*>(.*?)</a>', re.S | re.I)
+ACCESSHIDE_RE = re.compile(r'<span[^>]*class=["\'][^"\']*\baccesshide\b[^>]*>.*?</span>', re.S | re.I)
+VOD_LINK_RE = re.compile(r"/mod/vod/view(?:er)?\.php$")
+
+
+def is_course_url(u: str) -> bool:
+    """강의(viewer.php)가 아니라 강좌 페이지(Moodle course/...) URL인지"""
+    p = urlparse(u)
+    return bool(p.scheme and p.netloc) and "/course/" in p.path
+
+
+def find_lecture_links(html: str, page_url: str) -> list:
+    """강좌 페이지 HTML에서 VOD 강의 링크를 찾아 [(viewer.php URL, 링크 제목)] (페이지 순서, 같은 id는 한 번).
+    Moodle 강좌 페이지는 보통 mod/vod/view.php?id=로 링크하므로 같은 id의 viewer.php 주소로 맞춘다"""
+    found = OrderedDict()
+    for href, text in ANCHOR_RE.findall(html):
+        p = urlparse(urljoin(page_url, unescape(href)))
+        vid = (parse_qs(p.query).get("id") or [""])[0]
+        if not VOD_LINK_RE.search(p.path) or not vid.isdigit() or vid in found:
+            continue
+        text = re.sub(r"<[^>]+>", " ", ACCESSHIDE_RE.sub("", text))   # 화면 낭독기용 '동영상' 꼬리표 제외
+        viewer = f"{p.scheme}://{p.netloc}{p.path.rsplit('/', 1)[0]}/viewer.php?id={vid}"
+        found[vid] = (viewer, re.sub(r"\s+", " ", unescape(text)).strip())
+    return list(found.values())
+
+
+class CourseManifest:
+    """강좌 동기화 목록 (SQLite): 강좌 페이지마다 마지막 응답의 ETag/Last-Modified와,
+    그 강좌에서 본 강의(host + extract_id_from_url의 id) → viewer.php URL, 링크 제목, 페이지 순서.
+    다음 동기화 때 강좌 페이지가 304면 저장된 목록을 그대로 쓰고, 아니면 새 강의와 제목이 바뀐 강의를 골라낸다."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS courses ("
+                " course_url TEXT PRIMARY KEY, etag TEXT NOT NULL DEFAULT '',"
+                " last_modified TEXT NOT NULL DEFAULT '', synced_at REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS lectures ("
+                " host TEXT NOT NULL, vid TEXT NOT NULL, course_url TEXT NOT NULL, page_url TEXT NOT NULL,"
+                " title TEXT NOT NULL DEFAULT '', position INTEGER NOT NULL, seen_at REAL NOT NULL,"
+                " PRIMARY KEY (host, vid))"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS lectures_course ON lectures (course_url, position)")
+
+    def validators(self, course_url: str):
+        """(ETag, Last-Modified) — 처음 보는 강좌면 ("", "")"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified FROM courses WHERE course_url=?", (course_url,)
+            ).fetchone()
+        return row or ("", "")
+
+    def lectures(self, course_url: str) -> list:
+        """저장된 강의 [(viewer.php URL, 제목)] (강좌 페이지 순서)"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT page_url, title FROM lectures WHERE course_url=? ORDER BY position", (course_url,)
+            ).fetchall()
+
+    def update(self, course_url: str, links: list, etag: str = "", last_modified: str = ""):
+        """강좌 페이지에서 새로 읽은 링크로 교체 → (새 강의 URL, 제목이 바뀐 강의 URL).
+        강좌 페이지에서 빠진 강의는 목록에서 지운다 (받은 파일과 다운로드 색인은 그대로).
+        강의가 저장돼 있는데 링크가 하나도 없으면 같은 URL로 온 SSO/로그인 페이지나 모르는 레이아웃으로 보고
+        ValueError (목록도 ETag/Last-Modified도 바꾸지 않음: 다음 동기화가 304로 빈 목록을 받지 않게)"""
+        new, changed = [], []
+        now = time.time()
+        keys = []
+        with self.lock, self.conn:
+            if not any(lecture_key(u) for u, _ in links) and self.conn.execute(
+                "SELECT 1 FROM lectures WHERE course_url=? LIMIT 1", (course_url,)
+            ).fetchone():
+                raise ValueError("강좌 페이지에서 강의를 찾지 못함 (로그인 페이지이거나 페이지 구조가 다름)")
+            for position, (page_url, title) in enumerate(links):
+                key = lecture_key(page_url)
+                if key is None:
+                    continue
+                keys.append(key)
+                row = self.conn.execute(
+                    "SELECT title FROM lectures WHERE host=? AND vid=?", key
+                ).fetchone()
+                if row is None:
+                    new.append(page_url)
+                elif title and row[0] and title != row[0]:
+                    changed.append(page_url)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO lectures (host, vid, course_url, page_url, title, position, seen_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (*key, course_url, page_url, title or "", position, now),
+                )
+            seen = set(keys)
+            rows = self.conn.execute("SELECT host, vid FROM lectures WHERE course_url=?", (course_url,)).fetchall()
+            stale = [key for key in rows if key not in seen]
+            self.conn.executemany("DELETE FROM lectures WHERE host=? AND vid=?", stale)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO courses (course_url, etag, last_modified, synced_at) VALUES (?, ?, ?, ?)",
+                (course_url, etag or "", last_modified or "", now),
+            )
+        return new, changed
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+@dataclass
+class CourseSync:
+    course_url: str
+    lectures: list = field(default_factory=list)    # 강좌의 모든 강의 viewer.php URL (페이지 순서)
+    new: list = field(default_factory=list)         # 지난 동기화 이후 새로 생긴 강의
+    changed: list = field(default_factory=list)     # 제목이 바뀐 강의 (다시 받음)
+    not_modified: bool = False                      # 304: 강좌 페이지가 지난번과 같음
+    error: str = ""                                 # 실패하면 저장된 목록(lectures)으로 대신함
+
+
+def sync_course(session: requests.Session, course_url: str, manifest: CourseManifest,
+                timeout: float = 15.0) -> CourseSync:
+    """강좌 페이지를 조건부 요청(If-None-Match / If-Modified-Since)으로 받아 manifest와 비교.
+    LMS가 304를 주면 페이지를 다시 받거나 파싱하지 않고 저장된 목록을 쓴다.
+    로그인 페이지로 넘어가거나 저장된 강의가 있는 강좌에서 강의를 하나도 못 찾으면 ValueError,
+    HTTP 오류면 requests.HTTPError"""
+    result = CourseSync(course_url)
+    etag, last_modified = manifest.validators(course_url)
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    resp = session.get(course_url, headers=headers, timeout=timeout)
+    if resp.status_code == 304:
+        result.not_modified = True
+        result.lectures = [u for u, _ in manifest.lectures(course_url)]
+        return result
+    resp.raise_for_status()
+    if "/login/" in urlparse(resp.url).path:
+        raise ValueError("로그인 페이지로 이동됨 (세션 만료 또는 쿠키 없음)")
+    links = find_lecture_links(resp.text, resp.url)
+    result.new, result.changed = manifest.update(
+        course_url, links, resp.headers.get("ETag", ""), resp.headers.get("Last-Modified", "")
+    )
+    result.lectures = [u for u, _ in links]
+    return result
+
+
+def sync_courses(session: requests.Session, urls: list, manifest: CourseManifest, log=print):
+    """URL 목록의 강좌 페이지를 강의 URL로 펼침 → (강의 URL 목록(중복 제거, 순서 유지), [CourseSync]).
+    강좌가 아닌 URL은 그대로 두고, 동기화에 실패한 강좌는 지난번에 저장한 목록으로 대신한다.
+    이미 받은 강의를 거르는 건 호출하는 쪽(다운로드 색인/작업 저장소)이 한다."""
+    out, syncs = [], []
+    for u in urls:
+        if not is_course_url(u):
+            out.append(u)
+            continue
+        try:
+            sync = sync_course(session, u, manifest)
+        except (requests.RequestException, ValueError) as e:
+            sync = CourseSync(u, [p for p, _ in manifest.lectures(u)], error=str(e))
+            log(f"[WARN] 강좌 동기화 실패, 저장된 목록({len(sync.lectures)}개)을 씁니다: {u} | {e}\n")
+        else:
+            state = "변경 없음(304)" if sync.not_modified else f"새 강의 {len(sync.new)}개, 바뀐 강의 {len(sync.changed)}개"
+            log(f"[INFO] 강좌 동기화: {u} → 강의 {len(sync.lectures)}개 ({state})\n")
+        syncs.append(sync)
+        out.extend(sync.lectures)
+    return list(dict.fromkeys(out)), syncs
+
+
+# -------------------ffmpeg ----------------------
+@dataclass
+class FfmpegOptions:
+    user_agent: str = DEFAULT_USER_AGENT
+    mp3: bool = False           # 오디오만 mp3로 변환
+    copy: bool = True           # 재인코딩 없이 저장(-c copy)
+
+    @property
+    def ext(self) -> str:
+        return ".mp3" if self.mp3 else ".mp4"
+
+    @property
+    def mode_label(self) -> str:
+        return "MP3 변환" if self.mp3 else ("copy" if self.copy else "re-encode")
+
+    @property
+    def needs_transcode(self) -> bool:
+        """MP3/재인코딩처럼 CPU 인코딩이 필요한 모드 (받기와 인코딩을 두 단계로 나눔)"""
+        return self.mp3 or not self.copy
+
+    def download_options(self) -> "FfmpegOptions":
+        """2단계 파이프라인의 1단계: 네트워크 속도대로 재인코딩 없이(-c copy) 받기만 함"""
+        return FfmpegOptions(self.user_agent, mp3=False, copy=True)
+
+
+FFMPEG_BASE_ARGS = [
+    "ffmpeg",
+    "-nostdin",
+    "-hide_banner",
+    "-loglevel", "info",
+    # 진행 정보는 stdout에 key=value로, 로그는 stderr로 분리
+    "-nostats",
+    "-progress", "pipe:1",
+]
+
+
+def default_transcode_workers() -> int:
+    """인코딩 풀 크기 기본값 (CPU 코어 수)"""
+    return max(1, os.cpu_count() or 1)
+
+
+def transcode_threads(pool_size: int) -> int:
+    """인코딩 풀의 ffmpeg 하나가 쓸 스레드 수 (풀 전체가 코어 수를 넘지 않게)"""
+    return max(1, default_transcode_workers() // max(1, pool_size))
+
+
+def encode_args(opts: FfmpegOptions, audio_map: str) -> list:
+    """출력 스트림 선택과 코덱 옵션"""
+    if opts.mp3:
+        # 오디오만 mp3로 변환
+        return ["-map", audio_map, "-vn", "-c:a", "libmp3lame", "-b:a", "192k"]
+    if opts.copy:
+        return ["-map", "0:v:0?", "-map", f"{audio_map}?", "-c", "copy"]
+    return ["-map", "0:v:0?", "-map", f"{audio_map}?", "-c:v", "libx264", "-c:a", "aac", "-b:a", "192k"]
+
+
+def build_ffmpeg_command(job: DownloadJob, opts: FfmpegOptions, input_url: str = "", out_file: str = "",
+                         local_playlist: bool = False, encrypted: bool = False, audio_input=None) -> list:
+    """job을 받는 ffmpeg 명령. local_playlist=True면 세그먼트 엔진이 받아 둔 로컬 m3u8을 조립.
+    audio_input(기본: job.audio_url)이 있으면 별도 오디오 렌디션을 두 번째 입력으로 붙임"""
+    cmd = list(FFMPEG_BASE_ARGS)
+    if local_playlist:
+        # 로컬 세그먼트(.ts) + 암호화 키(https)만 열도록 허용
+        input_opts = [
+            "-allowed_extensions", "ALL",
+            "-protocol_whitelist", "file,crypto,data,http,https,tcp,tls",
+        ]
+    else:
+        # 네트워크 안정 옵션
+        input_opts = [
+            "-reconnect", "1",
+            "-reconnect_streamed", "1",
+            "-reconnect_on_network_error", "1",
+            "-reconnect_at_eof", "1",
+            "-rw_timeout", "20000000",
+            "-timeout", "20000000",
+        ]
+
+    # 헤더 (Referer + UA + Cookie[선택]) — 로컬 조립 시에는 키를 받을 때만 필요
+    headers = []
+    ua = opts.user_agent.strip()
+    if job.referer:
+        headers.append(f"Referer: {job.referer}")
+    if ua:
+        headers.append(f"User-Agent: {ua}")
+
+    # m3u8 접근에 세션 쿠키가 필요한 경우 대비 (추출할 때 미리 만들어 둔 값)
+    if job.cookie_header:
+        headers.append(f"Cookie: {job.cookie_header}")
+
+    if headers and (encrypted or not local_playlist):
+        # FFmpeg는 각 헤더 라인을 CRLF로 구분하고, 마지막에도 CRLF가 하나 더 필요합니다.
+        header_str = "\r\n".join(headers) + "\r\n"
+        input_opts += ["-headers", header_str]
+
+    # 입력 옵션은 -i마다 따로 적용되므로 입력별로 반복
+    audio_url = job.audio_url if audio_input is None else audio_input
+    cmd += input_opts + ["-i", input_url or job.stream_url]
+    if audio_url:
+        cmd += input_opts + ["-i", audio_url]
+    cmd += encode_args(opts, "1:a:0" if audio_url else "0:a:0")
+
+    # 기존 파일은 같은 강의를 다시 받을 때만 출력 경로가 됨 (unique_output_path의 own)
+    cmd += ["-y", out_file or job.out_file]
+    return cmd
+
+
+def build_transcode_command(source: str, out_file: str, opts: FfmpegOptions, threads: int = 0) -> list:
+    """2단계 파이프라인의 2단계: 받아 둔 원본(source_output_path)을 opts대로 인코딩 (네트워크 없이 CPU만 씀)"""
+    cmd = list(FFMPEG_BASE_ARGS) + ["-i", source] + encode_args(opts, "0:a:0")
+    if threads:
+        cmd += ["-threads", str(threads)]
+    return cmd + ["-y", out_file]
+
+
+DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+class FfmpegProgress:
+    """ffmpeg -progress 출력(key=value 블록)과 stderr의 'Duration:' 줄로 진행 상황을 계산.
+    out_time(초), total_size(바이트), speed(배속), percent, eta(초)를 제공한다."""
+
+    def __init__(self, duration: float = 0.0):
+        self.duration = duration
+        self.started_at = time.monotonic()  # 시간 측정: ffmpeg를 띄우기 직전에 만듦
+        self.first_data_at = 0.0            # 출력이 처음 기록된 시각 (첫 세그먼트 도착)
+        self.out_time = 0.0
+        self.total_size = 0
+        self.speed = 0.0
+        self.finished = False
+        self._buf = ""
+        self._block = {}
+
+    def feed_progress(self, text: str) -> bool:
+        """-progress 출력 조각을 넣음. 블록이 하나 이상 끝났으면 True"""
+        self._buf += text
+        *lines, self._buf = self._buf.split("\n")
+        updated = False
+        for line in lines:
+            key, sep, value = line.strip().partition("=")
+            if not sep:
+                continue
+            self._block[key] = value
+            if key == "progress":
+                self._apply(self._block)
+                self._block = {}
+                self.finished = value == "end"
+                updated = True
+        return updated
+
+    def feed_log(self, text: str):
+        """stderr 로그에서 입력 길이(Duration)를 찾음 (플레이리스트에서 이미 알면 건너뜀)"""
+        if self.duration:
+            return
+        m = DURATION_RE.search(text)
+        if m:
+            h, mi, sec = m.groups()
+            self.duration = int(h) * 3600 + int(mi) * 60 + float(sec)
+
+    def _apply(self, block: dict):
+        try:
+            self.out_time = int(block.get("out_time_us", "")) / 1_000_000
+        except ValueError:
+            pass
+        try:
+            self.total_size = int(block.get("total_size", ""))
+        except ValueError:
+            pass
+        if self.total_size > 0 and not self.first_data_at:
+            self.first_data_at = time.monotonic()
+        try:
+            self.speed = float(block.get("speed", "").rstrip("x"))
+        except ValueError:
+            pass
+
+    @property
+    def percent(self) -> float:
+        if self.finished:
+            return 100.0
+        if not self.duration:
+            return 0.0
+        return min(100.0, self.out_time * 100 / self.duration)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def eta(self) -> float:
+        """남은 시간(초). 알 수 없으면 -1"""
+        if not self.duration or self.speed <= 0:
+            return -1
+        return max(0.0, (self.duration - self.out_time) / self.speed)
+
+    def as_dict(self) -> dict:
+        return {
+            "out_time": round(self.out_time, 2),
+            "duration": round(self.duration, 2),
+            "percent": round(self.percent, 1),
+            "bytes": self.total_size,
+            "speed": self.speed,
+            "eta": round(self.eta, 1),
+        }
+
+
+def record_ffmpeg_timings(metrics, page_url: str, progress: FfmpegProgress, stage: str = "download"):
+    """끝난 ffmpeg 실행 시간을 기록. 직접 받기(download)는 첫 데이터까지(first_segment)와 나머지(transfer)로 나눔.
+    조립(assemble)/인코딩(transcode)은 전체 시간 하나로"""
+    if metrics is None:
+        return
+    elapsed = progress.elapsed
+    if stage == "download" and progress.first_data_at:
+        first = progress.first_data_at - progress.started_at
+        metrics.add(page_url, "first_segment", first)
+        metrics.add(page_url, "transfer", elapsed - first)
+    else:
+        metrics.add(page_url, stage, elapsed)
+
+
+# -------------------계측 ----------------------
+# 단계 이름 → 설명 (요약/Prometheus HELP용). 여기에 없는 단계도 그대로 기록된다
+STAGE_LABELS = {
+    "cache_lookup": "추출 캐시 조회",
+    "http_extract": "브라우저 없는 빠른 추출",
+    "page_load": "driver.get 페이지 로딩",
+    "alert_wait": "알림 대기(고정 1초)",
+    "cdp_wait": "네트워크 로그에서 m3u8 대기",
+    "video_wait": "<video> 대기",
+    "regex_fallback": "HTML 정규식 백업",
+    "tab_wait": "탭 병렬 추출",
+    "resolve": "variant 선택",
+    "queue_wait": "다운로드 대기열",
+    "ffmpeg_start": "ffmpeg 시작",
+    "playlist": "플레이리스트 받기",
+    "first_segment": "첫 세그먼트까지",
+    "transfer": "전송",
+    "download": "받기(데이터 없음)",
+    "assemble": "세그먼트 조립",
+    "transcode": "인코딩",
+}
+
+
+class StageTimer:
+    """작업 하나의 단계별 소요 시간을 잼. on_stage(단계, 초)가 있으면 잴 때마다 넘김"""
+
+    def __init__(self, on_stage=None):
+        self.on_stage = on_stage
+        self.stages = {}            # 단계 → 누적 초
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        if self.on_stage:
+            self.on_stage(name, seconds)
+
+
+def percentile(values: list, q: float) -> float:
+    """nearest-rank 백분위 (values는 정렬된 목록)"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+class BatchMetrics:
+    """배치의 작업(page_url)별 단계 소요 시간과 결과 카운터.
+    추출/다운로드 스레드가 함께 기록하고(스레드 안전), 배치가 끝나면 단계별 합계/p50/p95 요약을
+    JSON과 Prometheus 텍스트 형식(node_exporter textfile collector용)으로 내보낸다."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.jobs = {}              # page_url → {단계: 누적 초}
+        self.counters = {}          # 이름 → 값 (jobs_done, jobs_failed 등)
+        self.lock = threading.Lock()
+
+    def add(self, page_url: str, stage: str, seconds: float):
+        with self.lock:
+            stages = self.jobs.setdefault(page_url, {})
+            stages[stage] = stages.get(stage, 0.0) + max(0.0, seconds)
+
+    def timer(self, page_url: str) -> StageTimer:
+        return StageTimer(lambda stage, seconds: self.add(page_url, stage, seconds))
+
+    def count(self, name: str, n: float = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> dict:
+        """단계 → {count, total, mean, p50, p95, max} (작업별 누적 시간 기준)"""
+        with self.lock:
+            by_stage = {}
+            for stages in self.jobs.values():
+                for stage, seconds in stages.items():
+                    by_stage.setdefault(stage, []).append(seconds)
+        out = {}
+        for stage, values in by_stage.items():
+            values.sort()
+            total = sum(values)
+            out[stage] = {
+                "count": len(values),
+                "total": round(total, 3),
+                "mean": round(total / len(values), 3),
+                "p50": round(percentile(values, 0.5), 3),
+                "p95": round(percentile(values, 0.95), 3),
+                "max": round(values[-1], 3),
+            }
+        return out
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            jobs = {url: {k: round(v, 3) for k, v in stages.items()} for url, stages in self.jobs.items()}
+            counters = dict(self.counters)
+        return {
+            "started": self.started,
+            "elapsed": round(time.time() - self.started, 3),
+            "counters": counters,
+            "summary": self.summary(),
+            "jobs": jobs,
+        }
+
+    def prometheus_text(self, prefix: str = "lms_downloader") -> str:
+        lines = [
+            f"# HELP {prefix}_stage_seconds Per-job time spent in each extraction/download stage",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for stage, s in sorted(self.summary().items()):
+            label = f'stage="{stage}"'
+            lines.append(f'{prefix}_stage_seconds{{{label},quantile="0.5"}} {s["p50"]}')
+            lines.append(f'{prefix}_stage_seconds{{{label},quantile="0.95"}} {s["p95"]}')
+            lines.append(f"{prefix}_stage_seconds_sum{{{label}}} {s['total']}")
+            lines.append(f"{prefix}_stage_seconds_count{{{label}}} {s['count']}")
+        with self.lock:
+            counters = sorted(self.counters.items())
+        for name, value in counters:
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        lines.append(f"# TYPE {prefix}_batch_seconds gauge")
+        lines.append(f"{prefix}_batch_seconds {round(time.time() - self.started, 3)}")
+        return "\n".join(lines) + "\n"
+
+    def export_json(self, path):
+        write_text_atomic(path, json.dumps(self.as_dict(), ensure_ascii=False, indent=2))
+
+    def export_prometheus(self, path):
+        write_text_atomic(path, self.prometheus_text())
+
+    def format_summary(self) -> str:
+        """로그에 남길 단계별 요약 (합계가 큰 단계부터)"""
+        summary = self.summary()
+        if not summary:
+            return ""
+        lines = [f"[METRICS] 단계별 소요 시간 (작업 {len(self.jobs)}개)"]
+        for stage, s in sorted(summary.items(), key=lambda kv: -kv[1]["total"]):
+            lines.append(
+                f"  {STAGE_LABELS.get(stage, stage)}: {s['count']}건, 합계 {s['total']:.1f}s, "
+                f"p50 {s['p50']:.2f}s, p95 {s['p95']:.2f}s"
+            )
+        return "\n".join(lines) + "\n"
+
+
+# 시작 예산: 프로세스 시작부터 GUI 창이 뜨거나 CLI가 배치를 시작하기까지 (LMS_STARTUP_BUDGET_MS로 조정)
+STARTUP_BUDGET = 1.5
+# 시작 보고에 불러왔는지 표시할 무거운 모듈 (selenium은 로그인/브라우저 추출 전에는 없어야 정상)
+STARTUP_WATCH_MODULES = ("PyQt5.QtWidgets", "requests", "selenium")
+
+
+def startup_budget() -> float:
+    try:
+        return float(os.environ["LMS_STARTUP_BUDGET_MS"]) / 1000
+    except (KeyError, ValueError):
+        return STARTUP_BUDGET
+
+
+class StartupProfile:
+    """프로그램 시작 단계(import, 화면 구성, 첫 표시 등)별 시간.
+    started는 무거운 import보다 먼저 잰 time.perf_counter() 값이고, mark()는 단계가 끝난 시각을 기록한다.
+    모듈별 자세한 import 시간은 `python -X importtime main.py`로 본다."""
+
+    def __init__(self, started: float, budget: float = None):
+        self.started = started
+        self.budget = startup_budget() if budget is None else budget
+        self.marks = []             # (단계, 끝난 시각)
+
+    def mark(self, name: str, at: float = None):
+        self.marks.append((name, time.perf_counter() if at is None else at))
+
+    @property
+    def total(self) -> float:
+        return (self.marks[-1][1] if self.marks else time.perf_counter()) - self.started
+
+    def over_budget(self) -> bool:
+        return self.total > self.budget
+
+    def stages(self) -> list:
+        """[(단계, 초)] (앞 단계가 끝난 뒤부터 잰 시간)"""
+        out, prev = [], self.started
+        for name, at in self.marks:
+            out.append((name, at - prev))
+            prev = at
+        return out
+
+    def loaded_modules(self) -> list:
+        return [m for m in STARTUP_WATCH_MODULES if m in sys.modules]
+
+    def as_dict(self) -> dict:
+        return {
+            "total_ms": round(self.total * 1000, 1),
+            "budget_ms": round(self.budget * 1000, 1),
+            "over_budget": self.over_budget(),
+            "stages_ms": {name: round(sec * 1000, 1) for name, sec in self.stages()},
+            "modules": self.loaded_modules(),
+        }
+
+    def report(self) -> str:
+        stages = ", ".join(f"{name} {sec * 1000:.0f}ms" for name, sec in self.stages())
+        return (
+            f"시작 {self.total * 1000:.0f}ms / 예산 {self.budget * 1000:.0f}ms ({stages}) "
+            f"| 불러온 모듈: {', '.join(self.loaded_modules()) or '-'}"
+        )
+
+
+def write_text_atomic(path, text: str):
+    """임시 파일에 쓴 뒤 이름을 바꿔서, 읽는 쪽(Prometheus 수집기 등)이 반쯤 쓴 파일을 보지 않게 함"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def format_hms(seconds: float) -> str:
+    if seconds < 0:
+        return "-"
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    return f"{h}:{rem // 60:02d}:{rem % 60:02d}" if h else f"{rem // 60:02d}:{rem % 60:02d}"
+
+
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+def is_ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
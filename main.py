@@ -1,32 +1,42 @@
 # main.py
-import sys
-import re
 import time
-import unicodedata
+STARTED_AT = time.perf_counter()    # 시작 예산 기준 (무거운 import보다 먼저 잼)
+
+import sys
 import os
+import sqlite3
+import threading
+from collections import deque
+from functools import partial
 from pathlib import Path
-from urllib.parse import urlparse, parse_qs
 
-from PyQt5.QtCore import QProcess
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QProcess, QThread, QTimer, pyqtSignal
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QLabel,
-    QPushButton, QFileDialog, QPlainTextEdit, QMessageBox, QCheckBox, QTextEdit
+    QPushButton, QFileDialog, QPlainTextEdit, QMessageBox, QCheckBox, QTextEdit, QSpinBox,
+    QComboBox, QDoubleSpinBox, QStyleFactory, QTableView, QHeaderView, QProgressBar, QGroupBox, QGridLayout, QSplitter
 )
+from PyQt5.QtGui import QIcon, QFont
+from PyQt5.QtCore import Qt
+QT_IMPORTED_AT = time.perf_counter()
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, UnexpectedAlertPresentException, NoAlertPresentException
 import platform
 from datetime import datetime
 
+# 엔진(requests 포함)은 처음부터 불러옴: 창을 만들 때 바로 쓰는 상태 객체와 옵션 목록이 여기 있고
+# import 비용은 0.15~0.2초로 시작 예산 안에 들어감. 늦게 불러오는 것은 Selenium(engine 안에서
+# 로그인·브라우저 추출을 처음 할 때 import)뿐이고, 위젯도 모두 처음에 만든다.
+from engine import (
+    DEFAULT_USER_AGENT, DOWNLOAD_ENGINES, EXTRACT_MODES, FAILURE_LABELS, VARIANT_POLICIES,
+    BatchMetrics, ConcurrencyTuner, CourseManifest, DownloadIndex, DownloadJob, ExtractionCache, Extractor, FfmpegOptions, FfmpegProgress, JobQueue, JobStore, KeyCache, RetryPolicy,
+    CookieJarCache, CookieRefresher, SegmentFetchResult, SessionPool, StartupProfile, TokenBucket, TUNE_INTERVAL,
+    app_data_dir, build_ffmpeg_command, build_transcode_command, classify_failure, commit_partial_output,
+    default_transcode_workers, fetch_job_segments, format_bytes, format_hms, get_base_url, group_urls_by_host,
+    is_course_url, is_ffmpeg_available, job_host, lecture_key, make_http_session, parse_http_error, partial_output_path, record_ffmpeg_timings,
+    segment_parts_dir, source_output_path, sync_courses, transcode_threads, unique_output_path,
+)
+ENGINE_IMPORTED_AT = time.perf_counter()
 
-# 파일 상단 import 근처
-from PyQt5.QtWidgets import QStyleFactory, QTableWidget, QTableWidgetItem, QHeaderView, QProgressBar, QGroupBox, QGridLayout, QSplitter
-from PyQt5.QtGui import QIcon, QFont
-from PyQt5.QtCore import Qt
 
 def apply_modern_theme(app: QApplication):
     app.setStyle(QStyleFactory.create("Fusion"))
@@ -71,7 +81,7 @@ def apply_modern_theme(app: QApplication):
     QPushButton[primary="true"] { 
         background: #2d6cdf; border-color: #2d6cdf; color: white; font-weight: 600;
     }
-    QTableWidget { border: 1px solid #3a3a3a; border-radius: 8px; }
+    QTableView { border: 1px solid #3a3a3a; border-radius: 8px; }
     QHeaderView::section { background: #1a1a1a; border: none; padding: 6px; }
     QProgressBar { border: 1px solid #3a3a3a; border-radius: 6px; text-align: center; }
     QProgressBar::chunk { background: #2d6cdf; border-radius: 6px; }
@@ -87,91 +97,276 @@ def open_folder(path: str):
     else:  # Linux and other OS
         os.system(f"xdg-open '{path}'")
 
-# -------------------유틸 ----------------------
-def extract_id_from_url(u: str) -> str:
-    """?id= 숫자 뽑기 (없으면 도메인+타임스탬프)"""
-    try:
-        q = parse_qs(urlparse(u).query)
-        if "id" in q and q["id"]:
-            return q["id"][0]
-    except Exception:
-        pass
-    ts = str(int(time.time()*1000))
-    host = urlparse(u).netloc.replace(".", "_")
-    return f"{host}_{ts}"
-
-
-def get_base_url(full_url: str) -> str:
-    """전체 URL에서 스킴+도메인까지만 추출 → https://domain/"""
-    p = urlparse(full_url)
-    if not p.scheme or not p.netloc:
-        return ""
-    return f"{p.scheme}://{p.netloc}/"
-
-
-def sanitize_filename(name: str, max_len: int = 150) -> str:
-    """
-    파일 시스템에 안전한 파일명 생성 + 글자 사이 공백 보정
-    """
-    name = unicodedata.normalize("NFKC", name or "").strip()
-
-    forbidden = '<>:"/\\|?*\0'
-    name = "".join("" if ch in forbidden else ch for ch in name)
-
-    name = re.sub(r'(?<=[A-Za-z])\s+(?=[A-Za-z])', '', name)
-    name = re.sub(r'\s+', ' ', name)
-    name = re.sub(r'\s+,', ',', name)
-    name = re.sub(r'\s+([\)\]\}])', r'\1', name)
-    name = re.sub(r'\s*-\s*', ' - ', name)
-    name = re.sub(r'([\(\[\{])\s+', r'\1', name)
-    name = "".join(ch if (ch.isprintable()) else " " for ch in name).strip()
-
-    if not name:
-        name = "untitled"
-    if len(name) > max_len:
-        name = name[:max_len].rstrip()
-
-    return name
-
-
-def build_cookie_header_from_driver(driver, target_url: str) -> str:
-    """
-    Selenium driver에 저장된 쿠키를 가져와 ffmpeg에 넣을 Cookie 헤더 문자열로 변환.
-    target_url 도메인과 매칭되는 쿠키만 포함.
-    """
-    try:
-        cookies = driver.get_cookies()
-    except Exception:
-        return ""
-
-    t_host = urlparse(target_url).netloc
-    pairs = []
-    for c in cookies:
-        name = c.get("name")
-        value = c.get("value")
-        domain = (c.get("domain") or "").lstrip(".")
-        if name and value and (t_host.endswith(domain) or domain.endswith(t_host)):
-            pairs.append(f"{name}={value}")
-    return "; ".join(pairs)
+# -------------------백그라운드 스레드 ----------------------
+class ExtractWorker(QThread):
+    """한 LMS 호스트의 URL 목록을 추출(engine.Extractor)해 결과를 시그널로 GUI에 넘기는 백그라운드 스레드.
+    호스트마다 하나씩 떠서 서로 다른 호스트는 동시에 추출한다.
+    그 호스트의 Selenium driver는 배치 동안 이 스레드만 사용하고, 페이지는 tabs개씩 탭에 동시에 띄운다.
+    재시도할 작업의 쿠키 갱신/재추출도 add()로 이 스레드에 맡긴다."""
+    # page_url, m3u8, title, cookie_header, media_url(선택한 variant), audio_url(별도 오디오)
+    extracted = pyqtSignal(str, str, str, str, str, str)
+    refreshed = pyqtSignal(str, str, str, str, str, str)   # 재시도 추출 결과 (extracted와 같은 형식)
+    refresh_failed = pyqtSignal(str)                        # 재시도 추출에 실패한 page_url
+    failed = pyqtSignal(str)                                # 추출에 실패한 page_url
+    log = pyqtSignal(str)
+
+    def __init__(self, host: str, driver, urls, mode: str = "dom", fast: bool = True, cache=None,
+                 variant_policy: str = "highest", audio_only: bool = False, tabs: int = 1,
+                 cookies=None, driver_lock=None, metrics=None, parent=None):
+        super().__init__(parent)
+        self.host = host
+        self.driver_lock = driver_lock or threading.RLock()  # 백그라운드 쿠키 갱신과 driver를 나눠 씀
+        self.urls = deque((u, None) for u in urls)   # (page_url, 재시도면 reextract 여부)
+        self.lock = threading.Lock()
+        self.closing = False
+        self.extractor = Extractor(
+            driver, None, mode, fast, cache, variant_policy, audio_only, log=self.log.emit, tabs=tabs,
+            cookies=cookies, host=host, metrics=metrics,
+        )
+
+    def add(self, page_url: str, reextract: bool) -> bool:
+        """재시도 추출 요청을 뒤에 붙임. 이미 끝나 가는 중이면 False (새 스레드로 처리)"""
+        with self.lock:
+            if self.closing:
+                return False
+            self.urls.append((page_url, reextract))
+            return True
+
+    def next_urls(self) -> list:
+        """다음에 처리할 항목들: 새 URL이면 탭 수만큼 묶고, 재시도 요청은 하나씩"""
+        with self.lock:
+            if not self.urls or self.isInterruptionRequested():
+                self.closing = True
+                return []
+            items = [self.urls.popleft()]
+            while (items[0][1] is None and self.urls and self.urls[0][1] is None
+                   and len(items) < self.extractor.tabs):
+                items.append(self.urls.popleft())
+            return items
+
+    def run(self):
+        with self.driver_lock:
+            self.extractor.open_session()
+        try:
+            while True:
+                items = self.next_urls()
+                if not items:
+                    break
+                page_url, reextract = items[0]
+                if reextract is None:
+                    with self.driver_lock:
+                        results = self.extractor.extract_many([u for u, _ in items])
+                    for (url, _), result in zip(items, results):
+                        if result:
+                            self.extracted.emit(*result)
+                        else:
+                            self.failed.emit(url)
+                    continue
+                with self.driver_lock:
+                    result = self.extractor.refresh(page_url, reextract)
+                if result:
+                    self.refreshed.emit(*result)
+                else:
+                    self.refresh_failed.emit(page_url)
+        finally:
+            with self.lock:
+                self.closing = True
+            self.extractor.close()
+
+
+class CourseSyncThread(QThread):
+    """강좌 페이지 URL을 강의 URL로 펼치는 백그라운드 스레드 (engine.sync_courses, 강좌당 요청 한 번)"""
+    log = pyqtSignal(str)
+
+    def __init__(self, session, urls, manifest, parent=None):
+        super().__init__(parent)
+        self.session = session      # 로그인 쿠키를 넣은 requests 세션
+        self.requested = urls
+        self.manifest = manifest
+        self.urls = []              # 펼친 강의 URL (강좌가 아닌 URL은 그대로)
+        self.changed = []           # 제목이 바뀌어 다시 받을 강의
+
+    def run(self):
+        try:
+            self.urls, syncs = sync_courses(self.session, self.requested, self.manifest, self.log.emit)
+            self.changed = [u for sync in syncs for u in sync.changed]
+        finally:
+            self.session.close()
+
+
+class SegmentFetchThread(QThread):
+    """세그먼트 엔진(engine.fetch_job_segments)을 GUI 밖에서 돌리는 스레드"""
+    progress = pyqtSignal(int, int)     # 받은 세그먼트 수, 전체
+    log = pyqtSignal(str)
+
+    def __init__(self, job, user_agent: str, concurrency: int = 1, bucket=None, timer=None, concat_to: str = "",
+                 keys=None, parent=None):
+        super().__init__(parent)
+        self.job = job
+        self.concat_to = concat_to  # 원본(.source.ts)을 받는 중이면 ffmpeg 없이 이 파일로 이어 붙임
+        self.timer = timer          # 단계별 시간 기록 (StageTimer)
+        self.user_agent = user_agent
+        self.concurrency = concurrency
+        self.bucket = bucket        # 전역 대역폭 제한 (TokenBucket, 모든 워커 공유)
+        self.keys = keys            # AES-128 키 캐시 (KeyCache, 모든 워커 공유)
+        self.result = SegmentFetchResult()
+
+    def run(self):
+        self.result = fetch_job_segments(
+            self.job, self.user_agent, self.concurrency,
+            self.isInterruptionRequested, self.progress.emit, self.log.emit, self.bucket, self.timer,
+            self.concat_to, self.keys,
+        )
+
+
+# -------------------작업/워커 ----------------------
+class DownloadWorker:
+    """ffmpeg QProcess(및 세그먼트 엔진 스레드)와 현재 맡은 작업을 묶어 관리하는 슬롯"""
+
+    def __init__(self, slot: int):
+        self.slot = slot
+        self.job = None         # 현재 처리 중인 DownloadJob
+        self.proc = None        # 현재 실행 중인 ffmpeg QProcess
+        self.stopped = False    # 사용자가 중지했는지 여부
+        self.http_error = 0     # ffmpeg 출력/세그먼트 요청에서 본 HTTP 오류 코드
+        self.failure = ""       # 실패 분류 (engine.classify_failure, 재시도 정책 선택용)
+        self.fetcher = None     # 세그먼트 엔진의 SegmentFetchThread
+        self.partial_file = ""  # 세그먼트 조립 중인 임시 출력 파일
+        self.source_file = ""   # 2단계 파이프라인: 받기 단계가 만들 원본 (인코딩 전)
+        self.transcoding = False    # 인코딩 풀의 워커인지 (다운로드 슬롯과 따로 셈)
+        self.progress = FfmpegProgress()   # ffmpeg -progress 파싱 결과
+        self.ffmpeg_stage = "download"     # 지금 돌리는 ffmpeg의 단계 (download/assemble/transcode, 시간 기록용)
+
+    def is_running(self) -> bool:
+        if self.fetcher is not None and self.fetcher.isRunning():
+            return True
+        return self.proc is not None and self.proc.state() != QProcess.NotRunning
 
 
 # -------------------메인 GUI ----------------------
+TABLE_COLUMNS = ["URL", "제목", "상태", "진행률", "속도", "남은 시간", "출력 파일"]
+COL_URL, COL_TITLE, COL_STATUS, COL_PROGRESS, COL_SPEED, COL_ETA, COL_OUT = range(len(TABLE_COLUMNS))
+LOG_BUFFER_LINES = 2000     # 화면에 반영되기 전까지 모아 둘 로그 항목 수 (넘치면 오래된 것부터 버림)
+LOG_MAX_BLOCKS = 5000       # 로그 창에 남길 최대 줄 수
+TABLE_FLUSH_MS = 150        # 대기열 칸 변경을 모아 화면에 알리는 간격
+
+
+class QueueTableModel(QAbstractTableModel):
+    """대기열 테이블 모델. 행마다 칸 문자열 목록 하나만 두고(셀마다 위젯 아이템을 만들지 않음)
+    page_url → 행 번호 색인으로 행을 바로 찾는다.
+    칸 변경은 바뀐 범위만 기억해 두었다가 타이머로 dataChanged 한 번에 몰아서 알린다."""
+
+    def __init__(self, columns, flush_ms: int = TABLE_FLUSH_MS, parent=None):
+        super().__init__(parent)
+        self.columns = list(columns)
+        self.rows = []              # 행 → [칸 문자열, ...]
+        self.row_index = {}         # page_url → 행 번호
+        self._dirty = None          # 아직 알리지 않은 변경 범위 [top, left, bottom, right]
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(flush_ms)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.rows[index.row()][index.column()]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columns[section]
+        return None
+
+    def row_of(self, page_url: str) -> int:
+        return self.row_index.get(page_url, -1)
+
+    def add_row(self, page_url: str, cells) -> int:
+        """행을 추가하고 행 번호 반환. 같은 URL의 행이 이미 있으면(같은 배치를 다시 시작) 그 행을 덮어씀"""
+        row = self.row_index.get(page_url)
+        if row is not None:
+            for col, text in enumerate(cells):
+                self.set_text(row, col, text)
+            return row
+        row = len(self.rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.append(list(cells))
+        self.row_index[page_url] = row
+        self.endInsertRows()
+        return row
+
+    def set_text(self, row: int, col: int, text: str):
+        if not 0 <= row < len(self.rows) or self.rows[row][col] == text:
+            return
+        self.rows[row][col] = text
+        d = self._dirty
+        if d is None:
+            self._dirty = [row, col, row, col]
+            self.flush_timer.start()
+        else:
+            d[0], d[1] = min(d[0], row), min(d[1], col)
+            d[2], d[3] = max(d[2], row), max(d[3], col)
+
+    def flush(self):
+        if self._dirty is None:
+            return
+        top, left, bottom, right = self._dirty
+        self._dirty = None
+        self.dataChanged.emit(self.index(top, left), self.index(bottom, right), [Qt.DisplayRole])
+
+
 class HlsDownloader(QWidget):
-    def __init__(self):
+    def __init__(self, startup: StartupProfile = None):
         super().__init__()
         self.setWindowTitle("LMS Downloader")
         self.setMinimumWidth(920)
-
-        self.proc = None            # 현재 실행 중인 ffmpeg QProcess
-        self.driver = None          # Selenium driver (로그인 세션 유지)
-        self.pending_jobs = []      # (page_url, m3u8_url, out_file, referer)
-        self.current_job = None
-
+        self.startup = startup
+        self.init_state()
+        self.build_ui()
+        if startup:
+            startup.mark("화면 구성")
+        # 위젯은 모두 창을 띄우기 전에 만들고, SQLite를 여는 일만 창이 뜬 뒤로 미룸:
+        # 시작 시간 보고, 지난번에 끝나지 않은 작업 불러오기
+        QTimer.singleShot(0, self.finish_startup)
+
+    def init_state(self):
+        """엔진 쪽 상태 (가벼운 객체만 만들고, 브라우저/SQLite 저장소는 처음 쓸 때 염)"""
+        self.sessions = SessionPool()   # LMS 호스트별 로그인된 Selenium driver
+        self.cookies = CookieJarCache() # 호스트별 로그인 쿠키 (백그라운드에서 갱신)
+        self.cookie_refresher = None    # CookieRefresher (로그인 후 시작)
+        self.pending_jobs = JobQueue()  # 대기 중인 DownloadJob
+        self.workers = []           # 실행 중인 DownloadWorker 목록
+        self.transcode_jobs = deque()   # 받기가 끝나 인코딩을 기다리는 DownloadJob
+        self.transcoders = []       # 인코딩 중인 DownloadWorker (CPU 풀, 다운로드 슬롯과 별개)
+        self.retrying = {}          # page_url → 백오프 대기/재추출 중인 DownloadJob
+        self.bandwidth = TokenBucket()  # 세그먼트 엔진 전체가 나눠 쓰는 대역폭 한도
+        self.keys = KeyCache()          # AES-128 키 (키 URI별, 모든 작업이 나눠 씀)
+        self.tuner = None           # ConcurrencyTuner: '자동 조절'일 때 동시 다운로드 수를 정함
+        self.ffmpeg_bytes = 0       # ffmpeg 직접 엔진이 받은 바이트 (세그먼트 엔진은 bandwidth.total)
+        self.extractors = {}        # 호스트 → 실행 중인 ExtractWorker (추출 스레드)
+        self.cache = None           # ExtractionCache (첫 배치 때 열림)
+        self.store = None           # JobStore: URL별 작업 상태 (재시작해도 이어감)
+        self.index = None           # DownloadIndex: 이미 받은 강의 (host + id)
+        self.manifest = None        # CourseManifest: 강좌 페이지별 강의 목록 (강좌 동기화)
+        self.course_sync = None     # 실행 중인 CourseSyncThread
+        self.metrics = BatchMetrics()   # 이번 배치의 작업별 단계 소요 시간
+        self.batch_out_dir = None
+        self.existing_outputs = set()
+        self.total_jobs = 0
+        self.done_jobs = 0
+
+    def build_ui(self):
         # URL들 입력 (여러 줄)
         self.urls_edit = QTextEdit()
         self.urls_edit.setPlaceholderText(
             "https://ys.learnus.org/mod/vod/viewer.php?id=4110793\n"
-            "https://plms.postech.ac.kr/mod/vod/viewer.php?id=196921"
+            "https://plms.postech.ac.kr/mod/vod/viewer.php?id=196921\n"
+            "https://ys.learnus.org/course/view.php?id=123456  (강좌 페이지: 새 강의만 받음)"
         )
 
         # 출력 폴더
@@ -180,16 +375,14 @@ class HlsDownloader(QWidget):
         btn_dir.clicked.connect(self.choose_out_dir)
 
         # 옵션 (User-Agent, -c copy)
-        self.ua_edit = QLineEdit(
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome Safari"
-        )
+        self.ua_edit = QLineEdit(DEFAULT_USER_AGENT)
         self.chk_copy = QCheckBox("재인코딩 없이 저장(-c copy)")
         self.chk_copy.setChecked(True)
 
         # 제어 버튼
         self.btn_login = QPushButton("로그인 시작(브라우저 열기)")
         self.btn_fetch = QPushButton("추출+다운로드 시작")
-        self.btn_stop = QPushButton("현재 항목 중지")
+        self.btn_stop = QPushButton("중지(선택 행/전체)")
         self.btn_close_browser = QPushButton("브라우저 닫기")
 
         self.btn_fetch.setEnabled(False)        # 로그인 세션 준비 전에는 비활성화
@@ -200,9 +393,18 @@ class HlsDownloader(QWidget):
         self.btn_stop.clicked.connect(self.stop_current)
         self.btn_close_browser.clicked.connect(self.close_browser)
 
-        # 로그창
+        # 로그창 (줄 수 제한 + 200ms마다 버퍼 반영)
         self.log = QPlainTextEdit()
         self.log.setReadOnly(True)
+        self.log.setMaximumBlockCount(LOG_MAX_BLOCKS)
+        self.log_buffer = deque(maxlen=LOG_BUFFER_LINES)
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(200)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start()
+        self.tune_timer = QTimer(self)
+        self.tune_timer.setInterval(int(TUNE_INTERVAL * 1000))
+        self.tune_timer.timeout.connect(self.tune_concurrency)
 
         # 레이아웃 (교체 시작)
         root = QVBoxLayout(self)
@@ -229,7 +431,7 @@ class HlsDownloader(QWidget):
         g1.setVerticalSpacing(8)
         row = 0
 
-        g1.addWidget(QLabel("LMS 강의 URL들 (줄바꿈 구분)"), row, 0, 1, 3); row += 1
+        g1.addWidget(QLabel("LMS 강의/강좌 URL들 (줄바꿈 구분)"), row, 0, 1, 3); row += 1
         self.urls_edit.setMinimumHeight(100)
         g1.addWidget(self.urls_edit, row, 0, 1, 3); row += 1
 
@@ -251,11 +453,106 @@ class HlsDownloader(QWidget):
         
         self.chk_mp3 = QCheckBox("MP3로 변환 저장")
         self.chk_mp3.setChecked(False)
+        self.chk_fast = QCheckBox("브라우저 없이 빠른 추출")
+        self.chk_fast.setChecked(True)
+        self.chk_skip_done = QCheckBox("이미 받은 강의 건너뛰기")
+        self.chk_skip_done.setChecked(True)
         optrow.addWidget(self.chk_copy)
         optrow.addWidget(self.chk_mp3)
+        optrow.addWidget(self.chk_fast)
+        optrow.addWidget(self.chk_skip_done)
         optrow.addStretch(1)
         g2.addLayout(optrow, r, 0, 1, 3); r += 1
 
+        # 추출 옵션 (방식 + 캐시)
+        extrow = QHBoxLayout()
+        self.cmb_extract = QComboBox()
+        for key, label in EXTRACT_MODES.items():
+            self.cmb_extract.addItem(label, key)
+        self.spin_cache_ttl = QSpinBox()
+        self.spin_cache_ttl.setRange(0, 24 * 30)
+        self.spin_cache_ttl.setValue(6)
+        self.spin_cache_ttl.setSuffix(" 시간")
+        self.spin_cache_ttl.setToolTip("0이면 캐시를 쓰지 않고 매번 추출합니다.")
+        extrow.addWidget(self.cmb_extract)
+        extrow.addWidget(QLabel("캐시 유효시간"))
+        extrow.addWidget(self.spin_cache_ttl)
+        self.spin_tabs = QSpinBox()
+        self.spin_tabs.setRange(1, 8)
+        self.spin_tabs.setValue(3)
+        self.spin_tabs.setToolTip("브라우저로 추출할 때 호스트별 브라우저에서 동시에 띄울 탭 수 (로그인 쿠키 공유)")
+        extrow.addWidget(QLabel("추출 탭"))
+        extrow.addWidget(self.spin_tabs)
+        extrow.addStretch(1)
+        g2.addWidget(QLabel("추출 방식"), r, 0)
+        g2.addLayout(extrow, r, 1, 1, 2); r += 1
+
+        # 다운로드 옵션 (엔진 + 동시 작업 수)
+        dlrow = QHBoxLayout()
+        self.cmb_engine = QComboBox()
+        for key, label in DOWNLOAD_ENGINES.items():
+            self.cmb_engine.addItem(label, key)
+        self.spin_workers = QSpinBox()
+        self.spin_workers.setRange(1, 16)
+        self.spin_workers.setValue(3)
+        self.chk_autotune = QCheckBox("자동 조절")
+        self.chk_autotune.setToolTip(
+            "받는 속도와 실패율을 보고 동시 다운로드 수를 자동으로 늘리고 줄임 (설정한 수에서 시작, 최대 16)"
+        )
+        self.cmb_variant = QComboBox()
+        for key, label in VARIANT_POLICIES.items():
+            self.cmb_variant.addItem(label, key)
+        self.cmb_variant.setToolTip("마스터 플레이리스트일 때 받을 화질 (MP3 저장 시에는 오디오만 받음)")
+        dlrow.addWidget(self.cmb_engine)
+        dlrow.addWidget(self.cmb_variant)
+        self.spin_segments = QSpinBox()
+        self.spin_segments.setRange(1, 32)
+        self.spin_segments.setValue(6)
+        self.spin_segments.setToolTip("세그먼트 엔진에서 강의 하나당 동시에 받는 세그먼트 수")
+        dlrow.addWidget(QLabel("동시 다운로드 수"))
+        dlrow.addWidget(self.spin_workers)
+        dlrow.addWidget(self.chk_autotune)
+        self.spin_per_host = QSpinBox()
+        self.spin_per_host.setRange(0, 16)
+        self.spin_per_host.setValue(2)
+        self.spin_per_host.setSpecialValueText("제한 없음")
+        self.spin_per_host.setToolTip("같은 LMS 호스트에 동시에 보내는 다운로드 수 (다른 호스트 작업은 막지 않음)")
+        self.spin_rate = QDoubleSpinBox()
+        self.spin_rate.setRange(0, 1000)
+        self.spin_rate.setDecimals(1)
+        self.spin_rate.setSuffix(" MB/s")
+        self.spin_rate.setSpecialValueText("제한 없음")
+        self.spin_rate.setToolTip("모든 다운로드를 합친 최대 속도 (한도를 걸면 세그먼트 엔진으로 받음)")
+        self.spin_rate.valueChanged.connect(self.apply_rate_limit)
+        self.cmb_engine.currentIndexChanged.connect(self.on_engine_changed)
+        dlrow.addWidget(QLabel("세그먼트 동시 요청"))
+        dlrow.addWidget(self.spin_segments)
+        dlrow.addWidget(QLabel("호스트당"))
+        dlrow.addWidget(self.spin_per_host)
+        dlrow.addWidget(QLabel("대역폭"))
+        dlrow.addWidget(self.spin_rate)
+        self.spin_retries = QSpinBox()
+        self.spin_retries.setRange(0, 10)
+        self.spin_retries.setValue(3)
+        self.spin_retries.setToolTip(
+            "실패한 작업을 다시 시도할 횟수\n"
+            "네트워크/5xx: 점점 길게 기다렸다 재시도, 401/403: 쿠키 갱신, 404: 페이지 재추출"
+        )
+        dlrow.addWidget(QLabel("재시도"))
+        dlrow.addWidget(self.spin_retries)
+        self.spin_transcode = QSpinBox()
+        self.spin_transcode.setRange(1, 64)
+        self.spin_transcode.setValue(default_transcode_workers())
+        self.spin_transcode.setToolTip(
+            "MP3/재인코딩 모드에서 동시에 돌릴 인코딩 수 (기본: CPU 코어 수)\n"
+            "먼저 재인코딩 없이 받아 두고, 인코딩은 다운로드와 따로 이 수만큼 돌림"
+        )
+        dlrow.addWidget(QLabel("인코딩"))
+        dlrow.addWidget(self.spin_transcode)
+        dlrow.addStretch(1)
+        g2.addWidget(QLabel("다운로드 엔진"), r, 0)
+        g2.addLayout(dlrow, r, 1, 1, 2); r += 1
+
         box_opts.setLayout(g2)
         root.addWidget(box_opts)
 
@@ -264,13 +561,19 @@ class HlsDownloader(QWidget):
         split.setChildrenCollapsible(False)
 
         # 대기열 테이블
-        self.tbl = QTableWidget(0, 4, self)
-        self.tbl.setHorizontalHeaderLabels(["URL", "제목", "상태", "출력 파일"])
-        self.tbl.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
-        self.tbl.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
-        self.tbl.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeToContents)
-        self.tbl.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+        # (행이 수천 개여도 보이는 행만 그리도록 모델/뷰 사용, 내용에 맞춘 열 너비 계산은 하지 않음)
+        self.queue_model = QueueTableModel(TABLE_COLUMNS, parent=self)
+        self.tbl = QTableView(self)
+        self.tbl.setModel(self.queue_model)
+        header = self.tbl.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        header.setSectionResizeMode(COL_URL, QHeaderView.Stretch)
+        header.setSectionResizeMode(COL_OUT, QHeaderView.Stretch)
+        for col, width in [(COL_TITLE, 220), (COL_STATUS, 150), (COL_PROGRESS, 120), (COL_SPEED, 70), (COL_ETA, 80)]:
+            header.resizeSection(col, width)
         self.tbl.verticalHeader().setVisible(False)
+        self.tbl.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.tbl.setWordWrap(False)
         self.tbl.setSelectionBehavior(self.tbl.SelectRows)
         self.tbl.setEditTriggers(self.tbl.NoEditTriggers)
 
@@ -298,6 +601,13 @@ class HlsDownloader(QWidget):
         root.addLayout(status)
         # 레이아웃 (교체 끝)
 
+    def finish_startup(self):
+        if self.startup:
+            self.startup.mark("첫 표시")
+            level = "WARN" if self.startup.over_budget() else "INFO"
+            self.append_log(f"[{level}] {self.startup.report()}\n")
+        # 지난번에 끝나지 않은 작업이 있으면 URL 칸에 불러옴
+        self.restore_unfinished()
 
     def open_output_dir(self):
         out_dir = Path(self.out_dir_edit.text().strip() or ".").resolve()
@@ -314,55 +624,80 @@ class HlsDownloader(QWidget):
             text = text[:-1]
         lines = text.split("\n")
         stamped = "\n".join([ (ts + lines[0]) ] + [(" " * len(ts) + L) for L in lines[1:]]) + "\n"
+        # 바로 위젯에 넣지 않고 링 버퍼에 모았다가 타이머로 한꺼번에 반영
+        self.log_buffer.append(stamped)
+
+    def flush_log(self):
+        if not self.log_buffer:
+            return
+        text = "".join(self.log_buffer)
+        self.log_buffer.clear()
         self.log.moveCursor(self.log.textCursor().End)
-        self.log.insertPlainText(stamped)
+        self.log.insertPlainText(text)
         self.log.moveCursor(self.log.textCursor().End)
 
     def start_browser_and_login(self):
-        """Selenium 크롬을 띄우고 사용자가 직접 로그인할 수 있게 함."""
-        if self.driver:
-            self.append_log("[INFO] 이미 브라우저가 열려 있습니다.\n")
-            self.btn_fetch.setEnabled(True)
-            return
-
-        # URL 입력 칸에서 첫 줄을 가져와 base 도메인 산출
+        """URL 목록에 나오는 LMS 호스트마다 Selenium 크롬을 하나씩 띄우고 사용자가 직접 로그인할 수 있게 함.
+        이미 브라우저가 있는 호스트는 건너뛰므로, 새 호스트의 URL을 추가한 뒤 다시 누르면 그 호스트만 열림."""
         urls = [u.strip() for u in self.urls_edit.toPlainText().splitlines() if u.strip()]
         if not urls:
             QMessageBox.warning(self, "입력 필요", "먼저 상단에 LMS 강의 URL(최소 1개)을 입력하세요.")
             return
-        first_url = urls[0]
-        start_url = get_base_url(first_url)
-        if not start_url:
-            QMessageBox.warning(self, "URL 오류", "유효한 URL이 아닙니다.")
+        hosts = [h for h in self.sessions.missing_hosts(urls) if h.startswith("http")]
+        if not hosts:
+            if not any(get_base_url(u) for u in urls):
+                QMessageBox.warning(self, "URL 오류", "유효한 URL이 아닙니다.")
+                return
+            self.append_log("[INFO] 모든 호스트의 브라우저가 이미 열려 있습니다.\n")
+            self.btn_fetch.setEnabled(True)
             return
 
-        self.append_log(f"[INFO] 크롬 브라우저 시작... (로그인 페이지: {start_url})\n")
-        options = Options()
-        driver = webdriver.Chrome(options=options)
-
-        driver.get(start_url)
+        for start_url in hosts:
+            self.append_log(f"[INFO] 크롬 브라우저 시작... (로그인 페이지: {start_url})\n")
+            try:
+                self.sessions.open(start_url)
+            except Exception as e:
+                self.append_log(f"[ERROR] 브라우저 시작 실패: {start_url} | {e}\n")
 
         QMessageBox.information(
             self, "로그인 안내",
-            "열린 브라우저에서 LMS 로그인을 완료하세요.\n"
+            f"열린 브라우저 {len(hosts)}개에서 각각 LMS 로그인을 완료하세요.\n"
             "로그인 완료 후 이 창으로 돌아와 ‘추출+다운로드 시작’을 눌러 주세요."
         )
 
-        self.driver = driver
-        self.btn_fetch.setEnabled(True)
-        self.append_log("[OK] 로그인 세션 준비 완료. 이제 '추출+다운로드 시작'을 누르세요.\n")
+        self.btn_fetch.setEnabled(len(self.sessions) > 0)
+        self.start_cookie_refresher()
+        self.append_log(
+            f"[OK] 로그인 세션 준비 완료 ({', '.join(self.sessions.hosts())}). "
+            "이제 '추출+다운로드 시작'을 누르세요.\n"
+        )
+
+    def start_cookie_refresher(self):
+        """로그인 쿠키를 백그라운드에서 주기적으로 읽어 두고 cookies.txt로도 내보냄 (cli.py --cookies로 재사용)"""
+        if self.cookie_refresher or not len(self.sessions):
+            return
+        export_path = app_data_dir() / "cookies.txt"
+        # append_log는 링 버퍼(deque)에 넣기만 하므로 다른 스레드에서 불러도 안전
+        self.cookie_refresher = CookieRefresher(
+            self.sessions, self.cookies, export_path=export_path, log=self.append_log
+        )
+        self.cookie_refresher.start()
+        self.append_log(f"[INFO] 로그인 쿠키를 주기적으로 갱신해 {export_path}에 저장합니다.\n")
+
+    def stop_cookie_refresher(self):
+        if self.cookie_refresher:
+            self.cookie_refresher.stop()
+            self.cookie_refresher.join(5)
+            self.cookie_refresher = None
 
     def close_browser(self):
-        if self.driver:
-            try:
-                self.driver.quit()
-            except Exception:
-                pass
-            self.driver = None
+        if len(self.sessions):
+            self.stop_cookie_refresher()
+            self.sessions.close()
             self.append_log("[INFO] 브라우저 종료.\n")
 
     def start_batch(self):
-        if not self.driver:
+        if not len(self.sessions):
             QMessageBox.warning(self, "로그인 필요", "먼저 '로그인 시작'으로 브라우저를 열고 로그인하세요.")
             return
 
@@ -371,294 +706,823 @@ class HlsDownloader(QWidget):
             QMessageBox.warning(self, "입력 필요", "LMS 강의 URL을 한 줄에 하나씩 입력하세요.")
             return
 
+        # 실행 중인 배치가 있으면 새 배치를 받지 않음
+        if (self.workers or self.extractors or self.retrying or self.transcoders or self.transcode_jobs
+                or self.course_sync):
+            QMessageBox.warning(self, "작업 중", "진행 중인 배치가 끝난 뒤 다시 시작하세요.")
+            return
+        if any(is_course_url(u) for u in urls):
+            self.start_course_sync(urls)
+            return
+        self.run_batch(urls)
+
+    def start_course_sync(self, urls: list):
+        """강좌 페이지 URL을 강의 목록으로 펼친 뒤 배치 시작.
+        이미 받은 강의는 run_batch의 다운로드 색인/작업 저장소에서 걸러져 새 강의와 바뀐 강의만 받는다"""
+        if self.open_manifest() is None:
+            return
+        session = make_http_session(self.ua_edit.text().strip())
+        for host in group_urls_by_host(u for u in urls if is_course_url(u)):
+            driver = self.sessions.drivers.get(host)
+            if driver and self.cookies.stale(host):
+                try:
+                    with self.sessions.lock_for(host):
+                        self.cookies.update_from_driver(host, driver)
+                except Exception as e:
+                    self.append_log(f"[WARN] 쿠키 읽기 실패: {host} | {e}\n")
+            self.cookies.apply_to(host, session)
+        self.course_sync = CourseSyncThread(session, urls, self.manifest, self)
+        self.course_sync.log.connect(self.append_log)
+        self.course_sync.finished.connect(self.on_course_sync_finished)
+        self.btn_fetch.setEnabled(False)
+        self.lbl_status.setText("강좌 동기화 중...")
+        self.course_sync.start()
+
+    def on_course_sync_finished(self):
+        sync, self.course_sync = self.course_sync, None
+        self.btn_fetch.setEnabled(True)
+        if not sync.urls:
+            self.lbl_status.setText("받을 강의가 없습니다.")
+            return
+        self.run_batch(sync.urls, sync.changed)
+
+    def run_batch(self, urls: list, changed=()):
+        """urls: 강의 URL 목록, changed: 강좌 동기화에서 바뀐 강의 (받은 적이 있어도 다시 받음)"""
         out_dir = Path(self.out_dir_edit.text().strip() or ".").resolve()
         out_dir.mkdir(parents=True, exist_ok=True)
 
         # 큐 초기화
         self.pending_jobs.clear()
-        self.current_job = None
+        self.pending_jobs.per_host_limit = self.spin_per_host.value()
+        self.apply_rate_limit()
+        self.total_jobs = 0
+        self.done_jobs = 0
+        self.metrics = BatchMetrics()
+        self.batch_out_dir = out_dir
+        self.existing_outputs = set()
+        self.progress.setValue(0)
+
+        if changed:
+            self.forget_lectures(changed, ".mp3" if self.chk_mp3.isChecked() else ".mp4")
+        # 이미 받은 강의는 추출·다운로드 전에 건너뜀 (색인의 파일이 그대로 있을 때만)
+        if self.chk_skip_done.isChecked() and self.open_index():
+            urls = self.skip_downloaded(urls, ".mp3" if self.chk_mp3.isChecked() else ".mp4")
+            if not urls:
+                self.lbl_status.setText("모두 이미 받은 강의입니다.")
+                return
+
+        # 저장된 상태로 이어가기: 끝난 URL은 건너뛰고, 추출까지 끝난 URL은 바로 다운로드
+        plan = {"extract": urls, "resume": [], "done": []}
+        if self.open_store():
+            try:
+                plan = self.store.enqueue(urls, out_dir)
+            except sqlite3.Error as e:
+                self.append_log(f"[WARN] 작업 저장소 오류, 상태 저장 없이 진행합니다: {e}\n")
+        if plan["done"]:
+            self.append_log(f"[INFO] 이미 완료된 {len(plan['done'])}개 URL은 건너뜁니다.\n")
+        if plan["resume"]:
+            self.append_log(f"[INFO] 지난번에 추출한 {len(plan['resume'])}개 작업을 이어서 받습니다.\n")
+        self.existing_outputs.update(job.out_file for job in plan["resume"])
+        # 건너뛸 것을 다 거른 뒤, 실제로 받을 작업이 들어가기 직전에 조절 시작
+        self.start_autotune()
+        for job in plan["resume"]:
+            self.add_job(job)
+        urls = plan["extract"]
+        if not urls:
+            self.run_next_job()
+            return
 
-        # 각 URL에서 m3u8/제목을 추출해 큐에 넣음 (순차)
-        existing_outputs = set()
+        # 추출은 백그라운드 스레드에서 진행하고, 추출되는 대로 다운로드 큐에 넣음
+        self.append_log(
+            f"[INFO] 총 {len(urls)}개 URL 추출 시작... "
+            f"(동시 다운로드 {self.spin_workers.value()}개{', 자동 조절' if self.tuner else ''})\n"
+        )
+        for host, host_urls in group_urls_by_host(urls).items():
+            if host not in self.sessions:
+                self.append_log(f"[WARN] 로그인된 브라우저가 없는 호스트: {host} → 캐시된 항목만 받습니다.\n")
+            self.start_extractor(host, host_urls)
+        self.lbl_status.setText("추출 중...")
+
+    def start_extractor(self, host: str, urls: list, retries=()):
+        """호스트 하나의 추출 스레드 시작. retries: 재시도할 작업의 (page_url, reextract) 목록"""
+        worker = ExtractWorker(
+            host, self.sessions.drivers.get(host), urls, self.cmb_extract.currentData(),
+            self.chk_fast.isChecked(), self.open_cache(), self.cmb_variant.currentData(),
+            self.chk_mp3.isChecked(), self.spin_tabs.value(), self.cookies, self.sessions.lock_for(host),
+            self.metrics, self
+        )
+        for page_url, reextract in retries:
+            worker.add(page_url, reextract)
+        worker.extracted.connect(self.on_page_extracted)
+        worker.refreshed.connect(self.on_page_refreshed)
+        worker.refresh_failed.connect(self.on_refresh_failed)
+        worker.failed.connect(self.on_extract_failed)
+        worker.log.connect(self.append_log)
+        worker.finished.connect(partial(self.on_extract_finished, worker, bool(urls)))
+        self.extractors[host] = worker
+        self.btn_fetch.setEnabled(False)
+        self.btn_close_browser.setEnabled(False)
+        worker.start()
+
+    def open_cache(self):
+        """추출 캐시를 열고 옵션의 유효시간을 반영 (실패하면 캐시 없이 진행)"""
+        ttl_sec = self.spin_cache_ttl.value() * 3600
+        if self.cache is None:
+            try:
+                self.cache = ExtractionCache(app_data_dir() / "cache.sqlite3", ttl_sec)
+            except (OSError, sqlite3.Error) as e:
+                self.append_log(f"[WARN] 추출 캐시를 열 수 없습니다: {e}\n")
+                return None
+        self.cache.ttl_sec = ttl_sec
+        return self.cache
+
+    def open_store(self):
+        """작업 저장소를 엶 (실패하면 상태 저장 없이 진행)"""
+        if self.store is None:
+            try:
+                self.store = JobStore(app_data_dir() / "jobs.sqlite3")
+            except (OSError, sqlite3.Error) as e:
+                self.append_log(f"[WARN] 작업 저장소를 열 수 없습니다: {e}\n")
+        return self.store
+
+    def open_index(self):
+        """다운로드 색인을 엶 (실패하면 건너뛰기 없이 진행)"""
+        if self.index is None:
+            try:
+                self.index = DownloadIndex(app_data_dir() / "downloads.sqlite3")
+            except (OSError, sqlite3.Error) as e:
+                self.append_log(f"[WARN] 다운로드 색인을 열 수 없습니다: {e}\n")
+        return self.index
+
+    def open_manifest(self):
+        """강좌 동기화 목록을 엶"""
+        if self.manifest is None:
+            try:
+                self.manifest = CourseManifest(app_data_dir() / "courses.sqlite3")
+            except (OSError, sqlite3.Error) as e:
+                self.append_log(f"[ERROR] 강좌 동기화 목록을 열 수 없습니다: {e}\n")
+        return self.manifest
+
+    def forget_lectures(self, urls: list, ext: str):
+        """바뀐 강의: 다운로드 색인/작업 저장소/추출 캐시에서 지워서 다시 추출해 받게 함"""
+        self.append_log(f"[INFO] 강좌에서 바뀐 강의 {len(urls)}개는 다시 받습니다.\n")
+        try:
+            if self.open_index():
+                for page_url in urls:
+                    self.index.forget(page_url, ext)
+            if self.open_store():
+                self.store.forget(urls)
+        except sqlite3.Error as e:
+            self.append_log(f"[WARN] 바뀐 강의 상태 초기화 실패: {e}\n")
+        cache = self.open_cache()
+        if cache:
+            for page_url in urls:
+                cache.invalidate(page_url)
+
+    def skip_downloaded(self, urls: list, ext: str) -> list:
+        """색인에 있는 강의를 빼고 남은 URL 반환"""
+        remaining = []
         for page_url in urls:
             try:
-                m3u8, page_title = self.extract_m3u8_and_title_from_page(page_url)
-                if not m3u8:
-                    self.append_log(f"[WARN] m3u8 추출 실패: {page_url}\n")
-                    continue
+                out_file = self.index.lookup(page_url, ext)
+            except sqlite3.Error as e:
+                self.append_log(f"[WARN] 다운로드 색인 조회 실패: {e}\n")
+                return urls
+            if out_file:
+                self.append_log(f"[SKIP] 이미 받은 강의: {page_url}\n     파일: {out_file}\n")
+            else:
+                remaining.append(page_url)
+        if len(remaining) < len(urls):
+            self.append_log(f"[INFO] 이미 받은 {len(urls) - len(remaining)}개 강의는 건너뜁니다.\n")
+        return remaining
+
+    def recorded_output(self, page_url: str, ext: str) -> str:
+        """색인에 기록된 이 강의의 예전 출력 (다시 받으면 ' (2)' 대신 그 파일을 덮어씀)"""
+        if self.index is None:
+            return ""
+        try:
+            return self.index.recorded_path(page_url, ext)
+        except sqlite3.Error:
+            return ""
 
-                # 파일명: 제목 → 안전화 → 중복 방지
-                vid = extract_id_from_url(page_url)
-                base = sanitize_filename(page_title) if page_title else f"lms_{vid}"
-
-                ext = ".mp3" if self.chk_mp3.isChecked() else ".mp4"
-                candidate = base
-                suffix = 1
-                while True:
-                    out_path = out_dir / f"{candidate}{ext}"
-                    out_str = str(out_path)
-                    if (not out_path.exists()) and (out_str not in existing_outputs):
-                        break
-                    suffix += 1
-                    candidate = f"{base} ({suffix})"
-
-                out_file = str(out_dir / f"{candidate}{ext}")
-                existing_outputs.add(out_file)
-
-                referer = page_url  # 각 페이지를 참조 리퍼러로 사용
-                self.pending_jobs.append((page_url, m3u8, out_file, referer))
-                row = self.tbl.rowCount()
-                self.tbl.insertRow(row)
-                self.tbl.setItem(row, 0, QTableWidgetItem(page_url))
-                self.tbl.setItem(row, 1, QTableWidgetItem(page_title or ""))
-                self.tbl.setItem(row, 2, QTableWidgetItem("대기"))
-                self.tbl.setItem(row, 3, QTableWidgetItem(out_file))
+    def index_output(self, worker: DownloadWorker, job: DownloadJob):
+        """완료된 출력을 검증해 색인에 기록"""
+        if lecture_key(job.page_url) is None or not self.open_index():
+            return
+        progress = worker.progress
+        try:
+            if not self.index.add(job.page_url, job.out_file, job.title, progress.duration, progress.out_time):
                 self.append_log(
-                    f"[OK] 추출: {page_url}\n"
-                    f"     제목: {page_title or '(없음)'}\n"
-                    f"     파일: {out_file}\n"
-                    f"     m3u8: {m3u8}\n"
+                    f"[WARN] 출력 검증 실패(길이 {format_hms(progress.out_time)} / "
+                    f"{format_hms(progress.duration)}), 다음 배치에서 다시 받습니다: {job.out_file}\n"
                 )
-            except Exception as e:
-                self.append_log(f"[ERROR] 추출 중 오류: {page_url} | {e}\n")
-
-        if not self.pending_jobs:
-            self.append_log("[DONE] 모든 다운로드 완료.\n")
-            self.btn_stop.setEnabled(False)
-
-            # 탐색기 열기
-            out_dir = Path(self.out_dir_edit.text().strip() or ".").resolve()
-            try:
-                open_folder(str(out_dir))
-                self.append_log(f"[INFO] 탐색기 열기: {out_dir}\n")
-            except Exception as e:
-                self.append_log(f"[WARN] 탐색기 열기 실패: {e}\n")
+        except (OSError, sqlite3.Error) as e:
+            self.append_log(f"[WARN] 다운로드 색인 기록 실패: {e}\n")
 
+    def record(self, method: str, *args):
+        """작업 상태를 저장소에 기록 (저장 실패는 다운로드를 막지 않음)"""
+        if self.store is None:
             return
-
-        self.append_log(f"[INFO] 총 {len(self.pending_jobs)}개 항목 다운로드 시작...\n")
-        self.run_next_job()
-
-    def _find_row_for_current(self) -> int:
-        if not self.current_job: 
-            return -1
-        page_url, _, out_file, _ = self.current_job
-        for r in range(self.tbl.rowCount()):
-            if self.tbl.item(r, 0).text() == page_url and self.tbl.item(r, 3).text() == out_file:
-                return r
-        return -1
-
-    def extract_m3u8_and_title_from_page(self, page_url: str):
-        self.driver.get(page_url)
-
-        # 팝업(이전 재생기록) 자동 처리
         try:
-            time.sleep(1)  # 페이지 진입 직후 alert 뜰 시간
-            alert = self.driver.switch_to.alert
-            text = alert.text
-            self.append_log(f"[INFO] 알림 발견: {text}\n → 자동 '확인' 클릭\n")
-            alert.accept()   # 확인(=이어보기)
-        except NoAlertPresentException:
-            pass
-        except UnexpectedAlertPresentException:
-            try:
-                alert = self.driver.switch_to.alert
-                text = alert.text
-                self.append_log(f"[INFO] 알림(예외) 발견: {text}\n → 자동 '확인' 클릭\n")
-                alert.accept()
-            except Exception:
-                pass
+            getattr(self.store, method)(*args)
+        except sqlite3.Error as e:
+            self.append_log(f"[WARN] 작업 상태 저장 실패: {e}\n")
 
-        # <video> 대기
+    def restore_unfinished(self):
+        if not self.open_store() or self.urls_edit.toPlainText().strip():
+            return
         try:
-            WebDriverWait(self.driver, 15).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "video"))
+            urls = self.store.unfinished()
+        except sqlite3.Error:
+            return
+        if urls:
+            self.urls_edit.setPlainText("\n".join(urls))
+            self.append_log(
+                f"[INFO] 지난번에 끝나지 않은 작업 {len(urls)}개를 불러왔습니다. "
+                "로그인 후 '추출+다운로드 시작'을 누르면 이어서 받습니다.\n"
             )
-        except Exception:
-            pass
 
-        # 제목 추출
-        title = self.extract_title_from_page()
+    def on_page_extracted(self, page_url: str, m3u8: str, page_title: str, cookie_header: str,
+                          media_url: str, audio_url: str):
+        # 파일명: 제목 → 안전화 → 중복 방지
+        ext = ".mp3" if self.chk_mp3.isChecked() else ".mp4"
+        out_file = unique_output_path(self.batch_out_dir, page_url, page_title, ext, self.existing_outputs,
+                                      self.recorded_output(page_url, ext))
+
+        referer = page_url  # 각 페이지를 참조 리퍼러로 사용
+        job = DownloadJob(page_url, m3u8, out_file, referer, page_title or "", -1, cookie_header,
+                          media_url, audio_url)
+        self.record("mark_extracted", job)
+        self.append_log(
+            f"[OK] 추출: {page_url}\n"
+            f"     제목: {page_title or '(없음)'}\n"
+            f"     파일: {out_file}\n"
+            f"     m3u8: {m3u8}\n"
+        )
+        self.add_job(job)
 
-        # <video><source> 직접 추출
-        try:
-            elem = self.driver.find_element(By.CSS_SELECTOR, "video source")
-            src = elem.get_attribute("src") or ""
-            if ".m3u8" in src:
-                return src, title
-        except Exception:
-            pass
-
-        # 정규식 백업
-        html = self.driver.page_source or ""
-        m = re.search(r'https?://[^\s"\']+?\.m3u8[^\s"\']*', html)
-        src = m.group(0) if m else ""
-        return src, title
-    
-    def extract_title_from_page(self) -> str:
-        """현재 페이지에서 <h1 class='vod-title'> 텍스트 추출 (없으면 빈 문자열)"""
-        try:
-            el = self.driver.find_element(By.CSS_SELECTOR, "h1.vod-title")
-            return (el.text or "").strip()
-        except NoSuchElementException:
-            return ""
+    def add_job(self, job: DownloadJob):
+        """대기열 테이블에 행을 추가하고 다운로드 큐에 넣음"""
+        job.row = self.queue_model.add_row(
+            job.page_url, [job.page_url, job.title, "대기", "", "", "", job.out_file]
+        )
+        self.pending_jobs.put(job)
+        self.total_jobs += 1
+        self.run_next_job()
 
-    def run_next_job(self):
+    def on_extract_failed(self, page_url: str):
+        self.record("mark_finished", page_url, False, "extract")
+        self.metrics.count("extract_failed")
 
+    def on_extract_finished(self, worker: ExtractWorker, batch: bool):
+        if self.extractors.get(worker.host) is not worker:
+            return  # 재시도용으로 새로 띄운 추출 스레드가 이미 이어받음
+        del self.extractors[worker.host]
+        if self.extractors:
+            return
+        self.btn_fetch.setEnabled(len(self.sessions) > 0)
+        self.btn_close_browser.setEnabled(True)
+        if batch:
+            self.append_log(f"[INFO] 추출 종료: {self.total_jobs}개 항목 대기열 등록\n")
+        self.run_next_job()
 
-        if self.proc and self.proc.state() != QProcess.NotRunning:
-            return  # 현재 작업이 끝나길 기다림
+    def _set_row_status(self, job: DownloadJob, text: str):
+        self._set_row_text(job, COL_STATUS, text)
 
-        if not self.pending_jobs:
+    def _set_row_text(self, job: DownloadJob, col: int, text: str):
+        self.queue_model.set_text(job.row, col, text)
+
+    def _show_progress(self, job: DownloadJob, progress: FfmpegProgress):
+        """ffmpeg -progress 값을 행의 진행률/속도/남은 시간 칸에 표시"""
+        percent = f"{progress.percent:.0f}%" if progress.duration else format_hms(progress.out_time)
+        self._set_row_text(job, COL_PROGRESS, f"{percent} ({format_bytes(progress.total_size)})")
+        self._set_row_text(job, COL_SPEED, f"{progress.speed:.1f}x" if progress.speed else "")
+        self._set_row_text(job, COL_ETA, format_hms(progress.eta))
+
+    def run_next_job(self):
+        """빈 워커 슬롯이 있는 만큼 대기열에서 작업을 꺼내 ffmpeg를 실행"""
+        if not self.pending_jobs and not self.workers:
+            if self.transcode_jobs or self.transcoders:
+                self.lbl_status.setText(
+                    f"인코딩 중... (진행 {len(self.transcoders)}개, 남은 {len(self.transcode_jobs)}개)"
+                )
+                return
+            if self.retrying:
+                self.lbl_status.setText(f"재시도 대기 중... ({len(self.retrying)}개)")
+                return
+            if self.extractors:
+                self.lbl_status.setText(f"추출 중... (완료 {self.done_jobs}개)")
+                return
             self.append_log("[DONE] 모든 다운로드 완료.\n")
+            self.stop_autotune()
+            self.report_metrics()
+            self.lbl_status.setText("모든 작업 완료")
             self.btn_stop.setEnabled(False)
             # 모든 작업 종료 시 저장 폴더 자동 열기
             self.open_output_dir()
             return
 
-        self.current_job = self.pending_jobs.pop(0)
-        page_url, m3u8, out_file, referer = self.current_job
-
-                # 진행률/상태
-        total = len(self.pending_jobs) + 1  # 현재 포함
-        done  = 0
-        self.progress.setMaximum(total)
-        self.progress.setValue(self.progress.maximum() - len(self.pending_jobs) - 1)  # 이미 끝난 개수
-        self.lbl_status.setText("다운로드 중...")
-
-        # 테이블 상태 표시
-        r = self._find_row_for_current()
-        if r >= 0:
-            self.tbl.item(r, 2).setText("진행 중")
-            
-        if not self.is_ffmpeg_available():
+        if self.pending_jobs and not is_ffmpeg_available():
             QMessageBox.critical(self, "ffmpeg 미설치", "ffmpeg 실행 파일을 찾을 수 없습니다.")
             self.pending_jobs.clear()
             return
 
-        cmd = [
-            "ffmpeg",
-            "-nostdin",
-            "-hide_banner",
-            "-loglevel", "info",
-            "-stats",
-            # 네트워크 안정 옵션
-            "-reconnect", "1",
-            "-reconnect_streamed", "1",
-            "-reconnect_on_network_error", "1",
-            "-reconnect_at_eof", "1",
-            "-rw_timeout", "20000000",
-            "-timeout", "20000000",
-        ]
-
-        # 헤더 (Referer + UA + Cookie[선택])
-        headers = []
-        ua = self.ua_edit.text().strip()
-        if referer:
-            headers.append(f"Referer: {referer}")
-        if ua:
-            headers.append(f"User-Agent: {ua}")
-
-        # m3u8 접근에 세션 쿠키가 필요한 경우 대비
-        if self.driver:
-            cookie_header = build_cookie_header_from_driver(self.driver, m3u8)
-            if cookie_header:
-                headers.append(f"Cookie: {cookie_header}")
-
-        if headers:
-            # FFmpeg는 각 헤더 라인을 CRLF로 구분하고, 마지막에도 CRLF가 하나 더 필요합니다.
-            header_str = "\r\n".join(headers) + "\r\n"
-            cmd += ["-headers", header_str]
-
-        cmd += ["-i", m3u8]
-
-        if self.chk_mp3.isChecked():
-            # 오디오만 mp3로 변환
-            cmd += [
-                "-map", "0:a:0",
-                "-vn",
-                "-c:a", "libmp3lame",
-                "-b:a", "192k",
-            ]
-        else:
-            if self.chk_copy.isChecked():
-                cmd += ["-map", "0:v:0?", "-map", "0:a:0?", "-c", "copy"]
-            else:
-                cmd += ["-map", "0:v:0?", "-map", "0:a:0?", "-c:v", "libx264", "-c:a", "aac", "-b:a", "192k"]
-
-        cmd += [out_file]
-        
-
-        self.proc = QProcess(self)
-        self.proc.setProcessChannelMode(QProcess.MergedChannels)
-        self.proc.readyReadStandardOutput.connect(self.on_read_output)
-        self.proc.readyReadStandardError.connect(self.on_read_output)
-        self.proc.finished.connect(self.on_finished_one)
-
-        mode = "MP3 변환" if self.chk_mp3.isChecked() else ("copy" if self.chk_copy.isChecked() else "re-encode")
-        self.append_log(f"[RUN] {page_url}\n      → {out_file}\n      모드: {mode}\n      ffmpeg: {' '.join(cmd)}\n")
+        max_workers = self.tuner.limit if self.tuner else self.spin_workers.value()
+        self.pending_jobs.per_host_limit = self.spin_per_host.value()
+        while self.pending_jobs and len(self.workers) < max_workers:
+            job = self.pending_jobs.get()
+            if job is None:
+                break   # 남은 작업의 호스트가 모두 한도에 걸림 → 실행 중인 작업이 끝나면 다시 시도
+            used = {w.slot for w in self.workers}
+            slot = next(i for i in range(max_workers) if i not in used)
+            self.start_job(DownloadWorker(slot), job)
+
+        self.update_status()
+
+    def report_metrics(self):
+        """배치 단계별 시간 요약을 로그에 남기고 JSON/Prometheus 텍스트로 내보냄 (덮어씀)"""
+        summary = self.metrics.format_summary()
+        if not summary:
+            return
+        self.append_log(summary)
+        json_path = app_data_dir() / "metrics.json"
+        prom_path = app_data_dir() / "metrics.prom"
+        try:
+            self.metrics.export_json(json_path)
+            self.metrics.export_prometheus(prom_path)
+            self.append_log(f"[INFO] 단계별 시간 저장: {json_path}, {prom_path}\n")
+        except OSError as e:
+            self.append_log(f"[WARN] 단계별 시간 저장 실패: {e}\n")
+
+    def update_status(self):
+        self.progress.setMaximum(max(self.total_jobs, 1))
+        self.progress.setValue(self.done_jobs)
+        if self.tuner:
+            self.progress.setFormat(f"%v/%m · 동시 {self.tuner.limit}")
+        if self.workers:
+            extracting = " / 추출 계속 중" if self.extractors else ""
+            encoding = f" / 인코딩 {len(self.transcoders) + len(self.transcode_jobs)}개" if self.transcoders else ""
+            tuned = ""
+            if self.tuner and self.tuner.history:
+                tuned = f" / 자동 {self.tuner.limit}개, {format_bytes(self.tuner.history[-1].bps)}/s"
+            self.lbl_status.setText(
+                f"다운로드 중... (진행 {len(self.workers)}개, 남은 {len(self.pending_jobs)}개{extracting}{encoding}{tuned})"
+            )
 
+    # ---- 동시 다운로드 수 자동 조절 ----
+    def start_autotune(self):
+        """'자동 조절'이면 이번 배치의 동시 다운로드 수를 ConcurrencyTuner에 맡김 (설정한 수에서 시작)"""
+        self.tune_timer.stop()
+        self.tuner = None
+        self.progress.setFormat("%p%")
+        self.lbl_status.setToolTip("")
+        if not self.chk_autotune.isChecked():
+            return
+        self.tuner = ConcurrencyTuner(self.spin_workers.value(), maximum=self.spin_workers.maximum())
+        self.tuner.sample(self.bandwidth.total + self.ffmpeg_bytes)    # 기준점
+        self.tune_timer.start()
+
+    def stop_autotune(self):
+        self.tune_timer.stop()
+        if self.tuner and self.tuner.history:
+            changes = sum(1 for s in self.tuner.history if s.limit != s.before)
+            self.append_log(f"[TUNE] 자동 조절 {changes}회, 마지막 동시 다운로드 {self.tuner.limit}개\n")
+
+    def tune_concurrency(self):
+        """TUNE_INTERVAL마다 지난 구간의 처리량/실패율로 동시 다운로드 수를 다시 정함 (AIMD)"""
+        if not self.tuner:
+            return
+        busy = bool(self.pending_jobs) and len(self.workers) >= self.tuner.limit
+        sample = self.tuner.sample(self.bandwidth.total + self.ffmpeg_bytes, busy)
+        if sample is None:
+            return
+        if sample.limit != sample.before:
+            self.append_log(f"[TUNE] {sample.describe()}\n")
+        self.lbl_status.setToolTip("\n".join(
+            f"{time.strftime('%H:%M:%S', time.localtime(s.at))} {s.describe()}" for s in self.tuner.recent()
+        ))
+        if sample.limit > sample.before:
+            self.run_next_job()     # 늘어난 자리만큼 바로 시작 (update_status 포함)
+        else:
+            self.update_status()
+
+    def apply_rate_limit(self, *_):
+        """대역폭 한도 변경은 실행 중인 세그먼트 다운로드에도 바로 반영.
+        한도는 세그먼트 엔진으로만 걸 수 있으므로 한도를 걸면 엔진도 세그먼트로 바꿈"""
+        mbps = self.spin_rate.value()
+        self.bandwidth.set_rate(mbps * 1024 * 1024)
+        if mbps and self.cmb_engine.currentData() != "segment":
+            self.cmb_engine.setCurrentIndex(self.cmb_engine.findData("segment"))
+            self.append_log("[INFO] 대역폭 제한은 세그먼트 엔진으로만 걸 수 있어 엔진을 세그먼트로 바꿨습니다.\n")
+
+    def on_engine_changed(self, *_):
+        """ffmpeg 직접 엔진은 속도를 제한할 수 없으므로 대역폭 한도를 풂 (한도가 조용히 무시되지 않게)"""
+        if self.cmb_engine.currentData() != "segment" and self.spin_rate.value():
+            self.spin_rate.setValue(0)
+            self.append_log("[INFO] ffmpeg 직접 엔진은 대역폭 제한을 지원하지 않아 제한을 해제했습니다.\n")
+
+    def ffmpeg_options(self) -> FfmpegOptions:
+        return FfmpegOptions(self.ua_edit.text().strip(), self.chk_mp3.isChecked(), self.chk_copy.isChecked())
+
+    def stage_options(self, worker: DownloadWorker) -> FfmpegOptions:
+        """워커가 돌릴 ffmpeg의 옵션 (2단계 파이프라인의 받기 단계면 -c copy)"""
+        opts = self.ffmpeg_options()
+        return opts.download_options() if worker.source_file else opts
+
+    def direct_command(self, worker: DownloadWorker) -> list:
+        """ffmpeg가 m3u8을 직접 받는 명령. 2단계면 원본을 임시 파일로 받았다가 다 받으면 원본 이름으로 바꿈"""
+        job = worker.job
+        if not worker.source_file:
+            return build_ffmpeg_command(job, self.ffmpeg_options())
+        worker.partial_file = partial_output_path(worker.source_file)
+        return build_ffmpeg_command(job, self.stage_options(worker), out_file=worker.partial_file)
+
+    def start_job(self, worker: DownloadWorker, job: DownloadJob):
+        # 추출 때 받은 쿠키가 배치 도중 만료됐을 수 있으므로 캐시의 최신 쿠키로 교체 (WebDriver 호출 없음)
+        cookie_header = self.cookies.header_for(job_host(job), job.stream_url)
+        if cookie_header:
+            job.cookie_header = cookie_header
+        worker.job = job
+        self.workers.append(worker)
+        if job.queued_at:
+            self.metrics.add(job.page_url, "queue_wait", time.monotonic() - job.queued_at)
+        self.record("mark_started", job)
         self.btn_stop.setEnabled(True)
-        self.proc.start(cmd[0], cmd[1:])
 
-        if not self.proc.waitForStarted(3000):
-            self.append_log("[ERROR] ffmpeg 시작 실패\n")
-            self.btn_stop.setEnabled(False)
-            self.run_next_job()  # 다음 작업 시도
+        if self.ffmpeg_options().needs_transcode:
+            # 받기(-c copy, 네트워크)와 인코딩(CPU 풀)을 나눔
+            worker.source_file = source_output_path(job.out_file)
+            if os.path.exists(worker.source_file):
+                self.append_log(f"[INFO] 받아 둔 원본으로 바로 인코딩합니다: {worker.source_file}\n")
+                self._finish_worker(worker, ok=True)
+                return
 
-    def on_read_output(self):
-        if not self.proc:
+        if self.cmb_engine.currentData() == "segment":
+            self.start_fetch(worker)
+        else:
+            self.start_ffmpeg(worker, self.direct_command(worker))
+
+    def start_fetch(self, worker: DownloadWorker):
+        """세그먼트 엔진: 먼저 세그먼트를 '<출력>.parts'에 받고, 다 받으면 ffmpeg로 조립
+        (인코딩 전 원본(.source.ts)이면 세그먼트 스레드에서 바로 이어 붙임)"""
+        job = worker.job
+        self._set_row_status(job, "세그먼트 받는 중")
+        self.append_log(f"[RUN #{worker.slot + 1}] {job.page_url}\n      → {job.out_file}\n      엔진: 세그먼트 이어받기\n")
+        worker.fetcher = SegmentFetchThread(
+            job, self.ua_edit.text().strip(), self.spin_segments.value(), self.bandwidth,
+            self.metrics.timer(job.page_url), worker.source_file, self.keys, self
+        )
+        worker.fetcher.progress.connect(partial(self.on_fetch_progress, worker))
+        worker.fetcher.log.connect(self.append_log)
+        worker.fetcher.finished.connect(partial(self.on_fetch_finished, worker))
+        worker.fetcher.start()
+
+    def on_fetch_progress(self, worker: DownloadWorker, done: int, total: int):
+        if worker.job:
+            self._set_row_status(worker.job, f"세그먼트 {done}/{total}")
+            self._set_row_text(worker.job, COL_PROGRESS, f"{done * 100 // max(total, 1)}%")
+
+    def on_fetch_finished(self, worker: DownloadWorker):
+        fetcher, worker.fetcher = worker.fetcher.result, None
+        job = worker.job
+        if worker.stopped:
+            self._finish_worker(worker, ok=False)
+        elif fetcher.unsupported:
+            if self.bandwidth.rate > 0:
+                self.append_log(f"[WARN] 대역폭 한도 없이 ffmpeg로 받습니다: {job.page_url}\n")
+            self.start_ffmpeg(worker, self.direct_command(worker))
+        elif not fetcher.ok:
+            worker.http_error = fetcher.http_error
+            worker.failure = fetcher.failure
+            self._finish_worker(worker, ok=False)
+        elif fetcher.assembled:
+            self._finish_worker(worker, ok=True)    # 세그먼트를 이미 원본 파일로 이어 붙임
+        else:
+            worker.partial_file = partial_output_path(worker.source_file or job.out_file)
+            local = [str(p) for p in fetcher.local_playlists]
+            cmd = build_ffmpeg_command(
+                job, self.stage_options(worker), local[0], worker.partial_file,
+                local_playlist=True, encrypted=fetcher.encrypted,
+                audio_input=local[1] if len(local) > 1 else "",
+            )
+            self.start_ffmpeg(worker, cmd, "조립 중", fetcher.duration, "assemble")
+
+    def start_ffmpeg(self, worker: DownloadWorker, cmd: list, status: str = "진행 중", duration: float = 0.0,
+                     stage: str = "download"):
+        job = worker.job
+        self._set_row_status(job, status)
+        worker.ffmpeg_stage = stage
+
+        worker.progress = FfmpegProgress(duration)
+        worker.proc = QProcess(self)
+        worker.proc.setProcessChannelMode(QProcess.SeparateChannels)
+        worker.proc.readyReadStandardOutput.connect(partial(self.on_progress_output, worker))
+        worker.proc.readyReadStandardError.connect(partial(self.on_read_output, worker))
+        worker.proc.finished.connect(partial(self.on_finished_one, worker))
+
+        mode = self.stage_options(worker).mode_label
+        if worker.source_file:
+            mode += " (인코딩은 받은 뒤 따로)"
+        tag = "ENC" if worker.transcoding else "RUN"
+        self.append_log(
+            f"[{tag} #{worker.slot + 1}] {job.page_url}\n      → {job.out_file}\n"
+            f"      모드: {mode}\n      ffmpeg: {' '.join(cmd)}\n"
+        )
+
+        start_timer = self.metrics.timer(job.page_url)
+        with start_timer.stage("ffmpeg_start"):
+            worker.proc.start(cmd[0], cmd[1:])
+            started = worker.proc.waitForStarted(3000)
+        if not started:
+            self.append_log(f"[ERROR] ffmpeg 시작 실패: {job.page_url}\n")
+            self._finish(worker, ok=False)
+
+    def on_progress_output(self, worker: DownloadWorker):
+        """stdout: -progress key=value 블록 → 행 진행률 갱신"""
+        if not worker.proc:
+            return
+        out = bytes(worker.proc.readAllStandardOutput()).decode(errors="ignore")
+        received = worker.progress.total_size
+        if out and worker.progress.feed_progress(out):
+            if worker.ffmpeg_stage == "download":
+                self.ffmpeg_bytes += max(0, worker.progress.total_size - received)
+            self._show_progress(worker.job, worker.progress)
+
+    def on_read_output(self, worker: DownloadWorker):
+        """stderr: ffmpeg 로그 → 로그 버퍼"""
+        if not worker.proc:
             return
-        out = bytes(self.proc.readAllStandardOutput()).decode(errors="ignore")
+        out = bytes(worker.proc.readAllStandardError()).decode(errors="ignore")
         if out:
-            self.append_log(out)
-        err = bytes(self.proc.readAllStandardError()).decode(errors="ignore")
-        if err:
-            self.append_log(err)
-
-    def on_finished_one(self, code, status):
-        page_url, m3u8, out_file, _ = self.current_job or ("", "", "", "")
-        ok = (code == 0)
-        self.append_log(f"\n[INFO] 완료(code={code}): {out_file}\n\n")
-
-        r = self._find_row_for_current()
-        if r >= 0:
-            self.tbl.item(r, 2).setText("완료" if ok else "실패")
-
-        # 진행률 증가
-        self.progress.setValue(self.progress.value() + 1)
-        if not self.pending_jobs:
-            self.lbl_status.setText("모든 작업 완료")
+            worker.http_error = parse_http_error(out) or worker.http_error
+            worker.failure = classify_failure(out, worker.http_error) or worker.failure
+            worker.progress.feed_log(out)
+            self.append_log(f"[#{worker.slot + 1}] {out}")
+
+    def on_finished_one(self, worker: DownloadWorker, code, status):
+        if worker not in self.workers and worker not in self.transcoders:
+            return  # 시작 실패로 이미 정리된 워커
+        ok = (code == 0) and not worker.stopped
+        record_ffmpeg_timings(self.metrics, worker.job.page_url, worker.progress, worker.ffmpeg_stage)
+        self.append_log(f"\n[INFO] 완료(code={code}): {worker.job.out_file}\n\n")
+        self._finish(worker, ok)
+
+    def _finish(self, worker: DownloadWorker, ok: bool):
+        if worker.transcoding:
+            self._finish_transcode(worker, ok)
         else:
+            self._finish_worker(worker, ok)
+
+    def _finish_worker(self, worker: DownloadWorker, ok: bool):
+        job = worker.job
+        if worker.partial_file:
+            ok = self._commit_partial(worker, ok)
+        failure = worker.failure or classify_failure(http_error=worker.http_error)
+        if self.tuner and not worker.stopped and failure not in ("disk", "playlist"):
+            self.tuner.record(ok)   # 디스크 부족/잘못된 플레이리스트는 서버 상태와 무관하므로 빼고 셈
+        self.pending_jobs.task_done(job)
+        self.workers.remove(worker)
+        worker.proc = None
+        worker.job = None
+        if ok and worker.source_file:
+            # 받기 끝: 네트워크 슬롯은 바로 다음 다운로드에 쓰고 인코딩은 CPU 풀에 맡김
+            self.enqueue_transcode(job)
+            self.run_next_job()
+            return
+        if not ok and not worker.stopped and self.schedule_retry(job, failure):
+            self.run_next_job()
+            return
+        if worker.stopped:
+            self.record("mark_retry", job)     # 다음에 시작하면 다시 받음
+        else:
+            self.record("mark_finished", job.page_url, ok, failure, job.attempts)
+            self.metrics.count("jobs_done" if ok else "jobs_failed")
+        if not ok and failure in ("auth", "expired") and self.cache:
+            # 만료된 m3u8일 수 있으므로 다음 실행 때 다시 추출되도록 캐시에서 제거
+            self.cache.invalidate(job.page_url)
+            self.append_log(f"[INFO] HTTP {worker.http_error}: 추출 캐시 삭제 → {job.page_url}\n")
+        if ok:
+            self.index_output(worker, job)
+            status = "완료"
+            self._set_row_text(job, COL_PROGRESS, "100%")
+            self._set_row_text(job, COL_ETA, "")
+        else:
+            resumable = segment_parts_dir(job.out_file).exists()
+            status = "중지" if worker.stopped else f"실패: {FAILURE_LABELS[failure]}"
+            if resumable:
+                status += "(이어받기 가능)"
+        self._set_row_status(job, status)
+        self._job_done()
+
+    def _job_done(self):
+        # 진행률 증가
+        self.done_jobs += 1
+        if not self.workers and not self.transcoders:
+            self.btn_stop.setEnabled(bool(self.retrying or self.transcode_jobs))
+        if self.pending_jobs or self.workers:
             self.lbl_status.setText(f"다음 작업 준비 중... (남은 {len(self.pending_jobs)}개)")
+        self.run_next_job()
 
-        self.btn_stop.setEnabled(False)
-        self.current_job = None
+    # ---- 인코딩 풀 (2단계) ----
+    def enqueue_transcode(self, job: DownloadJob):
+        self.transcode_jobs.append(job)
+        self._set_row_status(job, "인코딩 대기")
+        self._set_row_text(job, COL_SPEED, "")
+        self._set_row_text(job, COL_ETA, "")
+        self.run_next_transcode()
+
+    def run_next_transcode(self):
+        """빈 인코딩 슬롯이 있는 만큼 받아 둔 원본을 인코딩 (다운로드 워커 수와 따로 셈)"""
+        max_workers = self.spin_transcode.value()
+        while self.transcode_jobs and len(self.transcoders) < max_workers:
+            job = self.transcode_jobs.popleft()
+            used = {w.slot for w in self.transcoders}
+            worker = DownloadWorker(next(i for i in range(max_workers) if i not in used))
+            worker.job = job
+            worker.transcoding = True
+            worker.partial_file = partial_output_path(job.out_file)
+            self.transcoders.append(worker)
+            cmd = build_transcode_command(
+                source_output_path(job.out_file), worker.partial_file, self.ffmpeg_options(),
+                transcode_threads(max_workers),
+            )
+            self.start_ffmpeg(worker, cmd, "인코딩 중", stage="transcode")
+        self.update_status()
+
+    def _finish_transcode(self, worker: DownloadWorker, ok: bool):
+        job = worker.job
+        ok = self._commit_partial(worker, ok)
+        failure = worker.failure or classify_failure(http_error=worker.http_error)
+        self.transcoders.remove(worker)
+        worker.proc = None
+        worker.job = None
+        if ok:
+            try:
+                os.remove(source_output_path(job.out_file))
+            except OSError:
+                pass
+            self.record("mark_finished", job.page_url, True, "", job.attempts)
+            self.metrics.count("jobs_done")
+            self.index_output(worker, job)
+            status = "완료"
+            self._set_row_text(job, COL_PROGRESS, "100%")
+            self._set_row_text(job, COL_ETA, "")
+        elif worker.stopped:
+            self.record("mark_retry", job)     # 원본은 남아 있으므로 다음에는 인코딩부터
+            status = "중지(원본 보관)"
+        else:
+            self.record("mark_finished", job.page_url, False, failure, job.attempts)
+            self.metrics.count("jobs_failed")
+            status = f"인코딩 실패: {FAILURE_LABELS[failure]}(원본 보관)"
+        self._set_row_status(job, status)
+        self._job_done()
+        self.run_next_transcode()
+
+    # ---- 재시도 ----
+    def schedule_retry(self, job: DownloadJob, failure: str) -> bool:
+        """실패 분류에 맞는 재시도를 예약. 재시도하지 않으면 False"""
+        policy = RetryPolicy(self.spin_retries.value())
+        action = policy.next_action(job, failure)
+        if not action:
+            return False
+        job.attempts += 1
+        job.last_failure = failure
+        self.metrics.count("retries")
+        self.retrying[job.page_url] = job
+        self.record("mark_retry", job)
+        label = f"재시도 {job.attempts}/{policy.max_retries}"
+        if action == "backoff":
+            delay = policy.delay(job.attempts)
+            self._set_row_status(job, f"{label} 대기 ({delay:.0f}초)")
+            self.append_log(
+                f"[RETRY] {FAILURE_LABELS[failure]} → {delay:.0f}초 후 다시 시도 ({label}): {job.page_url}\n"
+            )
+            QTimer.singleShot(int(delay * 1000), partial(self.requeue_retry, job))
+            return True
+        reextract = action == "reextract"
+        self._set_row_status(job, f"{label}: " + ("재추출 중" if reextract else "쿠키 갱신 중"))
+        self.append_log(
+            f"[RETRY] {FAILURE_LABELS[failure]} → " + ("페이지 재추출" if reextract else "쿠키 갱신")
+            + f" 후 다시 시도 ({label}): {job.page_url}\n"
+        )
+        host = get_base_url(job.page_url)
+        extractor = self.extractors.get(host)
+        if not (extractor and extractor.add(job.page_url, reextract)):
+            self.start_extractor(host, [], [(job.page_url, reextract)])
+        return True
+
+    def requeue_retry(self, job: DownloadJob):
+        if self.retrying.pop(job.page_url, None) is not job:
+            return  # 대기 중에 중지됨
+        self._set_row_status(job, "대기")
+        self.pending_jobs.put(job)
         self.run_next_job()
 
+    def on_page_refreshed(self, *extracted):
+        """재시도 추출 결과: 새 행을 만들지 않고 스트림 URL/쿠키만 바꿔 다시 대기열에"""
+        job = self.retrying.get(extracted[0])
+        if job is None:
+            return  # 재추출 중에 중지됨
+        job.update_stream(extracted)
+        self.record("mark_retry", job)
+        self.requeue_retry(job)
+
+    def on_refresh_failed(self, page_url: str):
+        job = self.retrying.pop(page_url, None)
+        if job is None:
+            return
+        self.append_log(f"[ERROR] 재추출 실패, 작업 포기: {page_url}\n")
+        self.record("mark_finished", page_url, False, job.last_failure, job.attempts)
+        self._set_row_status(job, f"실패: {FAILURE_LABELS[job.last_failure]}")
+        self._job_done()
+
+    def _commit_partial(self, worker: DownloadWorker, ok: bool) -> bool:
+        job = worker.job
+        partial_file, worker.partial_file = worker.partial_file, ""
+        try:
+            return commit_partial_output(
+                partial_file, worker.source_file or job.out_file, ok, segment_parts_dir(job.out_file)
+            )
+        except OSError as e:
+            self.append_log(f"[ERROR] 출력 파일 이동 실패: {job.out_file} | {e}\n")
+            return False
 
     def stop_current(self):
-        if self.proc and self.proc.state() != QProcess.NotRunning:
-            self.append_log("\n[INFO] 현재 작업 중지...\n")
-            self.proc.kill()
-            self.proc.waitForFinished(2000)
-            self.btn_stop.setEnabled(False)
+        """선택한 행의 작업만 중지. 선택이 없으면 실행 중인 작업을 모두 중지"""
+        selected = {idx.row() for idx in self.tbl.selectionModel().selectedRows()}
+        targets = [w for w in self.workers + self.transcoders
+                   if w.is_running() and (not selected or w.job.row in selected)]
+        waiting = [j for j in self.retrying.values() if not selected or j.row in selected]
+        for job in waiting:
+            # 재시도 대기 중인 작업은 예약만 취소 (백오프 타이머/재추출 결과는 무시됨)
+            del self.retrying[job.page_url]
+            self._set_row_status(job, "중지")
+            self.done_jobs += 1
+        encode_waiting = [j for j in self.transcode_jobs if not selected or j.row in selected]
+        for job in encode_waiting:
+            # 인코딩 대기 중인 작업은 원본을 남겨 두고 빼기만 함 (다음에 시작하면 인코딩부터)
+            self.transcode_jobs.remove(job)
+            self.record("mark_retry", job)
+            self._set_row_status(job, "중지(원본 보관)")
+            self.done_jobs += 1
+        waiting += encode_waiting
+        if waiting and not targets:
+            self.run_next_job()
+        if not targets:
+            return
+        for w in targets:
+            self.append_log(f"\n[INFO] 작업 중지: {w.job.page_url}\n")
+            w.stopped = True
+            if w.fetcher:
+                # 받고 있던 세그먼트까지만 받고 멈춤 (finished 시그널에서 정리)
+                w.fetcher.requestInterruption()
+            elif w.proc:
+                w.proc.kill()
+        for w in targets:
+            if w.proc:
+                w.proc.waitForFinished(2000)
+
+    def closeEvent(self, event):
+        # 추출 스레드가 driver를 쓰는 중이면 현재 페이지까지만 처리하고 멈추게 함
+        for extractor in list(self.extractors.values()):
+            extractor.requestInterruption()
+        for extractor in list(self.extractors.values()):
+            extractor.wait(20000)
+        if self.course_sync:
+            self.course_sync.wait(20000)
+        for w in self.workers:
+            if w.fetcher:
+                w.fetcher.requestInterruption()
+                w.fetcher.wait(30000)
+        self.stop_cookie_refresher()
+        if self.cache:
+            self.cache.close()
+            self.cache = None
+        if self.store:
+            self.store.close()
+            self.store = None
+        if self.index:
+            self.index.close()
+            self.index = None
+        if self.manifest:
+            self.manifest.close()
+            self.manifest = None
+        super().closeEvent(event)
 
     def choose_out_dir(self):
         d = QFileDialog.getExistingDirectory(self, "저장 폴더 선택", self.out_dir_edit.text())
         if d:
             self.out_dir_edit.setText(d)
 
-    @staticmethod
-    def is_ffmpeg_available() -> bool:
-        from shutil import which
-        return which("ffmpeg") is not None
-
 
 def main():
+    startup = StartupProfile(STARTED_AT)
+    startup.mark("import PyQt5", QT_IMPORTED_AT)
+    startup.mark("import engine", ENGINE_IMPORTED_AT)
     app = QApplication(sys.argv)
     apply_modern_theme(app)   # ★ 추가
-    w = HlsDownloader()
+    startup.mark("QApplication")
+    w = HlsDownloader(startup)
     w.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,28 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench import BENCH_COOKIE, FakeLmsConfig, FakeLmsServer  # noqa: E402
+
+
+@pytest.fixture
+def fake_lms():
+    """로그인 쿠키를 확인하는 로컬 가짜 LMS/HLS 서버 (bench.py와 같은 서버)"""
+    server = FakeLmsServer(("127.0.0.1", 0), FakeLmsConfig(pages=2, segments=4, segment_kb=4, latency_ms=0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cookie_file(tmp_path):
+    path = tmp_path / "cookies.txt"
+    name, value = BENCH_COOKIE
+    path.write_text(f"# Netscape HTTP Cookie File\n127.0.0.1\tFALSE\t/\tFALSE\t4102444800\t{name}\t{value}\n")
+    return path
@@ -0,0 +1,39 @@
+import threading
+import time
+
+from engine import TokenBucket
+
+
+def test_token_bucket_unlimited_does_not_wait():
+    bucket = TokenBucket()
+    started = time.monotonic()
+    for _ in range(1000):
+        bucket.consume(64 * 1024)
+    assert time.monotonic() - started < 0.5
+
+
+def test_token_bucket_limits_rate_across_threads():
+    rate = 200_000
+    bucket = TokenBucket(rate)
+
+    def worker():
+        for _ in range(5):
+            bucket.consume(10_000)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    # 200 KB를 200 KB/s로: 첫 버스트(최대 rate만큼)가 없으므로 약 1초
+    assert 0.8 <= elapsed <= 2.0
+
+
+def test_token_bucket_set_rate_applies_immediately():
+    bucket = TokenBucket(1000)
+    bucket.set_rate(0)
+    started = time.monotonic()
+    bucket.consume(10_000_000)
+    assert time.monotonic() - started < 0.1
@@ -0,0 +1,79 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+import cli
+from engine import (
+    BatchMetrics, CookieJarCache, DownloadJob, JobStore, SegmentFetchResult, SessionPool, job_host,
+    load_cookie_file, make_http_session, source_output_path,
+)
+
+
+def seed_extracted(store: JobStore, page_url: str, m3u8: str, out_dir) -> DownloadJob:
+    """지난 실행이 추출까지 하고 죽은 상태를 만듦"""
+    store.enqueue([page_url], out_dir)
+    job = DownloadJob(page_url, m3u8, str(out_dir / "강의.mp3"), page_url, "강의")
+    store.mark_extracted(job)
+    return job
+
+
+def test_resumed_job_without_extraction_gets_cookies_and_downloads(tmp_path, fake_lms, cookie_file):
+    page_url = f"{fake_lms.base_url}mod/vod/viewer.php?id=1000"
+    m3u8 = f"{fake_lms.base_url}hls/1000/index.m3u8"
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    seed_extracted(store, page_url, m3u8, out_dir)
+
+    plan = store.enqueue([page_url], out_dir)
+    assert plan["extract"] == [] and len(plan["resume"]) == 1
+    job = plan["resume"][0]
+    assert job.cookie_header == ""      # 쿠키는 저장하지 않음
+
+    args = cli.parse_args(["urls.txt", "--engine", "segment", "--mp3", "--cookies", str(cookie_file),
+                           "--retries", "0"])
+    session = make_http_session()
+    load_cookie_file(session, str(cookie_file))
+    cookies = CookieJarCache()
+    extractors = cli.make_extractors(args, session, SessionPool(), cookies, None, BatchMetrics(),
+                                     plan["extract"], plan["resume"], log=lambda *_: None)
+    assert job_host(job) in extractors
+
+    runner = cli.BatchRunner(args, cli.JsonLinesWriter(io.StringIO()), cookies=cookies, store=store)
+    runner.extractors = extractors
+    ok, failure = runner.download_with_retry(job)
+    store.close()
+    assert ok, failure
+    assert "MoodleSession=" in job.cookie_header
+    assert Path(source_output_path(job.out_file)).stat().st_size > 0
+
+
+def test_max_rate_selects_segment_engine():
+    assert cli.parse_args(["urls.txt"]).engine == "ffmpeg"
+    assert cli.parse_args(["urls.txt", "--max-rate", "2"]).engine == "segment"
+    assert cli.parse_args(["urls.txt", "--max-rate", "2", "--engine", "segment"]).engine == "segment"
+
+
+def test_max_rate_rejects_ffmpeg_engine(capsys):
+    with pytest.raises(SystemExit):
+        cli.parse_args(["urls.txt", "--max-rate", "2", "--engine", "ffmpeg"])
+    assert "--max-rate" in capsys.readouterr().err
+
+
+def test_capped_batch_warns_when_falling_back_to_uncapped_ffmpeg(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli, "fetch_job_segments", lambda *a, **kw: SegmentFetchResult(unsupported=True))
+    args = cli.parse_args(["urls.txt", "--max-rate", "2", "--retries", "0"])
+    stream = io.StringIO()
+    runner = cli.BatchRunner(args, cli.JsonLinesWriter(stream), cookies=CookieJarCache())
+    commands = []
+    monkeypatch.setattr(runner, "run_ffmpeg", lambda cmd, job, *a: commands.append(cmd) or (True, 0, ""))
+    job = DownloadJob("https://lms/viewer.php?id=1", "https://cdn/1/index.m3u8", str(tmp_path / "강의.mp4"),
+                      "https://lms/", "강의", cookie_header="MoodleSession=x")
+
+    runner.download(job)
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert {"event": "rate_limit_bypassed", "url": job.page_url, "max_rate": 2.0}.items() <= events[-1].items()
+    assert any(e["event"] == "log" and "[WARN]" in e["message"] for e in events)
+    assert len(commands) == 1
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import engine
+from engine import concat_segments, is_mpegts, partial_output_path
+
+PACKET = b"\x47" + bytes(187)
+
+
+@pytest.fixture
+def segments(tmp_path):
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"seg_{i:05d}.ts"
+        path.write_bytes(b"\x47" + bytes([i]) * 187 + PACKET * (i * 50))
+        paths.append(path)
+    return paths
+
+
+def expected(paths) -> bytes:
+    return b"".join(p.read_bytes() for p in paths)
+
+
+@pytest.mark.parametrize("method", engine.COPY_METHODS)
+def test_concat_segments_with_each_copy_method(monkeypatch, tmp_path, segments, method):
+    if method == "copy_file_range" and not hasattr(os, "copy_file_range"):
+        pytest.skip("copy_file_range 없음")
+    if method == "sendfile" and not hasattr(os, "sendfile"):
+        pytest.skip("sendfile 없음")
+    monkeypatch.setattr(engine, "COPY_METHODS", (method, "mmap"))
+    out = tmp_path / "out.source.ts"
+    used = concat_segments(segments, str(out))
+    assert out.read_bytes() == expected(segments)
+    assert used in (method, "mmap")
+    assert not os.path.exists(partial_output_path(str(out)))
+
+
+def test_concat_falls_back_when_kernel_copy_is_unsupported(monkeypatch, tmp_path, segments):
+    def unsupported(*_args):
+        raise OSError(engine.errno.EXDEV, "cross-device")
+
+    monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+    monkeypatch.setattr(os, "sendfile", unsupported, raising=False)
+    out = tmp_path / "out.ts"
+    assert concat_segments(segments, str(out)) == "mmap"
+    assert out.read_bytes() == expected(segments)
+
+
+def test_concat_failure_leaves_no_output(monkeypatch, tmp_path, segments):
+    out = tmp_path / "out.ts"
+    segments[2].unlink()
+    with pytest.raises(OSError):
+        concat_segments(segments, str(out))
+    assert not out.exists()
+    assert not os.path.exists(partial_output_path(str(out)))
+
+
+def test_concat_replaces_existing_output_atomically(tmp_path, segments):
+    out = tmp_path / "out.ts"
+    out.write_bytes(b"old")
+    concat_segments(segments, str(out))
+    assert out.read_bytes() == expected(segments)
+
+
+def test_is_mpegts(tmp_path, segments):
+    assert is_mpegts(segments[1])
+    other = tmp_path / "seg.mp4"
+    other.write_bytes(b"\x00\x00\x00\x18ftypmp42" + bytes(200))
+    assert not is_mpegts(other)
+    assert not is_mpegts(tmp_path / "missing.ts")
@@ -0,0 +1,89 @@
+import pytest
+import requests
+
+from engine import CourseManifest, find_lecture_links, sync_courses
+
+COURSE = "https://ys.learnus.org/course/view.php?id=77"
+COURSE_HTML = """
+<ul>
+<li><a href="https://ys.learnus.org/mod/vod/view.php?id=101"><span class="instancename">1주차 강의
+<span class="accesshide"> 동영상</span></span></a></li>
+<li><a href="https://ys.learnus.org/mod/vod/viewer.php?id=102">2주차 강의</a></li>
+<li><a href="https://ys.learnus.org/mod/ubboard/view.php?id=5">공지</a></li>
+</ul>
+"""
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    m = CourseManifest(tmp_path / "courses.sqlite3")
+    yield m
+    m.close()
+
+
+def test_find_lecture_links_maps_view_to_viewer():
+    links = find_lecture_links(COURSE_HTML, COURSE)
+    assert [u for u, _ in links] == [
+        "https://ys.learnus.org/mod/vod/viewer.php?id=101",
+        "https://ys.learnus.org/mod/vod/viewer.php?id=102",
+    ]
+    assert links[0][1] == "1주차 강의"
+
+
+def test_manifest_reports_new_and_changed(manifest):
+    links = find_lecture_links(COURSE_HTML, COURSE)
+    new, changed = manifest.update(COURSE, links, etag='"v1"')
+    assert len(new) == 2 and changed == []
+    renamed = [(links[0][0], "1주차 강의 (수정)"), links[1], ("https://ys.learnus.org/mod/vod/viewer.php?id=103", "3주차")]
+    new, changed = manifest.update(COURSE, renamed, etag='"v2"')
+    assert new == ["https://ys.learnus.org/mod/vod/viewer.php?id=103"]
+    assert changed == [links[0][0]]
+    assert manifest.validators(COURSE) == ('"v2"', "")
+
+
+def test_manifest_drops_lectures_removed_from_the_course(manifest):
+    links = find_lecture_links(COURSE_HTML, COURSE)
+    manifest.update(COURSE, links)
+    manifest.update(COURSE, links[1:])
+    assert [u for u, _ in manifest.lectures(COURSE)] == [links[1][0]]
+
+
+def test_manifest_keeps_rows_and_validators_when_page_has_no_lectures(manifest):
+    links = find_lecture_links(COURSE_HTML, COURSE)
+    manifest.update(COURSE, links, etag='"v1"', last_modified="Mon, 01 Sep 2025 00:00:00 GMT")
+    with pytest.raises(ValueError):
+        manifest.update(COURSE, [], etag='"sso"', last_modified="Tue, 02 Sep 2025 00:00:00 GMT")
+    assert manifest.lectures(COURSE) == links
+    assert manifest.validators(COURSE) == ('"v1"', "Mon, 01 Sep 2025 00:00:00 GMT")
+
+
+def test_manifest_accepts_empty_course_the_first_time(manifest):
+    assert manifest.update(COURSE, [], etag='"v1"') == ([], [])
+
+
+class FakeSession:
+    """sync_course가 쓰는 session.get만 흉내 냄 (같은 URL로 200 응답)"""
+
+    def __init__(self, text, headers=None):
+        self.text = text
+        self.headers = headers or {}
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append(headers or {})
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.url = url
+        resp._content = self.text.encode()
+        resp.encoding = "utf-8"
+        resp.headers.update(self.headers)
+        return resp
+
+
+def test_sync_falls_back_to_stored_list_on_sso_page(manifest):
+    sync_courses(FakeSession(COURSE_HTML, {"ETag": '"v1"'}), [COURSE], manifest, log=lambda *_: None)
+    sso = FakeSession("<html><form action='https://sso.yonsei.ac.kr/login'></form></html>", {"ETag": '"sso"'})
+    urls, syncs = sync_courses(sso, [COURSE], manifest, log=lambda *_: None)
+    assert syncs[0].error
+    assert urls == [u for u, _ in find_lecture_links(COURSE_HTML, COURSE)]
+    assert manifest.validators(COURSE) == ('"v1"', "")
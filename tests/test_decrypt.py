@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+import pytest
+import requests
+
+from engine import HlsSegment, HlsUnsupported, KeyCache, SegmentDecryptor, parse_media_playlist
+
+pytest.importorskip("cryptography")
+from cryptography.hazmat.primitives import padding  # noqa: E402
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes  # noqa: E402
+
+KEY = bytes(range(16))
+KEY_URI = "https://lms.example.ac.kr/hls/1/key.bin"
+
+
+def encrypt(data: bytes, key: bytes, iv: bytes) -> bytes:
+    padder = padding.PKCS7(128).padder()
+    enc = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+    return enc.update(padder.update(data) + padder.finalize()) + enc.finalize()
+
+
+class KeySession:
+    """KeyCache.get이 쓰는 session.get만 흉내 냄 (요청 수를 세고, 느린 키 서버를 흉내 낼 수 있음)"""
+
+    def __init__(self, body=KEY, status=200, delay=0.0):
+        self.body, self.status, self.delay = body, status, delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get(self, uri, timeout=None):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        resp = requests.Response()
+        resp.status_code = self.status
+        resp.url = uri
+        resp._content = self.body
+        return resp
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 16, 4096])
+def test_segment_decryptor_streams_in_any_chunk_size(chunk):
+    iv = os.urandom(16)
+    plain = os.urandom(188 * 100 + 5)
+    data = encrypt(plain, KEY, iv)
+    dec = SegmentDecryptor(KEY, iv)
+    out = b"".join(dec.update(data[i:i + chunk]) for i in range(0, len(data), chunk)) + dec.finalize()
+    assert out == plain
+
+
+def test_segment_decryptor_wrong_key_fails_on_padding():
+    iv = bytes(16)
+    data = encrypt(b"\x47" * 188 * 10, KEY, iv)
+    dec = SegmentDecryptor(bytes(16), iv)
+    dec.update(data)
+    with pytest.raises(ValueError):
+        dec.finalize()
+
+
+def test_key_cache_fetches_each_key_once_across_threads():
+    cache = KeyCache()
+    session = KeySession(delay=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(session, KEY_URI))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [KEY] * 8
+    assert session.calls == 1
+
+
+def test_key_cache_forget_and_lru_eviction():
+    cache = KeyCache(max_keys=2)
+    session = KeySession()
+    for uri in ("k1", "k2", "k1", "k3"):
+        cache.get(session, uri)
+    assert session.calls == 3
+    assert list(cache.keys) == ["k1", "k3"]
+    cache.forget("k1")
+    cache.get(session, "k1")
+    assert session.calls == 4
+
+
+def test_key_cache_rejects_bad_keys_without_caching():
+    cache = KeyCache()
+    with pytest.raises(requests.HTTPError):
+        cache.get(KeySession(status=403), KEY_URI)
+    with pytest.raises(ValueError):
+        cache.get(KeySession(body=b"short"), KEY_URI)
+    assert not cache.keys and not cache.fetching
+
+
+def test_key_cache_decryptor_uses_sequence_iv():
+    text = (f'#EXTM3U\n#EXT-X-MEDIA-SEQUENCE:3\n#EXT-X-KEY:METHOD=AES-128,URI="{KEY_URI}"\n'
+            "#EXTINF:4,\nseg_0.ts\n")
+    seg = parse_media_playlist(text, "https://cdn.example.ac.kr/hls/1/index.m3u8").segments[0]
+    plain = b"\x47" * 188 * 4
+    data = encrypt(plain, KEY, (3).to_bytes(16, "big"))
+    dec = KeyCache().decryptor(KeySession(), seg)
+    assert dec.update(data) + dec.finalize() == plain
+
+
+def test_key_cache_decryptor_rejects_other_methods():
+    seg = HlsSegment("https://cdn/seg.ts", 4.0, f'#EXT-X-KEY:METHOD=SAMPLE-AES,URI="{KEY_URI}"')
+    with pytest.raises(HlsUnsupported):
+        KeyCache().decryptor(KeySession(), seg)
@@ -0,0 +1,46 @@
+import pytest
+
+from engine import DownloadIndex
+
+URL_A = "https://ys.learnus.org/mod/vod/viewer.php?id=1"
+URL_B = "https://ys.learnus.org/mod/vod/viewer.php?id=2"
+
+
+@pytest.fixture
+def index(tmp_path):
+    i = DownloadIndex(tmp_path / "downloads.sqlite3")
+    yield i
+    i.close()
+
+
+def test_download_index_matches_same_lecture_in_any_folder(index, tmp_path):
+    out = tmp_path / "강의.mp4"
+    out.write_bytes(b"video")
+    assert index.add(URL_A, str(out), "강의", expected_duration=60, out_duration=60)
+    assert index.lookup("https://YS.learnus.org/mod/vod/viewer.php?foo=1&id=1", ".mp4") == str(out)
+    assert index.lookup(URL_A, ".mp3") == ""
+    assert index.lookup(URL_B, ".mp4") == ""
+
+
+def test_download_index_rejects_incomplete_outputs(index, tmp_path):
+    empty = tmp_path / "empty.mp4"
+    empty.write_bytes(b"")
+    assert not index.add(URL_A, str(empty))
+    cut = tmp_path / "cut.mp4"
+    cut.write_bytes(b"video")
+    assert not index.add(URL_A, str(cut), expected_duration=600, out_duration=300)
+    assert not index.add("https://ys.learnus.org/mod/vod/viewer.php", str(cut))
+    assert index.lookup(URL_A, ".mp4") == ""
+
+
+def test_download_index_forgets_deleted_or_changed_files(index, tmp_path):
+    out = tmp_path / "a.mp4"
+    out.write_bytes(b"video")
+    index.add(URL_A, str(out))
+    out.write_bytes(b"different size")
+    assert index.lookup(URL_A, ".mp4") == ""
+    assert index.recorded_path(URL_A, ".mp4") == ""
+    out.write_bytes(b"video")
+    index.add(URL_A, str(out))
+    out.unlink()
+    assert index.lookup(URL_A, ".mp4") == ""
@@ -0,0 +1,103 @@
+import json
+import shutil
+import subprocess
+import sys
+import types
+
+import pytest
+
+import engine
+
+
+@pytest.fixture(autouse=True)
+def selenium_exceptions(monkeypatch):
+    """extract_in_tabs가 함수 안에서 import하는 예외 (selenium이 없는 환경용 대체 모듈)"""
+    try:
+        import selenium.common.exceptions  # noqa: F401
+        return
+    except ImportError:
+        pass
+    exceptions = types.ModuleType("selenium.common.exceptions")
+    exceptions.UnexpectedAlertPresentException = type("UnexpectedAlertPresentException", (Exception,), {})
+    for name, module in [("selenium", types.ModuleType("selenium")),
+                         ("selenium.common", types.ModuleType("selenium.common")),
+                         ("selenium.common.exceptions", exceptions)]:
+        monkeypatch.setitem(sys.modules, name, module)
+
+
+class FakeTabsDriver:
+    """탭마다 (프로브 결과, page_source)를 정해 두고 page_source 읽은 횟수를 세는 driver"""
+
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.handles = ["home"]
+        self.urls = {}
+        self.current_window_handle = "home"
+        self.source_reads = {}
+        self.switch_to = self
+
+    def new_window(self, _kind):
+        handle = f"tab{len(self.handles)}"
+        self.handles.append(handle)
+        self.current_window_handle = handle
+
+    def window(self, handle):
+        self.current_window_handle = handle
+
+    def execute_script(self, script, *args):
+        if args:
+            self.urls[self.current_window_handle] = args[0]
+            return None
+        return self.pages[self.urls[self.current_window_handle]][0]
+
+    @property
+    def page_source(self):
+        url = self.urls[self.current_window_handle]
+        self.source_reads[url] = self.source_reads.get(url, 0) + 1
+        return self.pages[url][1]
+
+    def close(self):
+        self.handles.remove(self.current_window_handle)
+
+
+def test_extract_in_tabs_reads_page_source_once_after_probe_timeout():
+    pages = {
+        "https://lms/viewer.php?id=1": (["https://cdn/1/index.m3u8", "강의 1"], ""),
+        "https://lms/viewer.php?id=2": (["", "강의 2"], '<script>var u = "https://cdn/2/index.m3u8";</script>'),
+        "https://lms/viewer.php?id=3": (["", "없음"], "<html></html>"),
+    }
+    driver = FakeTabsDriver(pages)
+    found = engine.extract_in_tabs(driver, list(pages), timeout=1.0, log=lambda *_: None)
+    assert found == {
+        "https://lms/viewer.php?id=1": ("https://cdn/1/index.m3u8", "강의 1"),
+        "https://lms/viewer.php?id=2": ("https://cdn/2/index.m3u8", "강의 2"),
+    }
+    assert driver.source_reads == {"https://lms/viewer.php?id=2": 1, "https://lms/viewer.php?id=3": 1}
+    assert driver.handles == ["home"]
+
+
+def run_probe(video_src: str, resources: list) -> list:
+    """TAB_PROBE_SCRIPT를 node에서 가짜 document/performance로 실행"""
+    node = shutil.which("node")
+    if node is None:
+        pytest.skip("node가 없음")
+    harness = (
+        "const video = %s;\n"
+        "const resources = %s;\n"
+        "const document = {querySelector: (sel) => sel === 'h1.vod-title' ? {textContent: '제목'}"
+        " : (video === null ? null : {src: video})};\n"
+        "const performance = {getEntriesByType: () => resources.map((name) => ({name}))};\n"
+        "console.log(JSON.stringify((function () { %s })()));\n"
+    ) % (json.dumps(video_src), json.dumps(resources), engine.TAB_PROBE_SCRIPT)
+    out = subprocess.run([node, "-e", harness], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+
+def test_tab_probe_prefers_video_src():
+    assert run_probe("https://cdn/v/index.m3u8", ["https://cdn/r/index.m3u8"]) == ["https://cdn/v/index.m3u8", "제목"]
+
+
+def test_tab_probe_finds_m3u8_in_resource_timing():
+    resources = ["https://lms/player.js", "https://cdn/r/master.m3u8?token=1", "https://cdn/r/720p.m3u8"]
+    assert run_probe("blob:https://lms/1234", resources) == ["https://cdn/r/master.m3u8?token=1", "제목"]
+    assert run_probe(None, ["https://lms/player.js"]) == ["", "제목"]
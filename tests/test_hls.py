@@ -0,0 +1,37 @@
+import pytest
+
+from engine import (
+    DownloadJob, HlsPlaylistError, RetryPolicy, classify_failure, parse_media_playlist, segment_key,
+)
+
+BASE = "https://cdn.example.ac.kr/hls/1/index.m3u8"
+
+
+def media_playlist(key_attrs: str) -> str:
+    return (
+        "#EXTM3U\n#EXT-X-TARGETDURATION:4\n#EXT-X-MEDIA-SEQUENCE:7\n"
+        f"#EXT-X-KEY:METHOD=AES-128,URI=\"key.bin\"{key_attrs}\n"
+        "#EXTINF:4.0,\nseg_0.ts\n#EXTINF:4.0,\nseg_1.ts\n"
+    )
+
+
+def test_segment_key_uses_sequence_number_without_iv():
+    playlist = parse_media_playlist(media_playlist(""), BASE)
+    method, uri, iv = segment_key(playlist.segments[1])
+    assert method == "AES-128"
+    assert uri == "https://cdn.example.ac.kr/hls/1/key.bin"
+    assert iv == (8).to_bytes(16, "big")
+
+
+def test_segment_key_parses_explicit_iv():
+    playlist = parse_media_playlist(media_playlist(",IV=0x000102030405060708090A0B0C0D0E0F"), BASE)
+    assert segment_key(playlist.segments[0])[2] == bytes(range(16))
+
+
+@pytest.mark.parametrize("iv", ["0x123", "0xZZ", "0x", "0x" + "00" * 17])
+def test_malformed_iv_is_a_playlist_error_that_is_not_retried(iv):
+    with pytest.raises(HlsPlaylistError) as err:
+        parse_media_playlist(media_playlist(f",IV={iv}"), BASE)
+    failure = classify_failure(exc=err.value)
+    assert failure == "playlist"
+    assert RetryPolicy(max_retries=3).next_action(DownloadJob("p", "m", "o", "r"), failure) == ""
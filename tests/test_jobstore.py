@@ -0,0 +1,92 @@
+import pytest
+
+from engine import DownloadJob, JobStore
+
+URL_A = "https://ys.learnus.org/mod/vod/viewer.php?id=1"
+URL_B = "https://ys.learnus.org/mod/vod/viewer.php?id=2"
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = JobStore(tmp_path / "jobs.sqlite3")
+    yield s
+    s.close()
+
+
+def extracted(store: JobStore, page_url: str, out_file) -> DownloadJob:
+    job = DownloadJob(page_url, page_url + "&m3u8", str(out_file), page_url, "제목",
+                      media_url="https://cdn/720p.m3u8", audio_url="https://cdn/audio.m3u8")
+    store.mark_extracted(job)
+    return job
+
+
+def test_new_urls_are_extracted(store, tmp_path):
+    plan = store.enqueue([URL_A, URL_B, URL_A], tmp_path)
+    assert plan == {"extract": [URL_A, URL_B], "resume": [], "done": []}
+    assert store.counts()["queued"] == 2
+    assert store.unfinished() == [URL_A, URL_B]
+
+
+@pytest.mark.parametrize("interrupted_in", ["extracted", "downloading"])
+def test_extracted_or_interrupted_jobs_resume_without_extraction(store, tmp_path, interrupted_in):
+    store.enqueue([URL_A], tmp_path)
+    job = extracted(store, URL_A, tmp_path / "a.mp4")
+    if interrupted_in == "downloading":
+        store.mark_started(job)
+    plan = store.enqueue([URL_A], tmp_path)
+    assert plan["extract"] == []
+    [resumed] = plan["resume"]
+    assert (resumed.m3u8, resumed.out_file, resumed.title) == (job.m3u8, job.out_file, "제목")
+    assert (resumed.media_url, resumed.audio_url) == (job.media_url, job.audio_url)
+    assert resumed.cookie_header == ""
+    assert store.counts()["extracted"] == 1
+
+
+def test_retry_state_keeps_attempts(store, tmp_path):
+    store.enqueue([URL_A], tmp_path)
+    job = extracted(store, URL_A, tmp_path / "a.mp4")
+    job.attempts, job.last_failure = 2, "network"
+    store.mark_retry(job)
+    [resumed] = store.enqueue([URL_A], tmp_path)["resume"]
+    assert (resumed.attempts, resumed.last_failure) == (2, "network")
+
+
+def test_done_is_skipped_only_while_the_output_exists(store, tmp_path):
+    out = tmp_path / "a.mp4"
+    out.write_bytes(b"x")
+    store.enqueue([URL_A], tmp_path)
+    extracted(store, URL_A, out)
+    store.mark_finished(URL_A, True)
+    assert store.enqueue([URL_A], tmp_path)["done"] == [URL_A]
+    assert store.unfinished() == []
+    out.unlink()
+    assert store.enqueue([URL_A], tmp_path)["extract"] == [URL_A]
+
+
+def test_failed_changed_folder_and_no_resume_start_over(store, tmp_path):
+    store.enqueue([URL_A, URL_B], tmp_path)
+    extracted(store, URL_A, tmp_path / "a.mp4")
+    store.mark_finished(URL_B, False, "auth", 3)
+    assert store.enqueue([URL_B], tmp_path)["extract"] == [URL_B]
+    assert store.enqueue([URL_A], tmp_path, resume=False)["extract"] == [URL_A]
+    extracted(store, URL_A, tmp_path / "a.mp4")
+    assert store.enqueue([URL_A], tmp_path / "other")["extract"] == [URL_A]
+
+
+def test_forget_drops_saved_state(store, tmp_path):
+    store.enqueue([URL_A], tmp_path)
+    extracted(store, URL_A, tmp_path / "a.mp4")
+    store.forget([URL_A])
+    assert store.enqueue([URL_A], tmp_path)["extract"] == [URL_A]
+
+
+def test_state_survives_reopen(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    store.enqueue([URL_A], tmp_path)
+    extracted(store, URL_A, tmp_path / "a.mp4")
+    store.close()
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    try:
+        assert len(store.enqueue([URL_A], tmp_path)["resume"]) == 1
+    finally:
+        store.close()
@@ -0,0 +1,68 @@
+import errno
+import pytest
+import requests
+
+from engine import DownloadJob, RetryPolicy, classify_failure
+
+
+def http_error(status: int) -> requests.HTTPError:
+    resp = requests.Response()
+    resp.status_code = status
+    return requests.HTTPError(f"{status}", response=resp)
+
+
+@pytest.mark.parametrize("status, expected", [
+    (401, "auth"), (403, "auth"), (404, "expired"), (410, "expired"),
+    (500, "network"), (503, "network"), (408, "network"), (429, "network"), (400, ""),
+])
+def test_classify_failure_by_http_status(status, expected):
+    assert classify_failure(http_error=status) == expected
+    assert classify_failure(exc=http_error(status)) == expected
+
+
+@pytest.mark.parametrize("log_text, expected", [
+    ("[tcp @ 0x1] Connection to tcp://cdn:443 failed: Connection refused", "network"),
+    ("[https @ 0x1] Operation timed out", "network"),
+    ("av_interleaved_write_frame(): No space left on device", "disk"),
+    ("Invalid data found when processing input", ""),
+])
+def test_classify_failure_from_ffmpeg_log(log_text, expected):
+    assert classify_failure(log_text) == expected
+
+
+def test_classify_failure_from_exceptions():
+    assert classify_failure(exc=requests.ConnectionError()) == "network"
+    assert classify_failure(exc=requests.Timeout()) == "network"
+    assert classify_failure(exc=OSError(errno.ENOSPC, "No space left on device")) == "disk"
+    assert classify_failure(exc=OSError(errno.EACCES, "Permission denied")) == ""
+
+
+def job(attempts=0, last_failure="") -> DownloadJob:
+    return DownloadJob("https://lms/viewer.php?id=1", "https://cdn/index.m3u8", "out.mp4", "",
+                       attempts=attempts, last_failure=last_failure)
+
+
+def test_retry_policy_actions():
+    policy = RetryPolicy(max_retries=3)
+    assert policy.next_action(job(), "network") == "backoff"
+    assert policy.next_action(job(), "auth") == "refresh"
+    assert policy.next_action(job(), "expired") == "reextract"
+    assert policy.next_action(job(), "disk") == ""
+    assert policy.next_action(job(), "") == ""
+
+
+def test_retry_policy_reextracts_when_refreshed_cookies_are_still_rejected():
+    assert RetryPolicy().next_action(job(1, "auth"), "auth") == "reextract"
+
+
+def test_retry_policy_gives_up_after_max_retries():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.next_action(job(2), "network") == ""
+    assert RetryPolicy(max_retries=0).next_action(job(), "network") == ""
+
+
+def test_retry_delay_grows_exponentially_with_jitter_and_cap():
+    policy = RetryPolicy(base_delay=5, max_delay=30)
+    assert 4 <= policy.delay(1) <= 6
+    assert 8 <= policy.delay(2) <= 12
+    assert 24 <= policy.delay(10) <= 36
@@ -0,0 +1,22 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import cli
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_engine_and_cli_import_without_qt():
+    """엔진과 CLI는 Qt 없이 돌아야 함 (헤드리스 서버에는 PyQt5가 없을 수 있음)"""
+    code = (
+        "import sys, engine, cli\n"
+        "bad = sorted(m for m in sys.modules if m.split('.')[0] in ('PyQt5', 'main'))\n"
+        "assert not bad, bad\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+
+
+def test_cli_defaults():
+    args = cli.parse_args(["urls.txt"])
+    assert (args.jobs, args.engine, args.per_host, args.quality) == (3, "ffmpeg", 2, "highest")
@@ -0,0 +1,65 @@
+import threading
+
+from engine import ConcurrencyTuner, TokenBucket
+
+
+def run(tuner: ConcurrencyTuner, intervals: int, throughput, interval: float = 5.0):
+    """throughput(limit) 바이트/초를 내는 가짜 회선으로 intervals번 조절 → 기록"""
+    total, now = 0, 1.0
+    tuner.sample(total, now=now)
+    samples = []
+    for _ in range(intervals):
+        now += interval
+        total += int(throughput(tuner.limit) * interval)
+        samples.append(tuner.sample(total, now=now))
+    return samples
+
+
+def test_increases_until_throughput_stops_improving():
+    tuner = ConcurrencyTuner(2, maximum=16)
+    samples = run(tuner, 8, lambda n: min(n, 5) * 1_000_000)
+    assert [s.limit for s in samples[:5]] == [3, 4, 5, 6, 5]
+    assert samples[4].reason == "포화, 되돌림"
+    assert {s.reason for s in samples[5:]} == {"유지"}
+    assert tuner.limit == 5
+
+
+def test_halves_on_errors():
+    tuner = ConcurrencyTuner(8)
+    tuner.sample(0, now=1.0)
+    for ok in (False, False, True):
+        tuner.record(ok)
+    sample = tuner.sample(1_000_000, now=6.0)
+    assert (sample.before, sample.limit, sample.reason) == (8, 4, "오류로 감소")
+    assert round(sample.error_rate, 2) == 0.67
+
+
+def test_does_not_grow_when_idle_and_respects_bounds():
+    tuner = ConcurrencyTuner(3, minimum=2, maximum=4)
+    tuner.sample(0, now=1.0)
+    assert tuner.sample(1_000_000, busy=False, now=6.0).limit == 3
+    run(tuner, 5, lambda n: n * 1_000_000)
+    assert tuner.limit == 4
+    for _ in range(5):
+        tuner.record(False)
+        tuner.sample(0, now=100.0 + _)
+    assert tuner.limit == 2
+
+
+def test_acquire_blocks_at_limit():
+    tuner = ConcurrencyTuner(1)
+    tuner.acquire()
+    waiter = threading.Thread(target=tuner.acquire)
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive()
+    tuner.release()
+    waiter.join(1.0)
+    assert not waiter.is_alive()
+
+
+def test_token_bucket_counts_bytes_for_throughput_even_without_a_limit():
+    bucket = TokenBucket()
+    for _ in range(10):
+        bucket.consume(64 * 1024)
+    assert bucket.total == 10 * 64 * 1024
@@ -0,0 +1,55 @@
+import pytest
+
+from engine import parse_audio_renditions, parse_master_playlist, select_variant
+
+
+MASTER = """#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="ko",DEFAULT=YES,URI="audio/ko.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2",AUDIO="aud"
+360p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720,CODECS="avc1.4d401f,mp4a.40.2",AUDIO="aud"
+720p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080,CODECS="avc1.640028,mp4a.40.2",AUDIO="aud"
+1080p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=96000,CODECS="mp4a.40.2"
+audio_only/index.m3u8
+"""
+MASTER_URL = "https://cdn.example.ac.kr/hls/1/master.m3u8"
+
+
+def test_parse_master_playlist_resolves_uris_and_bandwidth():
+    variants = parse_master_playlist(MASTER, MASTER_URL)
+    assert [v["uri"] for v in variants] == [
+        "https://cdn.example.ac.kr/hls/1/360p/index.m3u8",
+        "https://cdn.example.ac.kr/hls/1/720p/index.m3u8",
+        "https://cdn.example.ac.kr/hls/1/1080p/index.m3u8",
+        "https://cdn.example.ac.kr/hls/1/audio_only/index.m3u8",
+    ]
+    assert [v["bandwidth"] for v in variants] == [800000, 2500000, 5000000, 96000]
+    assert variants[1]["attrs"]["RESOLUTION"] == "1280x720"
+    assert variants[1]["attrs"]["AUDIO"] == "aud"
+
+
+@pytest.mark.parametrize("policy, expected", [
+    ("highest", "1080p"),
+    ("max1080", "1080p"),
+    ("max720", "720p"),
+    ("max480", "360p"),
+    ("lowest", "audio_only"),
+    ("audio", "audio_only"),
+])
+def test_select_variant_policies(policy, expected):
+    variants = parse_master_playlist(MASTER, MASTER_URL)
+    assert f"/{expected}/" in select_variant(variants, policy)["uri"]
+
+
+def test_select_variant_falls_back_to_smallest_when_nothing_fits():
+    variants = [v for v in parse_master_playlist(MASTER, MASTER_URL) if "RESOLUTION" in v["attrs"]]
+    assert "/360p/" in select_variant(variants, "max240")["uri"]
+    assert "/360p/" in select_variant(variants, "audio")["uri"]
+
+
+def test_parse_audio_renditions():
+    assert parse_audio_renditions(MASTER, MASTER_URL) == [
+        {"group": "aud", "uri": "https://cdn.example.ac.kr/hls/1/audio/ko.m3u8", "default": True},
+    ]